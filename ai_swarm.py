@@ -23,18 +23,22 @@ aufzuzeigen, was hier passiert, wie es passiert und warum es so gelöst wurde.
 """
 
 import customtkinter as ctk
-from tkinter import scrolledtext, Menu
-from swarm import Swarm, Agent
+from tkinter import scrolledtext, Menu, messagebox
+from swarm import Agent
 import os
 from dotenv import load_dotenv, set_key
-import openai
+from swarm_history import HistoryManager, SUMMARY_INSTRUCTIONS, swarm_summarizer
+from swarm_cache import ResponseCache
+from swarm_store import ConversationStore
+from swarm_chat_view import ChatView, stored_turns
+from swarm_startup import BackgroundClient
 
 # API-Schlüssel setzen
 load_dotenv()  # Lade Umgebungsvariablen aus einer .env-Datei
-openai.api_key = os.getenv("OPENAI_API_KEY")
 
-# Swarm-Client initialisieren
-client = Swarm()
+# Swarm-Client initialisieren (mit gepooltem HTTP-Client; ein neuer
+# API-Schlüssel tauscht ihn über client.rotate(...) aus)
+client = BackgroundClient()
 
 def transfer_to_agent_mona():
     """
@@ -119,7 +123,7 @@ def send_message():
     """
     Diese Funktion wird aufgerufen, wenn der Benutzer auf den 'Send'-Button klickt.
     Sie liest den Text aus dem Eingabefeld `input_field` aus, fügt ihn zur 
-    Nachrichtenhistorie `messages` hinzu und ruft die Swarm-API auf, um eine 
+    Nachrichtenhistorie `history` hinzu und ruft die Swarm-API auf, um eine 
     Antwort zu erhalten. Anschließend wird die Antwort im Chat-Fenster angezeigt.
     
     Ablauf (Was geschieht hier):
@@ -144,31 +148,30 @@ def send_message():
         return  # Verhindert, dass leere Eingaben verarbeitet werden
 
     # Füge die Anfrage zur Nachrichtenliste hinzu
-    messages.append({"role": "user", "content": user_input})
+    history.append({"role": "user", "content": user_input})
+    history.compact_in_background()  # läuft im Hintergrund, blockiert nicht
 
     try:
         # Rufe den Swarm-Client auf, um eine Antwort zu generieren
-        response = client.run(
-            agent=current_agent,
-            messages=messages
-        )
+        # (bei einem Cache-Treffer ohne erneuten GPT-4-Aufruf)
+        response = response_cache.run(client, current_agent, history.window(current_agent))
         agent_response = response.messages[-1]["content"]
         current_agent = response.agent
 
-        # Aktualisiere den Chatverlauf
-        chat_history.config(state=ctk.NORMAL)
-        chat_history.insert(ctk.END, f"You: {user_input}\n")
-        chat_history.insert(ctk.END, f"{current_agent.name}: {agent_response}\n\n")
-        chat_history.config(state=ctk.DISABLED)
-        chat_history.see(ctk.END)
+        # Frage und Antwort dauerhaft speichern (geschrieben wird gebündelt
+        # im Hintergrund, hier entsteht keine Wartezeit)
+        store_id = conversation_store.append(STORE_CONVERSATION, current_agent.name, "user", user_input)
+        conversation_store.append(STORE_CONVERSATION, current_agent.name, "assistant", agent_response)
+
+        # Aktualisiere den Chatverlauf (gezeichnet wird gebündelt im nächsten Frame)
+        chat_view.begin_turn(store_id)
+        chat_view.append(f"You: {user_input}\n{current_agent.name}: {agent_response}\n\n")
 
         # Leere das Eingabefeld
         input_field.delete(0, ctk.END)
     except Exception as e:
         # Falls ein Fehler auftritt, wird er im Chat-Verlauf angezeigt
-        chat_history.config(state=ctk.NORMAL)
-        chat_history.insert(ctk.END, f"Error: {e}\n\n")
-        chat_history.config(state=ctk.DISABLED)
+        chat_view.append(f"Error: {e}\n\n")
 
 def set_api_key():
     """
@@ -179,7 +182,8 @@ def set_api_key():
     - Es wird ein neuer API-Key aus dem Eingabefeld gelesen und geprüft, ob er
       nicht leer ist. 
     - Anschließend wird er mittels `set_key` in der .env-Datei abgelegt.
-    - Der globale `openai.api_key` wird ebenfalls aktualisiert.
+    - Der Swarm-Client wird mit dem neuen Schlüssel ersetzt (client.rotate);
+      eine gerade laufende Anfrage endet noch mit dem alten.
 
     Warum:
     - Somit kann der Nutzer ohne Programmieraufwand den API-Schlüssel zur Laufzeit
@@ -188,7 +192,8 @@ def set_api_key():
     new_key = api_key_entry.get().strip()
     if new_key:
         set_key(".env", "OPENAI_API_KEY", new_key)
-        openai.api_key = new_key
+        os.environ["OPENAI_API_KEY"] = new_key
+        client.rotate(new_key)
         api_key_entry.delete(0, ctk.END)
         print("API-Schlüssel erfolgreich gespeichert.")
 
@@ -208,17 +213,96 @@ def change_theme(theme):
     """
     ctk.set_appearance_mode(theme)
 
+def restore_transcript():
+    """
+    Zeigt beim Start nur die letzten TRANSCRIPT_PAGE_SIZE gespeicherten
+    Nachrichten an. Ältere werden erst beim Hochscrollen nachgeladen.
+    Dieselben Nachrichten kommen auch in den Verlauf (history), damit die
+    erste Folgefrage nach einem Neustart den bisherigen Kontext mitschickt.
+    """
+    stored = conversation_store.tail(STORE_CONVERSATION, limit=TRANSCRIPT_PAGE_SIZE)
+    history.extend({"role": message.role, "content": message.content} for message in stored)
+    for store_id, text in stored_turns(stored):
+        chat_view.begin_turn(store_id)
+        chat_view.append(text)
+    chat_view.has_older = bool(stored)
+
+def load_older_messages():
+    """
+    Lädt die nächste Seite älterer Nachrichten und fügt sie oben ein, ohne
+    die aktuelle Scrollposition zu verlieren.
+    """
+    before_id = chat_view.older_before_id()
+    if before_id is None:
+        return
+    stored = conversation_store.page_before(
+        STORE_CONVERSATION, before_id, limit=TRANSCRIPT_PAGE_SIZE
+    )
+    if not stored:
+        chat_view.has_older = False  # Anfang erreicht
+        return
+    chat_view.prepend_turns(stored_turns(stored))
+
+def on_chat_scroll(first, last):
+    """
+    yscrollcommand des Chatverlaufs: Steht der sichtbare Bereich ganz oben,
+    werden ältere Nachrichten nachgeladen. Ist wieder das Ende erreicht,
+    wird der Verlauf auf MAX_RENDERED_TURNS gekürzt.
+    """
+    chat_history.vbar.set(first, last)
+    if float(first) <= 0.0 and float(last) < 1.0 and chat_view.has_older:
+        root.after_idle(load_older_messages)
+    elif float(last) >= 1.0 and chat_view.turn_count > chat_view.max_turns:
+        root.after_idle(chat_view.trim)
+
+def show_cache_stats():
+    """
+    Zeigt Treffer und Fehlzugriffe des Antwort-Caches in einem Dialog an.
+    """
+    messagebox.showinfo("Cache-Statistik", response_cache.describe())
+
 # -----------------------------------------------------------------------------
 # Initialisierung der Nachrichtenhistorie und Auswahl des Start-Agenten:
 # -----------------------------------------------------------------------------
-# Wir beginnen hier mit einer vordefinierten Nachricht in der `messages`-Liste, 
+# Wir beginnen hier mit einer vordefinierten Nachricht im Verlauf `history`, 
 # um dem Nutzer erste Informationen zu liefern. Der Start-Agent wird auf 
 # 'agent_dirk' gesetzt, da dieser unser Service-Agent ist.
 # -----------------------------------------------------------------------------
 
-messages = [{"role": "user", "content": "Welche Agenten stehen zur Verfügung? Und wobei helfen sie?"}]
+# Der HistoryManager zählt die Tokens jeder Nachricht einmalig und schickt
+# pro Anfrage nur so viel Verlauf mit, wie in das Token-Budget passt
+# (SWARM_TOKEN_BUDGET). Ältere Nachrichten fasst "Agent Zusammenfassung"
+# im Hintergrund zusammen.
+agent_summary = Agent(
+    name="Agent Zusammenfassung",
+    instructions=SUMMARY_INSTRUCTIONS,
+    model="gpt-4"
+)
+history = HistoryManager(
+    messages=[{"role": "user", "content": "Welche Agenten stehen zur Verfügung? Und wobei helfen sie?"}],
+    default_budget=int(os.getenv("SWARM_TOKEN_BUDGET", "6000")),
+    summarizer=swarm_summarizer(client, agent_summary),
+)
 current_agent = agent_dirk
 
+# Dauerhafter Gesprächsspeicher (SQLite im WAL-Modus, nur Anhängen). Beim
+# Start wird nur das Ende des Verlaufs angezeigt, Älteres beim Hochscrollen.
+conversation_store = ConversationStore(os.getenv("SWARM_STORE_PATH", "swarm_conversations.sqlite3"))
+STORE_CONVERSATION = "ai_swarm"
+TRANSCRIPT_PAGE_SIZE = 20
+
+# Begrenzte Darstellung: höchstens so viele Turns stehen im ScrolledText,
+# ältere werden beim Hochscrollen wieder aus dem Speicher geholt
+chat_view = ChatView(max_turns=int(os.getenv("SWARM_RENDERED_TURNS", "60")))
+
+# Antwort-Cache: LRU im Arbeitsspeicher plus SQLite-Datei, die Neustarts
+# übersteht. Wiederholte Fragen werden ohne GPT-4-Aufruf beantwortet.
+response_cache = ResponseCache(
+    [agent_dirk, agent_mona, agent_peter, agent_ralf],
+    path=os.getenv("SWARM_CACHE_PATH", "swarm_cache.sqlite3"),
+    ttl=int(os.getenv("SWARM_CACHE_TTL", str(24 * 60 * 60))),
+)
+
 # -----------------------------------------------------------------------------
 # Erstellung des Hauptfensters mittels CustomTkinter:
 # -----------------------------------------------------------------------------
@@ -239,6 +323,10 @@ menu.add_cascade(label="Themen", menu=theme_menu)
 theme_menu.add_command(label="Hell", command=lambda: change_theme("light"))
 theme_menu.add_command(label="Dunkel", command=lambda: change_theme("dark"))
 
+stats_menu = Menu(menu, tearoff=0)
+menu.add_cascade(label="Statistik", menu=stats_menu)
+stats_menu.add_command(label="Cache-Statistik", command=show_cache_stats)
+
 # -----------------------------------------------------------------------------
 # Chatverlauf (ScrolledText):
 # -----------------------------------------------------------------------------
@@ -246,6 +334,12 @@ theme_menu.add_command(label="Dunkel", command=lambda: change_theme("dark"))
 # -----------------------------------------------------------------------------
 chat_history = scrolledtext.ScrolledText(root, wrap=ctk.WORD, state=ctk.DISABLED)
 chat_history.grid(row=0, column=0, columnspan=3, padx=10, pady=10, sticky="nsew")
+chat_history.configure(yscrollcommand=on_chat_scroll)
+chat_view.attach(chat_history)
+chat_view.show()
+
+# Gespeicherten Verlauf wiederherstellen (nur das neueste Stück)
+restore_transcript()
 
 # -----------------------------------------------------------------------------
 # Eingabefeld (CTkEntry) für Nutzernachrichten:
@@ -291,3 +385,6 @@ root.grid_rowconfigure(2, weight=0)
 # Dies hält das Fenster offen, bis der Nutzer das Programm schließt.
 # -----------------------------------------------------------------------------
 root.mainloop()
+
+# Nach dem Schließen des Fensters noch ausstehende Nachrichten speichern
+conversation_store.close()
@@ -15,6 +15,23 @@ Das GUI wird mittels CustomTkinter (ctk) erstellt und enthält:
  - Ein Menü zum Wechseln des Farbschemas (Hell/Dunkel) sowie zum Ändern der 
    Schriftgröße
  - Multithreading für das asynchrone Abrufen der Antworten vom GPT-4-Modell
+   über einen begrenzten Worker-Pool (eine geordnete Warteschlange pro Tab)
+ - Token-Streaming: Antworten erscheinen bereits während sie erzeugt werden
+ - Schneller Start: openai/swarm werden im Hintergrund geladen, der Inhalt
+   eines Tabs entsteht erst, wenn der Tab zum ersten Mal gebraucht wird
+ - Fan-out: berührt eine Frage im Dirk-Tab mehrere Fachgebiete, werden die
+   Fach-Agenten auf Wunsch gleichzeitig befragt
+ - Getrennte Verläufe: jeder Tab schickt nur seine eigenen Turns an GPT-4;
+   leitet Agent Dirk weiter, kann sein Kontext optional mitgegeben werden
+ - Begrenzte Chatverläufe: jeder Tab zeigt nur die letzten Turns (ältere
+   werden beim Hochscrollen nachgeladen), Änderungen erscheinen gebündelt
+   einmal pro Frame, verborgene Tabs werden erst bei der Auswahl gezeichnet
+ - Messung: jeder Turn wird in Phasen (Warteschlange, Routing, Weiterleitung,
+   erstes Textstück, Antwort, Anzeige) gemessen, Tokens je Agent gezählt
+   (Menü "Statistik", Prometheus-Endpunkt mit SWARM_METRICS_PORT)
+ - Tracing: mit SWARM_TRACE_SAMPLE wird ein Anteil der Turns als Span-Baum
+   (Modellaufrufe, Funktionen, Weiterleitungen, Anzeige) nach
+   swarm_traces.jsonl geschrieben
 
 Wichtig:
  - Der API-Schlüssel wird aus einer .env-Datei gelesen und lässt sich zur Laufzeit 
@@ -32,326 +49,483 @@ CustomTkinter erlangen möchten.
 """
 
 import customtkinter as ctk
-from tkinter import scrolledtext, Menu, ttk, font
-from swarm import Swarm, Agent
+from tkinter import scrolledtext, Menu, ttk, font, messagebox
 import os
 from dotenv import load_dotenv, set_key
-import openai
-import threading
-
-# API-Schlüssel laden und OpenAI-Client initialisieren
+import queue
+import time
+from swarm_registry import AgentRegistry, DEFAULT_REGISTRY_PATH
+from swarm_router import KeywordRouter
+from swarm_classifier import LearnedRouter
+from swarm_startup import BackgroundClient
+from swarm_streaming import DeltaBatcher, stream_events
+from swarm_worker_pool import LaneExecutor
+from swarm_history import HistoryManager, TabHistories, swarm_summarizer
+from swarm_cache import ResponseCache
+from swarm_store import ConversationStore
+from swarm_chat_view import ChatView, stored_turns
+from swarm_fanout import FanOut, format_result
+from swarm_metrics import shared_metrics, serve_from_env
+from swarm_tracing import shared_tracer
+
+# API-Schlüssel laden
 load_dotenv()  # Lädt Schlüssel aus der .env-Datei
-openai.api_key = os.getenv("OPENAI_API_KEY")
 
-# Der Swarm-Client kümmert sich um die Kommunikation mit den GPT-4-Agenten
-client = Swarm()
+# Der Swarm-Client kümmert sich um die Kommunikation mit den GPT-4-Agenten.
+# openai und swarm werden erst im Hintergrund importiert, während das Fenster
+# schon aufgebaut wird; Anfragen warten im Worker-Thread, bis er bereit ist.
+client = BackgroundClient()
+
+# Antworten werden standardmäßig Token für Token gestreamt. Mit
+# SWARM_STREAM=0 in der .env-Datei lässt sich der blockierende Modus
+# (komplette Antwort auf einmal) wieder aktivieren.
+STREAM_RESPONSES = os.getenv("SWARM_STREAM", "1") != "0"
+
+# Größe des Worker-Pools und Höchstzahl offener Anfragen (wartend + laufend)
+WORKER_COUNT = int(os.getenv("SWARM_WORKERS", "4"))
+MAX_PENDING_REQUESTS = int(os.getenv("SWARM_MAX_PENDING", "32"))
 
 # -----------------------------------------------------------------------------
-# Definition der Agenten-Funktionen zur Weiterleitung:
+# Agenten aus der Registry:
 # -----------------------------------------------------------------------------
-def transfer_to_agent_bgb():
-    """
-    Liefert das Agent-Objekt für das Bürgerliche Gesetzbuch (BGB) zurück.
-    Dies wird von 'Agent Dirk' genutzt, um gezielte Anfragen an den
-    zuständigen Agenten weiterzugeben.
+# Fach-Agenten, Dirks Routing-Werkzeug transfer_to_agent(agent) und seine
+# Instruktionen entstehen aus swarm_agents.json (anderer Pfad:
+# SWARM_AGENTS_PATH). Ein neuer Fach-Agent ist nur ein weiterer Eintrag dort.
+# Fach-Agenten werden erst erzeugt, wenn sie zum ersten Mal gebraucht werden;
+# je Eintrag gibt es später einen eigenen Tab im Notebook.
+# SWARM_SINGLE_ROUTING_TOOL=0: wieder eine transfer_to_agent_*-Funktion je Agent.
+# -----------------------------------------------------------------------------
+agent_registry = AgentRegistry.load(
+    os.getenv("SWARM_AGENTS_PATH", DEFAULT_REGISTRY_PATH),
+    single_routing_tool=os.getenv("SWARM_SINGLE_ROUTING_TOOL", "1") != "0",
+)
+
+# Lokaler Vorab-Router: Er nutzt dieselben Schlüsselwort-Regeln wie Dirks
+# Instruktionen und erkennt z. B. "BGB" oder "Baurecht" ohne GPT-4-Aufruf.
+keyword_router = KeywordRouter.from_registry(agent_registry)
+
+# Zweite Stufe: ein aus Dirks protokollierten Entscheidungen gelerntes Modell
+# (swarm_classifier.py). Ist es sich sicher, entfällt der Routing-Aufruf auch
+# ohne Schlüsselwort; sonst entscheidet weiterhin Dirk.
+router = LearnedRouter.from_env(keyword_router, agent_registry)
+
+# Spans für einen Teil der Turns (SWARM_TRACE_SAMPLE), siehe swarm_tracing.py
+tracer = shared_tracer()
+
+# -----------------------------------------------------------------------------
+# GUI-Funktionalität:
+# -----------------------------------------------------------------------------
+def send_message():
     """
-    return agent_bgb
+    Reagiert auf den Klick des 'Send'-Buttons. 
+    1) Liest die Nutzereingabe aus dem Eingabefeld `input_field`. 
+    2) Identifiziert den aktiven Tab (sprich den aktuell ausgewählten Agenten). 
+    3) Reiht die Anfrage an das GPT-4-Modell in die Lane des Tabs im
+       Worker-Pool ein. Das Vorab-Routing und das Erzeugen des Agenten
+       geschehen erst dort (process_message), nicht im Hauptthread.
+
+    Warum Threading?
+    - Um die GUI reaktionsfähig zu halten, wird der aufwändige Netzwerkaufruf 
+      nicht im Hauptthread ausgeführt, sondern parallel in einem Worker-Thread.
 
-def transfer_to_agent_hgb():
+    Warum ein Pool mit Lanes?
+    - Die Zahl der Threads bleibt fest, auch wenn sehr schnell gesendet wird.
+    - Nachrichten aus demselben Tab werden in Einsendereihenfolge bearbeitet,
+      verschiedene Tabs laufen parallel.
+    - Sind zu viele Anfragen offen, wird die Eingabe abgelehnt und bleibt im
+      Eingabefeld stehen (Back-Pressure).
     """
-    Liefert das Agent-Objekt für das Handelsgesetzbuch (HGB) zurück.
+    user_input = input_field.get().strip()
+    if not user_input:
+        return  # Vermeidet leere Eingaben
+
+    # Ermittelt den aktuell gewählten Tab im Notebook (Reiter-Steuerung).
+    current_tab = chat_tabs.select()
+    current_agent_name = chat_tabs.tab(current_tab, "text")
+
+    # Reiht die Netzwerk-/API-Anfrage in die Lane des aktuellen Tabs ein.
+    try:
+        worker_pool.submit(
+            current_agent_name, process_message, user_input, current_agent_name, time.perf_counter()
+        )
+    except queue.Full:
+        append_chat_text(
+            current_agent_name,
+            "Zu viele offene Anfragen – bitte warten, bis einige beantwortet sind.\n\n",
+        )
+        return
+
+    # Leert das Eingabefeld
+    input_field.delete(0, ctk.END)
+
+def process_message(user_input, agent_name, submitted=None):
     """
-    return agent_hgb
+    Führt den eigentlichen Request an das GPT-4-Modell aus, 
+    läuft in einem Thread des Worker-Pools (Lane des jeweiligen Tabs).
+
+    Vorgehensweise:
+    0) Der Agent des Tabs wird aus der Registry geholt (beim ersten Mal
+       erzeugt). Im Dirk-Tab prüft zuerst der lokale Schlüsselwort-Router die
+       Eingabe; bei genau einem Treffer (oder einer sicheren Vorhersage des
+       gelernten Routing-Modells) geht sie direkt an diesen Fach-Agenten –
+       und zwar in dessen Lane (answer_message).
+    1) client.run(...) ruft den Swarm-Client auf und leitet die Anfrage an den 
+       jeweiligen Agenten weiter.
+    2) Die letzte Antwort wird extrahiert und im UI sichtbar gemacht.
+    3) Im Falle eines Fehlers wird dieser angezeigt.
+
+    'submitted' ist der Zeitpunkt (time.perf_counter) des Einreihens; die
+    Wartezeit bis hier und die weiteren Phasen des Turns gehen an metrics.
+    Wird der Turn aufgezeichnet, ist er die Wurzel eines Traces (tracer);
+    der Span "turn" endet erst mit der Antwort, auch wenn sie in einer
+    anderen Lane entsteht.
+    """
+    if submitted is not None:
+        metrics.observe("queue", time.perf_counter() - submitted)
+    turn = metrics.turn()
+    span = tracer.start("turn", tab=agent_name)
+    # Vorab-Routing ohne GPT-4: Nur im Dirk-Tab, und nur bei eindeutigem Treffer
+    # bzw. sicherer Vorhersage.
+    if agent_name == agent_registry.dispatcher_name:
+        if fanout_enabled:
+            targets = keyword_router.match(user_input)
+            if len(targets) > 1:
+                tracer.bind(span).run(process_fanout, user_input, agent_name, list(targets.values()))
+                turn.finish(agent_name)
+                span.end()
+                return
+        with turn.phase("routing"):
+            agent = router.route(user_input)
+        if agent.name != agent_name:
+            # Der Verlauf des Fach-Agenten wird nur in dessen Lane gelesen und
+            # geschrieben – sonst liefe dieser Turn parallel zu dort wartenden
+            worker_pool.forward(
+                agent.name, tracer.bind(span).run, answer_message, user_input, agent_name, agent, turn, span
+            )
+            return
+    else:
+        agent = agent_registry[agent_name]
+    tracer.bind(span).run(answer_message, user_input, agent_name, agent, turn, span)
+
+def answer_message(user_input, asked_name, agent, turn, span):
+    """
+    Zweiter Teil von process_message, in der Lane von 'agent': Verlauf lesen,
+    GPT-4 fragen, Antwort anzeigen und speichern.
+
+    Jeder Tab hat seinen eigenen Verlauf (tab_histories). Mitgeschickt wird
+    nur der Verlauf des Agenten, der die Anfrage bearbeitet; der Turn landet
+    anschließend im Verlauf des Agenten, der geantwortet hat (dort, wo er
+    auch angezeigt wird).
+
+    Reihenfolge: Der Verlauf eines Agenten wird nur in seiner eigenen Lane
+    gelesen, so sieht jede Anfrage alle Turns, die vor ihr in dieser Lane
+    fertig wurden. Leitet erst das Modell unterwegs an einen anderen Agenten
+    weiter, wird der Turn dort in Fertigstellungsreihenfolge angehängt –
+    Frage und Antwort am Stück, aber ein gleichzeitig in dessen Lane
+    laufender Turn sieht ihn nicht mehr.
+    """
+    span.set(agent=agent.name)
+    try:
+        if agent.name != asked_name and share_context:
+            tab_histories.share(asked_name, agent.name, limit=SHARED_CONTEXT_MESSAGES)
+        messages = tab_histories[agent.name].window(agent) + [{"role": "user", "content": user_input}]
+        if STREAM_RESPONSES:
+            process_message_streaming(user_input, agent, messages, turn)
+            return
+        try:
+            # Anfrage an GPT-4 via Swarm-Client
+            response = response_cache.run(client, agent, messages)
+            agent_response = response.messages[-1]["content"]
+            # Lokal: Lanes laufen parallel, ein gemeinsamer "aktueller Agent"
+            # könnte zwischendurch von einem anderen Worker überschrieben werden
+            answered_by = response.agent.name
+            turn.finish(answered_by)
+            span.set(answered_by=answered_by)
+            add_history_turn(agent.name, answered_by, user_input, agent_response)
+            store_id = record_turn(answered_by, user_input, agent_response)
+
+            # Aktualisiert die GUI im Hauptthread mithilfe von root.after(...)
+            render_later(update_chat_history, user_input, agent_response, answered_by, store_id)
+        except Exception as e:
+            # Falls ein Fehler auftritt, ab in den Chatverlauf
+            turn.finish(agent.name, error=True)
+            render_later(update_chat_history, user_input, f"Error: {e}", agent.name)
+    finally:
+        span.end()
+
+def process_message_streaming(user_input, agent, messages, turn):
+    """
+    Streaming-Variante von `process_message`, ebenfalls im Worker-Thread.
+
+    Vorgehensweise:
+    1) client.run(..., stream=True) liefert die Antwort Stück für Stück.
+    2) Die Textstücke werden im DeltaBatcher gesammelt und gebündelt per
+       root.after(...) in den ScrolledText des antwortenden Agenten geschrieben.
+       So bleibt der Tk-Hauptthread auch bei sehr vielen Tokens flüssig.
+    3) Übernimmt unterwegs ein anderer Agent (Handoff), wird das im Tab des
+       bisherigen Agenten vermerkt und im Tab des neuen Agenten weitergeschrieben.
+    'turn' (swarm_metrics.Turn) misst erstes Textstück, Weiterleitungen und
+    das Ende der Antwort.
+    """
+    active_name = agent.name
+    batcher = DeltaBatcher(lambda name, text: render_later(append_chat_text, name, text))
+    root.after(0, begin_stream_turn, user_input, active_name)
+    try:
+        for event in stream_events(client, agent, messages, cache=response_cache):
+            if event.kind == "delta":
+                turn.first_token(event.agent_name)
+                batcher.add(event.agent_name, event.text)
+            elif event.kind == "handoff":
+                turn.handoff(active_name)
+                batcher.flush()
+                root.after(0, announce_handoff, user_input, active_name, event.agent_name)
+                active_name = event.agent_name
+            elif event.kind == "done":
+                answered_by = event.response.agent.name
+                turn.finish(answered_by)
+                tracer.current().set(answered_by=answered_by)
+                agent_response = event.response.messages[-1]["content"]
+                add_history_turn(agent.name, answered_by, user_input, agent_response)
+                store_id = record_turn(answered_by, user_input, agent_response)
+                root.after(0, set_turn_id, active_name, store_id)
+        batcher.flush()
+    except Exception as e:
+        # Falls ein Fehler auftritt, ab in den Chatverlauf
+        turn.finish(active_name, error=True)
+        batcher.flush()
+        root.after(0, append_chat_text, active_name, f"Error: {e}")
+    root.after(0, append_chat_text, active_name, "\n\n")
 
-def transfer_to_agent_stgb():
+def process_fanout(user_input, agent_name, agents):
     """
-    Liefert das Agent-Objekt für das Strafgesetzbuch (StGB) zurück.
+    Fan-out im Worker-Thread: Die Frage geht gleichzeitig an alle erkannten
+    Fach-Agenten. Ihre Antworten erscheinen im Dirk-Tab, sobald sie fertig
+    sind, zum Schluss optional zusammengeführt (SWARM_FANOUT_SYNTHESIS).
     """
-    return agent_stgb
+    history = tab_histories[agent_name]
+    messages = lambda agent: history.window(agent) + [{"role": "user", "content": user_input}]
+    root.after(0, begin_stream_turn, user_input, agent_name)
+    text = ""
+    results = []
+    for result in fan_out.ask(agents, messages):
+        results.append(result)
+        # Die erste Antwort beginnt in einer neuen Zeile nach "Agent Dirk: "
+        part = ("\n" if len(results) == 1 else "") + format_result(result, markdown=False)
+        text += part
+        root.after(0, append_chat_text, agent_name, part)
+    if FANOUT_SYNTHESIS and sum(result.error is None for result in results) > 1:
+        try:
+            part = f"Zusammenfassung:\n{fan_out.synthesize(user_input, results)}\n\n"
+        except Exception as e:
+            part = f"Zusammenführung fehlgeschlagen: {e}\n\n"
+        text += part
+        root.after(0, append_chat_text, agent_name, part)
+    tab_histories.add_turn(agent_name, user_input, text.strip())
+    store_id = record_turn(agent_name, user_input, text.strip())
+    root.after(0, set_turn_id, agent_name, store_id)
 
-def transfer_to_agent_arbgb():
+def render_later(function, *args):
     """
-    Liefert das Agent-Objekt für das Arbeitsgesetzbuch (ArbGB) zurück.
-    (Hier exemplarisch mit 'Agent Arbeitsrecht' bezeichnet.)
+    Wie root.after(0, function, *args), misst aber zusätzlich, wie lange es
+    dauert, bis der Hauptthread die Anzeige aktualisiert hat (Phase "render",
+    im Trace des Turns als Span "ui_update").
     """
-    return agent_arbgb
+    scheduled = time.perf_counter()
+    span = tracer.start("ui_update", function=function.__name__)
 
-def transfer_to_agent_sgb():
+    def run():
+        function(*args)
+        metrics.observe("render", time.perf_counter() - scheduled)
+        span.end()
+
+    root.after(0, run)
+
+def toggle_fanout():
     """
-    Liefert das Agent-Objekt für das Sozialgesetzbuch (SGB) zurück.
+    Menüpunkt "Mehrere Fachgebiete parallel befragen" (Hauptthread).
     """
-    return agent_sgb
+    global fanout_enabled
+    fanout_enabled = fanout_var.get()
 
-def transfer_to_agent_steuerrecht():
+def add_history_turn(asked_name, answered_name, user_input, agent_response):
     """
-    Liefert das Agent-Objekt für das Steuerrecht zurück.
+    Schreibt einen Turn in den Verlauf des antwortenden Agenten. Hat Swarm
+    unterwegs weitergeleitet, erhält dieser vorher (falls gewünscht) den
+    Kontext des Agenten, an den die Anfrage ging. Hat Dirk entschieden, wird
+    seine Wahl für den Routing-Klassifikator protokolliert.
     """
-    return agent_steuerrecht
+    router.observe(user_input, asked_name, answered_name)
+    if answered_name != asked_name and share_context:
+        tab_histories.share(asked_name, answered_name, limit=SHARED_CONTEXT_MESSAGES)
+    tab_histories.add_turn(answered_name, user_input, agent_response)
 
-def transfer_to_agent_vwvfgg():
+def toggle_share_context():
     """
-    Liefert das Agent-Objekt für das Verwaltungsverfahrensgesetz (VwVfG) zurück.
+    Menüpunkt "Kontext bei Weiterleitung mitgeben" (Hauptthread). Die Worker
+    lesen nur die einfache Variable share_context.
     """
-    return agent_vwvfgg
+    global share_context
+    share_context = share_context_var.get()
 
-def transfer_to_agent_vwgo():
+def record_turn(agent_name, user_input, agent_response):
     """
-    Liefert das Agent-Objekt für die Verwaltungsgerichtsordnung (VwGO) zurück.
+    Legt Frage und Antwort dauerhaft im Gesprächsspeicher ab. Kehrt sofort
+    zurück – geschrieben wird gebündelt in einem Hintergrund-Thread.
+    Liefert die (später feststehende) ID der Nutzernachricht; über sie lädt
+    der Tab den Turn wieder nach, nachdem er aus der Anzeige verdrängt wurde.
     """
-    return agent_vwgo
+    store_id = conversation_store.append(STORE_CONVERSATION, agent_name, "user", user_input)
+    conversation_store.append(STORE_CONVERSATION, agent_name, "assistant", agent_response)
+    return store_id
 
-def transfer_to_agent_uwg():
+def restore_history(agent_name):
     """
-    Liefert das Agent-Objekt für das Gesetz gegen den unlauteren Wettbewerb (UWG) zurück.
+    Das Ende des gespeicherten Verlaufs eines Tabs als Modellkontext
+    (TabHistories lädt es beim ersten Zugriff auf den Tab). Es sind dieselben
+    Nachrichten, die restore_transcript anzeigt.
     """
-    return agent_uwg
+    stored = conversation_store.tail(STORE_CONVERSATION, agent_name, limit=TRANSCRIPT_PAGE_SIZE)
+    return [{"role": message.role, "content": message.content} for message in stored]
 
-def transfer_to_agent_urhg():
+def restore_transcript(agent_name):
     """
-    Liefert das Agent-Objekt für das Urheberrechtsgesetz (UrhG) zurück.
+    Zeigt in einem neu aufgebauten Agenten-Tab nur die letzten
+    TRANSCRIPT_PAGE_SIZE gespeicherten Nachrichten an. Ältere Nachrichten
+    werden erst beim Hochscrollen nachgeladen (load_older_messages).
     """
-    return agent_urhg
+    stored = conversation_store.tail(STORE_CONVERSATION, agent_name, limit=TRANSCRIPT_PAGE_SIZE)
+    view = chat_views[agent_name]
+    for store_id, text in stored_turns(stored, agent_name):
+        view.begin_turn(store_id)
+        view.append(text)
+    view.has_older = bool(stored)
 
-def transfer_to_agent_patg():
+def chat_view(agent_name):
     """
-    Liefert das Agent-Objekt für das Patentrecht (PatG) zurück.
+    Liefert den ChatView eines Agenten-Tabs; beim ersten Zugriff wird er mit
+    dem Ende des gespeicherten Verlaufs gefüllt. Ein View sammelt Änderungen
+    auch ohne Widget – gezeichnet wird erst, wenn der Tab sichtbar ist.
     """
-    return agent_patg
+    view = chat_views.get(agent_name)
+    if view is None:
+        view = chat_views[agent_name] = ChatView(max_turns=MAX_RENDERED_TURNS)
+        restore_transcript(agent_name)
+    return view
 
-def transfer_to_agent_markeng():
+def chat_widget(agent_name):
     """
-    Liefert das Agent-Objekt für das Markengesetz (MarkenG) zurück.
+    Liefert den ScrolledText eines Agenten-Tabs. Er wird erst bei der ersten
+    Auswahl des Tabs erzeugt. Beim Start gibt es so nur leere Tab-Rahmen –
+    der Aufbau aller 15 Chatverläufe entfällt.
     """
-    return agent_markeng
+    frame = agent_frame_map[agent_name]
+    if frame.chat_history is None:
+        # Ein ScrolledText-Widget für den Chatverlauf
+        chat_history = scrolledtext.ScrolledText(frame, wrap=ctk.WORD, state=ctk.DISABLED)
+        if chat_font_size is not None:
+            current_font = font.Font(font=chat_history['font'])
+            chat_history.config(font=(current_font.actual('family'), chat_font_size))
+        chat_history.pack(expand=True, fill="both")
+        chat_history.configure(
+            yscrollcommand=lambda first, last, name=agent_name: on_chat_scroll(name, first, last)
+        )
+        frame.chat_history = chat_history
+        chat_view(agent_name).attach(chat_history)
+    return frame.chat_history
 
-def transfer_to_agent_owig():
+def on_tab_changed(event):
     """
-    Liefert das Agent-Objekt für das Gesetz über Ordnungswidrigkeiten (OWiG) zurück.
+    Baut den Inhalt eines Tabs auf, sobald er zum ersten Mal ausgewählt wird,
+    und zeichnet nur noch den sichtbaren Tab. Der bisher sichtbare Tab
+    sammelt Änderungen ab jetzt nur noch.
     """
-    return agent_owig
+    global visible_chat_name
+    agent_name = chat_tabs.tab(chat_tabs.select(), "text")
+    if agent_name == visible_chat_name:
+        return
+    if visible_chat_name is not None:
+        chat_view(visible_chat_name).hide()
+    visible_chat_name = agent_name
+    chat_widget(agent_name)
+    chat_view(agent_name).show()
 
-def transfer_to_agent_baubgb():
+def load_older_messages(agent_name):
     """
-    Liefert das Agent-Objekt für das Baugesetzbuch (BauGB) zurück.
+    Lädt die nächste Seite älterer Nachrichten aus dem Speicher und fügt
+    sie oben im Tab ein, ohne die aktuelle Scrollposition zu verlieren.
     """
-    return agent_baubgb
-
-# -----------------------------------------------------------------------------
-# Definition der Agenten:
-# -----------------------------------------------------------------------------
-# Jeder Agent erhält einen Namen, spezifische Instruktionen sowie das zu 
-# verwendende Modell (GPT-4).
-# -----------------------------------------------------------------------------
-agent_dirk = Agent(
-    name="Agent Dirk",
-    instructions=(
-        "Du bist ein freundlicher Service-Agent, der Anfragen filtert und an "
-        "andere Agenten weitergibt. Wir haben mehrere Agenten: "
-        "1. BGB: Er ist auf das Bürgerliche Gesetzbuch spezialisiert. "
-        "2. HGB: Er ist auf das Handelsgesetzbuch spezialisiert. "
-        "3. StGB: Er ist auf das Strafgesetzbuch spezialisiert. "
-        "4. Arbeitsrecht: Er ist auf das Arbeitsgesetzbuch spezialisiert. "
-        "5. Sozialrecht: Er ist auf das Sozialgesetzbuch spezialisiert. "
-        "6. Steuerrecht: Er ist auf das Steuerrecht spezialisiert. "
-        "7. Verwaltungsverfahrensgesetz: Er ist auf das Verwaltungsverfahrensgesetz spezialisiert. "
-        "8. Verwaltungsgerichtsordnung: Er ist auf die Verwaltungsgerichtsordnung spezialisiert. "
-        "9. Gesetz gegen den unlauteren Wettbewerb: Er ist auf das Gesetz gegen den unlauteren Wettbewerb spezialisiert. "
-        "10. Urheberrechtsgesetz: Er ist auf das Urheberrechtsgesetz spezialisiert. "
-        "11. Patentrecht: Er ist auf das Patentrecht spezialisiert. "
-        "12. Markengesetz: Er ist auf das Markengesetz spezialisiert. "
-        "13. Gesetz über Ordnungswidrigkeiten: Er ist auf das Gesetz über Ordnungswidrigkeiten spezialisiert. "
-        "14. Baurecht: Er ist auf das Baurecht spezialisiert. "
-        "Leite die Anfragen an den entsprechenden Agenten weiter. "
-        "Wenn die Anfrage das Wort 'BGB' enthält, leite sie an Agent BGB weiter. "
-        "Wenn die Anfrage das Wort 'HGB' enthält, leite sie an Agent HGB weiter. "
-        "Wenn die Anfrage das Wort 'StGB' enthält, leite sie an Agent StGB weiter. "
-        "Wenn die Anfrage das Wort 'Arbeitsrecht' enthält, leite sie an Agent Arbeitsrecht weiter. "
-        "Wenn die Anfrage das Wort 'Sozialrecht' enthält, leite sie an Agent Sozialrecht weiter. "
-        "Wenn die Anfrage das Wort 'Steuerrecht' enthält, leite sie an Agent Steuerrecht weiter. "
-        "Wenn die Anfrage das Wort 'Verwaltungsverfahrensgesetz' enthält, leite sie an Agent Verwaltungsverfahrensgesetz weiter. "
-        "Wenn die Anfrage das Wort 'Verwaltungsgerichtsordnung' enthält, leite sie an Agent Verwaltungsgerichtsordnung weiter. "
-        "Wenn die Anfrage das Wort 'Gesetz gegen den unlauteren Wettbewerb' enthält, leite sie an Agent Gesetz gegen den unlauteren Wettbewerb weiter. "
-        "Wenn die Anfrage das Wort 'Urheberrechtsgesetz' enthält, leite sie an Agent Urheberrechtsgesetz weiter. "
-        "Wenn die Anfrage das Wort 'Patentrecht' enthält, leite sie an Agent Patentrecht weiter. "
-        "Wenn die Anfrage das Wort 'Markengesetz' enthält, leite sie an Agent Markengesetz weiter. "
-        "Wenn die Anfrage das Wort 'Gesetz über Ordnungswidrigkeiten' enthält, leite sie an Agent Gesetz über Ordnungswidrigkeiten weiter. "
-        "Wenn die Anfrage das Wort 'Baurecht' enthält, leite sie an Agent Baurecht weiter. "
-    ),
-    functions=[
-        transfer_to_agent_bgb, transfer_to_agent_hgb, transfer_to_agent_stgb,
-        transfer_to_agent_arbgb, transfer_to_agent_sgb, transfer_to_agent_steuerrecht,
-        transfer_to_agent_vwvfgg, transfer_to_agent_vwgo, transfer_to_agent_uwg,
-        transfer_to_agent_urhg, transfer_to_agent_patg, transfer_to_agent_markeng,
-        transfer_to_agent_owig, transfer_to_agent_baubgb
-    ],
-    model="gpt-4"
-)
-
-agent_bgb = Agent(
-    name="Agent BGB",
-    instructions="Du bist spezialisiert auf das Bürgerliche Gesetzbuch (BGB) und gibst detaillierte Informationen und Ratschläge zu diesem Bereich.",
-    model="gpt-4"
-)
-
-agent_hgb = Agent(
-    name="Agent HGB",
-    instructions="Du bist spezialisiert auf das Handelsgesetzbuch (HGB) und gibst detaillierte Informationen und Ratschläge zu diesem Bereich.",
-    model="gpt-4"
-)
-
-agent_stgb = Agent(
-    name="Agent StGB",
-    instructions="Du bist spezialisiert auf das Strafgesetzbuch (StGB) und gibst detaillierte Informationen und Ratschläge zu diesem Bereich.",
-    model="gpt-4"
-)
-
-agent_arbgb = Agent(
-    name="Agent Arbeitsrecht",
-    instructions="Du bist spezialisiert auf das Arbeitsgesetzbuch (ArbGB) und gibst detaillierte Informationen und Ratschläge zu diesem Bereich.",
-    model="gpt-4"
-)
-
-agent_sgb = Agent(
-    name="Agent Sozialrecht",
-    instructions="Du bist spezialisiert auf das Sozialgesetzbuch (SGB) und gibst detaillierte Informationen und Ratschläge zu diesem Bereich.",
-    model="gpt-4"
-)
-
-agent_steuerrecht = Agent(
-    name="Agent Steuerrecht",
-    instructions="Du bist spezialisiert auf das Steuerrecht (AO, EStG, UStG, etc.) und gibst detaillierte Informationen und Ratschläge zu diesem Bereich.",
-    model="gpt-4"
-)
-
-agent_vwvfgg = Agent(
-    name="Agent Verwaltungsverfahrensgesetz",
-    instructions="Du bist spezialisiert auf das Verwaltungsverfahrensgesetz (VwVfG) und gibst detaillierte Informationen und Ratschläge zu diesem Bereich.",
-    model="gpt-4"
-)
-
-agent_vwgo = Agent(
-    name="Agent Verwaltungsgerichtsordnung",
-    instructions="Du bist spezialisiert auf die Verwaltungsgerichtsordnung (VwGO) und gibst detaillierte Informationen und Ratschläge zu diesem Bereich.",
-    model="gpt-4"
-)
-
-agent_uwg = Agent(
-    name="Agent Gesetz gegen den unlauteren Wettbewerb",
-    instructions="Du bist spezialisiert auf das Gesetz gegen den unlauteren Wettbewerb (UWG) und gibst detaillierte Informationen und Ratschläge zu diesem Bereich.",
-    model="gpt-4"
-)
-
-agent_urhg = Agent(
-    name="Agent Urheberrechtsgesetz",
-    instructions="Du bist spezialisiert auf das Urheberrechtsgesetz (UrhG) und gibst detaillierte Informationen und Ratschläge zu diesem Bereich.",
-    model="gpt-4"
-)
+    view = chat_view(agent_name)
+    before_id = view.older_before_id()
+    if before_id is None:
+        return
+    stored = conversation_store.page_before(
+        STORE_CONVERSATION, before_id, agent_name, limit=TRANSCRIPT_PAGE_SIZE
+    )
+    if not stored:
+        view.has_older = False  # Anfang erreicht
+        return
+    view.prepend_turns(stored_turns(stored, agent_name))
 
-agent_patg = Agent(
-    name="Agent Patentrecht",
-    instructions="Du bist spezialisiert auf das Patentrecht (PatG) und gibst detaillierte Informationen und Ratschläge zu diesem Bereich.",
-    model="gpt-4"
-)
-
-agent_markeng = Agent(
-    name="Agent Markengesetz",
-    instructions="Du bist spezialisiert auf das Markengesetz (MarkenG) und gibst detaillierte Informationen und Ratschläge zu diesem Bereich.",
-    model="gpt-4"
-)
-
-agent_owig = Agent(
-    name="Agent Gesetz über Ordnungswidrigkeiten",
-    instructions="Du bist spezialisiert auf das Gesetz über Ordnungswidrigkeiten (OWiG) und gibst detaillierte Informationen und Ratschläge zu diesem Bereich.",
-    model="gpt-4"
-)
-
-agent_baubgb = Agent(
-    name="Agent Baurecht",
-    instructions="Du bist spezialisiert auf das Baugesetzbuch (BauGB) und gibst detaillierte Informationen und Ratschläge zu diesem Bereich.",
-    model="gpt-4"
-)
-
-# -----------------------------------------------------------------------------
-# GUI-Funktionalität:
-# -----------------------------------------------------------------------------
-def send_message():
+def on_chat_scroll(agent_name, first, last):
     """
-    Reagiert auf den Klick des 'Send'-Buttons. 
-    1) Liest die Nutzereingabe aus dem Eingabefeld `input_field`. 
-    2) Identifiziert den aktiven Tab (sprich den aktuell ausgewählten Agenten). 
-    3) Führt die Anfrage an das GPT-4-Modell in einem separaten Thread aus.
-
-    Warum Threading?
-    - Um die GUI reaktionsfähig zu halten, wird der aufwändige Netzwerkaufruf 
-      nicht im Hauptthread ausgeführt, sondern parallel in einem Worker-Thread.
+    yscrollcommand der Chatverläufe: Steht der sichtbare Bereich ganz oben
+    (und ist der Inhalt länger als das Fenster), werden ältere Nachrichten
+    nachgeladen. Ist wieder das Ende erreicht, wird der Tab auf
+    MAX_RENDERED_TURNS gekürzt.
     """
-    global current_agent
-    user_input = input_field.get().strip()
-    if not user_input:
-        return  # Vermeidet leere Eingaben
-
-    # Ermittelt den aktuell gewählten Tab im Notebook (Reiter-Steuerung).
-    current_tab = chat_tabs.select()
-    current_agent_name = chat_tabs.tab(current_tab, "text")
-
-    # Ordnet den eingestellten Agenten (z.B. "Agent BGB") dem globalen current_agent zu.
-    for agent in agents:
-        if agent.name == current_agent_name:
-            current_agent = agent
-            break
-
-    # Speichert die Nachricht in der gemeinsamen Nachrichtenhistorie.
-    messages.append({"role": "user", "content": user_input})
+    agent_frame_map[agent_name].chat_history.vbar.set(first, last)
+    view = chat_view(agent_name)
+    if float(first) <= 0.0 and float(last) < 1.0 and view.has_older:
+        root.after_idle(load_older_messages, agent_name)
+    elif float(last) >= 1.0 and view.turn_count > view.max_turns:
+        root.after_idle(view.trim)
 
-    # Startet die Netzwerk-/API-Anfrage in einem separaten Thread.
-    threading.Thread(target=process_message, args=(user_input, current_agent)).start()
-
-    # Leert das Eingabefeld
-    input_field.delete(0, ctk.END)
+def begin_stream_turn(user_input, agent_name):
+    """
+    Beginnt im Tab des Agenten einen neuen Gesprächsschritt, in den die
+    gestreamte Antwort anschließend hineingeschrieben wird.
+    """
+    view = chat_view(agent_name)
+    view.begin_turn()
+    view.append(f"You: {user_input}\n{agent_name}: ")
+    chat_tabs.select(chat_tabs.index(agent_frame_map[agent_name]))
 
-def process_message(user_input, agent):
+def set_turn_id(agent_name, store_id):
     """
-    Führt den eigentlichen Request an das GPT-4-Modell aus, 
-    wird in einem separaten Thread gestartet. 
+    Trägt nach dem Streaming die Speicher-ID des laufenden Turns nach.
+    """
+    chat_view(agent_name).set_turn_id(store_id)
 
-    Vorgehensweise:
-    1) client.run(...) ruft den Swarm-Client auf und leitet die Anfrage an den 
-       jeweiligen Agenten weiter.
-    2) Die letzte Antwort wird extrahiert und im UI sichtbar gemacht.
-    3) Im Falle eines Fehlers wird dieser angezeigt.
+def announce_handoff(user_input, from_name, to_name):
     """
-    global current_agent
-    try:
-        # Anfrage an GPT-4 via Swarm-Client
-        response = client.run(
-            agent=agent,
-            messages=messages
-        )
-        agent_response = response.messages[-1]["content"]
-        current_agent = response.agent
+    Macht einen Handoff mitten im Stream sichtbar: Hinweis im alten Tab,
+    danach geht es im Tab des neuen Agenten weiter.
+    """
+    append_chat_text(from_name, f"→ weitergeleitet an {to_name}\n\n")
+    begin_stream_turn(user_input, to_name)
 
-        # Aktualisiert die GUI im Hauptthread mithilfe von root.after(...)
-        root.after(0, update_chat_history, user_input, agent_response, current_agent.name)
-    except Exception as e:
-        # Falls ein Fehler auftritt, ab in den Chatverlauf
-        root.after(0, update_chat_history, user_input, f"Error: {e}", current_agent.name)
+def append_chat_text(agent_name, text):
+    """
+    Hängt Text an den Chatverlauf eines Agenten-Tabs an (nur im Hauptthread
+    aufrufen, z. B. über root.after(...)). Gezeichnet wird gebündelt im
+    nächsten Frame bzw. erst, wenn der Tab sichtbar ist.
+    """
+    chat_view(agent_name).append(text)
 
-def update_chat_history(user_input, agent_response, agent_name):
+def update_chat_history(user_input, agent_response, agent_name, store_id=None):
     """
     Diese Funktion aktualisiert den Chatverlauf eines bestimmten Agenten-Tabs 
     im Hauptthread. 
     - user_input: Die Nutzereingabe
     - agent_response: Die Antwort vom Modell
     - agent_name: Name des gerade aktiven Agenten
+    - store_id: ID der gespeicherten Nutzernachricht (None bei Fehlern)
     """
     # Identifiziere den Frame, der zu diesem Agenten gehört
     frame = agent_frame_map[agent_name]
-    chat_history = frame.chat_history
-    chat_history.config(state=ctk.NORMAL)
-    chat_history.insert(ctk.END, f"You: {user_input}\n")
-    chat_history.insert(ctk.END, f"{agent_name}: {agent_response}\n\n")
-    chat_history.config(state=ctk.DISABLED)
-    chat_history.see(ctk.END)
+    view = chat_view(agent_name)
+    view.begin_turn(store_id)
+    view.append(f"You: {user_input}\n{agent_name}: {agent_response}\n\n")
 
     # Wechselt in den entsprechenden Tab, um die neue Nachricht sichtbar zu machen
     chat_tabs.select(chat_tabs.index(frame))
@@ -361,16 +535,38 @@ def set_api_key():
     Erlaubt das Setzen eines neuen OpenAI API-Schlüssels zur Laufzeit. 
     1) Liest den Key aus dem Eingabefeld `api_key_entry`.
     2) Speichert ihn per set_key(...) in der .env-Datei.
-    3) Aktualisiert openai.api_key, sodass die neuen Anfragen mit dem 
-       aktualisierten Schlüssel durchgeführt werden.
+    3) Ersetzt den Swarm-Client atomar durch einen neuen mit dem neuen
+       Schlüssel (client.rotate). Neue Anfragen laufen über den neuen Client,
+       bereits laufende enden noch auf dem alten.
     """
     new_key = api_key_entry.get().strip()
     if new_key:
         set_key(".env", "OPENAI_API_KEY", new_key)
-        openai.api_key = new_key
+        os.environ["OPENAI_API_KEY"] = new_key
+        client.rotate(new_key)
         api_key_entry.delete(0, ctk.END)
         print("API-Schlüssel erfolgreich gespeichert.")
 
+def update_queue_status(depth):
+    """
+    Zeigt die aktuelle Zahl offener Anfragen im Worker-Pool an
+    (nur im Hauptthread aufrufen).
+    """
+    queue_status_label.configure(text=f"Offene Anfragen: {depth}/{MAX_PENDING_REQUESTS}")
+
+def show_cache_stats():
+    """
+    Zeigt Treffer und Fehlzugriffe des Antwort-Caches in einem Dialog an.
+    """
+    messagebox.showinfo("Cache-Statistik", response_cache.describe())
+
+def show_metrics():
+    """
+    Zeigt Laufzeiten je Phase, Modellaufrufe und Tokens je Agent in einem
+    Dialog an.
+    """
+    messagebox.showinfo("Laufzeiten und Tokens", f"{metrics.describe()}\n\n{router.describe()}")
+
 def change_theme(theme):
     """
     Ermöglicht das Umschalten zwischen 'light' und 'dark' Themen im GUI. 
@@ -382,19 +578,89 @@ def change_font_size(size):
     """
     Ändert die Schriftgröße in allen Chatverläufen. 
     Hierzu wird das 'font' Paket verwendet, um die aktuell eingestellte Schrift 
-    auszulesen und zu modifizieren.
+    auszulesen und zu modifizieren. Noch nicht aufgebaute Tabs übernehmen die
+    Größe, sobald sie erzeugt werden.
     """
-    for agent in agents:
-        frame = agent_frame_map[agent.name]
+    global chat_font_size
+    chat_font_size = size
+    for frame in agent_frame_map.values():
         chat_history = frame.chat_history
+        if chat_history is None:
+            continue
         current_font = font.Font(font=chat_history['font'])
         chat_history.config(font=(current_font.actual('family'), size))
 
 # -----------------------------------------------------------------------------
 # Initialisierung der Nachrichtenhistorie und Auswahl des Start-Agenten:
 # -----------------------------------------------------------------------------
-messages = [{"role": "user", "content": "Welche Agenten stehen zur Verfügung? Und wobei helfen sie?"}]
-current_agent = agent_dirk  # Der globale "current_agent" startet mit Agent Dirk
+# Jeder Tab hat einen eigenen HistoryManager. Er zählt die Tokens jeder
+# Nachricht einmalig und schickt pro Anfrage nur so viel Verlauf mit, wie in
+# das Token-Budget passt (SWARM_TOKEN_BUDGET). Ältere Nachrichten fasst
+# "Agent Zusammenfassung" im Hintergrund zusammen (swarm_summarizer erzeugt
+# ihn beim ersten Bedarf). Nach einem Neustart beginnt jeder Tab mit dem Ende
+# seines gespeicherten Verlaufs (restore_history).
+summarize = swarm_summarizer(client)
+tab_histories = TabHistories(
+    lambda: HistoryManager(
+        default_budget=int(os.getenv("SWARM_TOKEN_BUDGET", "6000")),
+        summarizer=summarize,
+    ),
+    initial={
+        agent_registry.dispatcher_name: [
+            {"role": "user", "content": "Welche Agenten stehen zur Verfügung? Und wobei helfen sie?"}
+        ],
+    },
+    restore=restore_history,
+)
+
+# Leitet Dirk an einen Fach-Agenten weiter, bekommt dieser auf Wunsch die
+# letzten SHARED_CONTEXT_MESSAGES Nachrichten aus Dirks Tab mit (umschaltbar
+# im Menü "Weiterleitung"; Standard über SWARM_SHARE_CONTEXT=1).
+share_context = os.getenv("SWARM_SHARE_CONTEXT", "0") == "1"
+SHARED_CONTEXT_MESSAGES = int(os.getenv("SWARM_SHARED_CONTEXT_MESSAGES", "4"))
+
+# Fan-out: Findet der Router im Dirk-Tab mehrere Fachgebiete, werden deren
+# Agenten gleichzeitig befragt (umschaltbar im Menü "Weiterleitung").
+fanout_enabled = os.getenv("SWARM_FANOUT", "0") == "1"
+FANOUT_SYNTHESIS = os.getenv("SWARM_FANOUT_SYNTHESIS", "1") != "0"
+
+# Antwort-Cache: LRU im Arbeitsspeicher plus SQLite-Datei, die Neustarts
+# übersteht. Wiederholte Fragen werden ohne GPT-4-Aufruf beantwortet.
+response_cache = ResponseCache(
+    agent_registry,
+    path=os.getenv("SWARM_CACHE_PATH", "swarm_cache.sqlite3"),
+    ttl=int(os.getenv("SWARM_CACHE_TTL", str(24 * 60 * 60))),
+)
+
+# Eigener, begrenzter Thread-Pool für die gleichzeitig befragten Fach-Agenten
+fan_out = FanOut(client, cache=response_cache, max_workers=int(os.getenv("SWARM_FANOUT_WORKERS", "8")))
+
+# -----------------------------------------------------------------------------
+# Dauerhafter Gesprächsspeicher (SQLite im WAL-Modus, nur Anhängen). Beim Start
+# wird je Tab nur das Ende des Verlaufs geladen, Älteres beim Hochscrollen.
+# -----------------------------------------------------------------------------
+conversation_store = ConversationStore(os.getenv("SWARM_STORE_PATH", "swarm_conversations.sqlite3"))
+STORE_CONVERSATION = "ai_swarm_2"
+TRANSCRIPT_PAGE_SIZE = 20
+
+# Messwerte aller Turns und Modellaufrufe dieses Prozesses (swarm_metrics);
+# mit SWARM_METRICS_PORT zusätzlich als Prometheus-Endpunkt /metrics.
+metrics = shared_metrics()
+
+# Begrenzte Darstellung: je Tab höchstens so viele Turns im ScrolledText
+MAX_RENDERED_TURNS = int(os.getenv("SWARM_RENDERED_TURNS", "60"))
+chat_views = {}  # Agentenname -> ChatView
+visible_chat_name = None  # Tab, dessen ChatView gerade zeichnet
+
+# -----------------------------------------------------------------------------
+# Worker-Pool: feste Anzahl Threads, eine FIFO-Lane pro Agenten-Tab.
+# Änderungen der Warteschlangentiefe werden per root.after(...) angezeigt.
+# -----------------------------------------------------------------------------
+worker_pool = LaneExecutor(
+    max_workers=WORKER_COUNT,
+    max_pending=MAX_PENDING_REQUESTS,
+    on_change=lambda depth: root.after(0, update_queue_status, depth),
+)
 
 # -----------------------------------------------------------------------------
 # Erstellung des Hauptfensters mittels CustomTkinter:
@@ -419,37 +685,54 @@ font_size_menu.add_command(label="Klein", command=lambda: change_font_size(10))
 font_size_menu.add_command(label="Mittel", command=lambda: change_font_size(12))
 font_size_menu.add_command(label="Groß", command=lambda: change_font_size(14))
 
+stats_menu = Menu(menu, tearoff=0)
+menu.add_cascade(label="Statistik", menu=stats_menu)
+stats_menu.add_command(label="Cache-Statistik", command=show_cache_stats)
+stats_menu.add_command(label="Laufzeiten und Tokens", command=show_metrics)
+
+routing_menu = Menu(menu, tearoff=0)
+menu.add_cascade(label="Weiterleitung", menu=routing_menu)
+share_context_var = ctk.BooleanVar(value=share_context)
+routing_menu.add_checkbutton(
+    label="Kontext bei Weiterleitung mitgeben",
+    variable=share_context_var,
+    command=toggle_share_context,
+)
+fanout_var = ctk.BooleanVar(value=fanout_enabled)
+routing_menu.add_checkbutton(
+    label="Mehrere Fachgebiete parallel befragen",
+    variable=fanout_var,
+    command=toggle_fanout,
+)
+
 # -----------------------------------------------------------------------------
 # Chatverlauf (Tabbed Notebook für jeden Agenten):
 # -----------------------------------------------------------------------------
 chat_tabs = ttk.Notebook(root)
 chat_tabs.grid(row=0, column=0, columnspan=3, padx=10, pady=10, sticky="nsew")
 
-agents = [
-    agent_dirk, agent_bgb, agent_hgb, agent_stgb, agent_arbgb, agent_sgb, agent_steuerrecht,
-    agent_vwvfgg, agent_vwgo, agent_uwg, agent_urhg, agent_patg, agent_markeng,
-    agent_owig, agent_baubgb
-]
-
 # Ein Dictionary, um jedem Agenten seinen Frame zuzuordnen
 agent_frame_map = {}
+chat_font_size = None  # über das Menü gewählte Schriftgröße (None = Standard)
 
-for agent in agents:
-    # Erstelle für jeden Agenten einen eigenen Frame
+for agent_name in agent_registry.names():
+    # Erstelle für jeden Agenten einen eigenen, zunächst leeren Frame. Der
+    # Chatverlauf darin entsteht erst bei der ersten Auswahl (chat_widget).
     frame = ctk.CTkFrame(chat_tabs)
-    # Ein ScrolledText-Widget für den Chatverlauf
-    chat_history = scrolledtext.ScrolledText(frame, wrap=ctk.WORD, state=ctk.DISABLED)
-    chat_history.pack(expand=True, fill="both")
-    frame.chat_history = chat_history
+    frame.chat_history = None
 
     # Füge den Frame als neuen Tab hinzu
-    chat_tabs.add(frame, text=agent.name)
+    chat_tabs.add(frame, text=agent_name)
 
     # Speichere die Zuordnung in unserem Dictionary
-    agent_frame_map[agent.name] = frame
+    agent_frame_map[agent_name] = frame
+
+chat_tabs.bind("<<NotebookTabChanged>>", on_tab_changed)
 
-# Setze den Verteiler-Agenten (Agent Dirk) als Standard-Tab
+# Setze den Verteiler-Agenten (Agent Dirk) als Standard-Tab und baue nur
+# dessen Chatverlauf (mit dem neuesten Stück des gespeicherten Verlaufs) auf
 chat_tabs.select(0)
+on_tab_changed(None)
 
 # -----------------------------------------------------------------------------
 # Eingabefeld für Nutzernachrichten:
@@ -475,6 +758,12 @@ api_key_entry.grid(row=2, column=1, padx=10, pady=10, sticky="ew")
 api_key_button = ctk.CTkButton(root, text="Speichern", command=set_api_key)
 api_key_button.grid(row=2, column=2, padx=10, pady=10, sticky="ew")
 
+# -----------------------------------------------------------------------------
+# Statuszeile mit der Zahl offener Anfragen im Worker-Pool:
+# -----------------------------------------------------------------------------
+queue_status_label = ctk.CTkLabel(root, text=f"Offene Anfragen: 0/{MAX_PENDING_REQUESTS}")
+queue_status_label.grid(row=3, column=0, columnspan=3, padx=10, pady=(0, 10), sticky="w")
+
 # -----------------------------------------------------------------------------
 # Grid-Konfiguration zur dynamischen Größenanpassung:
 # -----------------------------------------------------------------------------
@@ -484,8 +773,15 @@ root.grid_columnconfigure(2, weight=1)
 root.grid_rowconfigure(0, weight=1)
 root.grid_rowconfigure(1, weight=0)
 root.grid_rowconfigure(2, weight=0)
+root.grid_rowconfigure(3, weight=0)
 
 # -----------------------------------------------------------------------------
-# Starten der Haupt-Loop:
+# Starten der Haupt-Loop (nur beim direkten Start, damit swarm_loadtest.py
+# das Modul importieren kann, ohne dass die Loop blockiert):
 # -----------------------------------------------------------------------------
-root.mainloop()
+if __name__ == "__main__":
+    serve_from_env(metrics)
+    root.mainloop()
+
+    # Nach dem Schließen des Fensters noch ausstehende Nachrichten speichern
+    conversation_store.close()
@@ -27,293 +27,408 @@ Wichtige Bausteine:
 Aufbau des Codes:
 -----------------
 1. Laden und Setzen des API-Schlüssels über dotenv und openai
-2. Deklaration von Funktionen, die (theoretisch) für "function calling" benötigt
-   werden. Diese Funktionen geben den jeweiligen Fach-Agenten zurück.
-3. Erstellung und Konfiguration der Agenten – insbesondere "Agent Dirk"
+2. Laden der Agenten-Registry (swarm_agents.json). Sie erzeugt die Funktionen
+   für "function calling", die den jeweiligen Fach-Agenten zurückgeben.
+3. Ebenfalls aus der Registry: die Agenten – insbesondere "Agent Dirk"
    mit dem Vermerk, dass er bestimmte Schlüsselwörter erkennt ("BGB", "HGB", usw.)
    und dann an den passenden Agenten delegieren soll.
-4. Globale Variablen für den Chatverlauf `messages` und den Start-Agenten
-   `current_agent`
+4. Sitzungszustand (gr.State) je Browser mit dem Chatverlauf (Token-Budget
+   über `HistoryManager`), dem angezeigten Verlauf (`ChatWindow`) und dem
+   Start-Agenten
 5. Die Funktion `send_message`, die von Gradio aufgerufen wird und sowohl
    die Nutzer-Eingabe als auch die generierte Antwort in den Chatverlauf
-   schreibt.
-6. Die Funktion `set_api_key`, die .env aktualisiert und den globalen
-   openai.api_key zur Laufzeit ändert.
+   schreibt. Der Verlauf liegt auf dem Server; an den Browser gehen nur die
+   letzten Turns ("Ältere Nachrichten laden" blättert weiter zurück).
+6. Die Funktion `set_api_key`, die .env aktualisiert und die Swarm-Clients
+   zur Laufzeit gegen solche mit dem neuen Schlüssel austauscht.
 7. Das Gradio-Interface (Blocks, Chatbot, Textbox, Buttons), in dem
    Nutzerinteraktionen und Anzeigen gesteuert werden.
 
 ================================================================================
 """
 
-import gradio as gr
-from swarm import Swarm, Agent
 import os
 from dotenv import load_dotenv, set_key
-import openai
+from swarm_startup import BackgroundClient, create_async_swarm_client
 
 # ---------------------------------------------------------------------
 # 1) .env laden und OpenAI-Schlüssel initialisieren
 # ---------------------------------------------------------------------
 # Wir laden die Umgebungsvariablen (insb. OPENAI_API_KEY) aus einer .env-Datei.
-# Anschließend legen wir openai.api_key auf den geladenen Schlüssel.
-# Danach erstellen wir einen "Swarm"-Client zur Kommunikation mit GPT-4.
+# Danach erstellen wir einen "Swarm"-Client zur Kommunikation mit GPT-4 –
+# im Hintergrund: openai und swarm werden geladen, während im Vordergrund
+# gradio importiert und die Oberfläche aufgebaut wird. Die erste Anfrage
+# wartet bei Bedarf, bis der Client bereit ist.
+#  - async_client: AsyncSwarm (swarm_async.py) für die Chat-Anfragen. Die
+#    Gradio-Handler sind "async def" und belegen keinen Thread, während sie
+#    auf GPT-4 warten.
+#  - client: synchroner Swarm-Client für die Zusammenfassung des Verlaufs,
+#    die ohnehin in einem eigenen Hintergrund-Thread läuft.
 load_dotenv()
-openai.api_key = os.getenv("OPENAI_API_KEY")
-client = Swarm()
-
-# ---------------------------------------------------------------------
-# 2) Definition der Agenten-Funktionen (falls "function calling" genutzt wird)
-# ---------------------------------------------------------------------
-# Diese Funktionen kehren jeweils ein bestimmtes Agentenobjekt zurück und
-# dienen als mögliche "Functions" im Swarm-Framework, die GPT-4 aufrufen kann,
-# wenn es entsprechende Schlüsselwörter erkennt (z. B. "BGB").
-# In diesem Skript wird ihre Existenz vermerkt, auch wenn die automatische
-# Erkennung nicht immer 1:1 verlässlich ist.
-def transfer_to_agent_bgb():
-    return agent_bgb
-
-def transfer_to_agent_hgb():
-    return agent_hgb
-
-def transfer_to_agent_stgb():
-    return agent_stgb
-
-def transfer_to_agent_arbgb():
-    return agent_arbgb
-
-def transfer_to_agent_sgb():
-    return agent_sgb
-
-def transfer_to_agent_steuerrecht():
-    return agent_steuerrecht
-
-def transfer_to_agent_vwvfgg():
-    return agent_vwvfgg
-
-def transfer_to_agent_vwgo():
-    return agent_vwgo
-
-def transfer_to_agent_uwg():
-    return agent_uwg
-
-def transfer_to_agent_urhg():
-    return agent_urhg
-
-def transfer_to_agent_patg():
-    return agent_patg
-
-def transfer_to_agent_markeng():
-    return agent_markeng
-
-def transfer_to_agent_owig():
-    return agent_owig
-
-def transfer_to_agent_baubgb():
-    return agent_baubgb
+async_client = BackgroundClient(factory=create_async_swarm_client, name="swarm-async-client-init")
+client = BackgroundClient()
 
+import gradio as gr
+import uuid
+from swarm_registry import AgentRegistry, DEFAULT_REGISTRY_PATH
+from swarm_router import KeywordRouter
+from swarm_classifier import LearnedRouter
+from swarm_streaming import async_stream_events
+from swarm_history import HistoryManager, swarm_summarizer
+from swarm_cache import ResponseCache
+from swarm_store import ConversationStore
+from swarm_chat_window import ChatWindow
+from swarm_fanout import FanOut, format_result
+from swarm_metrics import shared_metrics, serve_from_env
+from swarm_tracing import shared_tracer
+
+# Antworten werden standardmäßig Token für Token gestreamt. Mit
+# SWARM_STREAM=0 in der .env-Datei lässt sich der blockierende Modus
+# (komplette Antwort auf einmal) wieder aktivieren.
+STREAM_RESPONSES = os.getenv("SWARM_STREAM", "1") != "0"
 
 # ---------------------------------------------------------------------
-# 3) Definition der Agenten
+# 2) + 3) Agenten und Weiterleitungsfunktionen aus der Registry
 # ---------------------------------------------------------------------
-# Hier werden die einzelnen Agent-Objekte für das Swarm-Framework erzeugt.
-# Jeder Agent hat:
+# Alle Agent-Objekte für das Swarm-Framework entstehen aus swarm_agents.json
+# (anderer Pfad: SWARM_AGENTS_PATH). Jeder Fach-Agent hat dort:
 #  - name: Identifikationsname (z. B. "Agent BGB")
-#  - instructions: Text-Anweisungen, nach denen er seine Antworten generiert
-#  - model: Das GPT-4-Modell, das verwendet wird
+#  - keyword: das Wort, bei dem Dirk an ihn weiterleitet (z. B. "BGB")
+#  - law: das Rechtsgebiet, aus dem seine Instruktionen erzeugt werden
 #
-# "Agent Dirk" fungiert als Verteiler-Agent, der laut seinen Instruktionen
-# die Anfrage an den passenden Fach-Agenten weiterreichen soll, wenn ein
-# bestimmtes Wort (z. B. "BGB", "HGB", etc.) in der Benutzeranfrage vorkommt.
-agent_dirk = Agent(
-    name="Agent Dirk",
-    instructions=(
-        "Du bist ein freundlicher Service-Agent, der Anfragen filtert und an "
-        "andere Agenten weitergibt. Wir haben mehrere Agenten: "
-        "1. BGB: Er ist auf das Bürgerliche Gesetzbuch spezialisiert. "
-        "2. HGB: Er ist auf das Handelsgesetzbuch spezialisiert. "
-        "3. StGB: Er ist auf das Strafgesetzbuch spezialisiert. "
-        "4. Arbeitsrecht: Er ist auf das Arbeitsgesetzbuch spezialisiert. "
-        "5. Sozialrecht: Er ist auf das Sozialgesetzbuch spezialisiert. "
-        "6. Steuerrecht: Er ist auf das Steuerrecht spezialisiert. "
-        "7. Verwaltungsverfahrensgesetz: Er ist auf das Verwaltungsverfahrensgesetz spezialisiert. "
-        "8. Verwaltungsgerichtsordnung: Er ist auf die Verwaltungsgerichtsordnung spezialisiert. "
-        "9. Gesetz gegen den unlauteren Wettbewerb: Er ist auf das Gesetz gegen den unlauteren Wettbewerb spezialisiert. "
-        "10. Urheberrechtsgesetz: Er ist auf das Urheberrechtsgesetz spezialisiert. "
-        "11. Patentrecht: Er ist auf das Patentrecht spezialisiert. "
-        "12. Markengesetz: Er ist auf das Markengesetz spezialisiert. "
-        "13. Gesetz über Ordnungswidrigkeiten: Er ist auf das Gesetz über Ordnungswidrigkeiten spezialisiert. "
-        "14. Baurecht: Er ist auf das Baurecht spezialisiert. "
-        "Leite die Anfragen an den entsprechenden Agenten weiter. "
-        "Wenn die Anfrage das Wort 'BGB' enthält, leite sie an Agent BGB weiter. "
-        "Wenn die Anfrage das Wort 'HGB' enthält, leite sie an Agent HGB weiter. "
-        "Wenn die Anfrage das Wort 'StGB' enthält, leite sie an Agent StGB weiter. "
-        "Wenn die Anfrage das Wort 'Arbeitsrecht' enthält, leite sie an Agent Arbeitsrecht weiter. "
-        "Wenn die Anfrage das Wort 'Sozialrecht' enthält, leite sie an Agent Sozialrecht weiter. "
-        "Wenn die Anfrage das Wort 'Steuerrecht' enthält, leite sie an Agent Steuerrecht weiter. "
-        "Wenn die Anfrage das Wort 'Verwaltungsverfahrensgesetz' enthält, leite sie an Agent Verwaltungsverfahrensgesetz weiter. "
-        "Wenn die Anfrage das Wort 'Verwaltungsgerichtsordnung' enthält, leite sie an Agent Verwaltungsgerichtsordnung weiter. "
-        "Wenn die Anfrage das Wort 'Gesetz gegen den unlauteren Wettbewerb' enthält, leite sie an Agent Gesetz gegen den unlauteren Wettbewerb weiter. "
-        "Wenn die Anfrage das Wort 'Urheberrechtsgesetz' enthält, leite sie an Agent Urheberrechtsgesetz weiter. "
-        "Wenn die Anfrage das Wort 'Patentrecht' enthält, leite sie an Agent Patentrecht weiter. "
-        "Wenn die Anfrage das Wort 'Markengesetz' enthält, leite sie an Agent Markengesetz weiter. "
-        "Wenn die Anfrage das Wort 'Gesetz über Ordnungswidrigkeiten' enthält, leite sie an Agent Gesetz über Ordnungswidrigkeiten weiter. "
-        "Wenn die Anfrage das Wort 'Baurecht' enthält, leite sie an Agent Baurecht weiter. "
-    ),
-    functions=[
-        transfer_to_agent_bgb, transfer_to_agent_hgb, transfer_to_agent_stgb,
-        transfer_to_agent_arbgb, transfer_to_agent_sgb, transfer_to_agent_steuerrecht,
-        transfer_to_agent_vwvfgg, transfer_to_agent_vwgo, transfer_to_agent_uwg,
-        transfer_to_agent_urhg, transfer_to_agent_patg, transfer_to_agent_markeng,
-        transfer_to_agent_owig, transfer_to_agent_baubgb
-    ],
-    model="gpt-4"
+# Daraus erzeugt die Registry auch das Werkzeug transfer_to_agent(agent), das
+# GPT-4 per "function calling" mit dem Kürzel des Fach-Agenten aufruft
+# (SWARM_SINGLE_ROUTING_TOOL=0: eine transfer_to_agent_*-Funktion je Agent),
+# und die Instruktionen von "Agent Dirk", dem Verteiler-Agenten. Fach-Agenten
+# werden erst gebaut, wenn zum ersten Mal an sie weitergeleitet wird (Agent
+# Dirk bei der ersten Anfrage).
+agent_registry = AgentRegistry.load(
+    os.getenv("SWARM_AGENTS_PATH", DEFAULT_REGISTRY_PATH),
+    single_routing_tool=os.getenv("SWARM_SINGLE_ROUTING_TOOL", "1") != "0",
 )
 
-agent_bgb = Agent(
-    name="Agent BGB",
-    instructions="Du bist spezialisiert auf das Bürgerliche Gesetzbuch (BGB) und gibst detaillierte Informationen und Ratschläge zu diesem Bereich.",
-    model="gpt-4"
+# Lokaler Vorab-Router: Er nutzt dieselben Schlüsselwort-Regeln wie Dirks
+# Instruktionen und erkennt z. B. "BGB" oder "Baurecht" ohne GPT-4-Aufruf.
+keyword_router = KeywordRouter.from_registry(agent_registry)
+
+# Zweite Stufe: ein aus Dirks protokollierten Entscheidungen gelerntes Modell
+# (swarm_classifier.py). Ist es sich sicher, entfällt der Routing-Aufruf auch
+# ohne Schlüsselwort; sonst entscheidet weiterhin Dirk.
+router = LearnedRouter.from_env(keyword_router, agent_registry)
+
+# Zuordnung Agentenname -> Agent, z. B. um den im Sitzungszustand
+# gespeicherten Namen wieder in ein Agent-Objekt zu übersetzen. Die Registry
+# verhält sich wie ein Dictionary und baut den Agenten beim ersten Zugriff.
+agents_by_name = agent_registry
+
+# Antwort-Cache: LRU im Arbeitsspeicher plus SQLite-Datei, die Neustarts
+# übersteht. Wiederholte Fragen werden ohne GPT-4-Aufruf beantwortet.
+response_cache = ResponseCache(
+    agent_registry,
+    path=os.getenv("SWARM_CACHE_PATH", "swarm_cache.sqlite3"),
+    ttl=int(os.getenv("SWARM_CACHE_TTL", str(24 * 60 * 60))),
 )
 
-agent_hgb = Agent(
-    name="Agent HGB",
-    instructions="Du bist spezialisiert auf das Handelsgesetzbuch (HGB) und gibst detaillierte Informationen und Ratschläge zu diesem Bereich.",
-    model="gpt-4"
-)
-
-agent_stgb = Agent(
-    name="Agent StGB",
-    instructions="Du bist spezialisiert auf das Strafgesetzbuch (StGB) und gibst detaillierte Informationen und Ratschläge zu diesem Bereich.",
-    model="gpt-4"
-)
-
-agent_arbgb = Agent(
-    name="Agent Arbeitsrecht",
-    instructions="Du bist spezialisiert auf das Arbeitsgesetzbuch (ArbGB) und gibst detaillierte Informationen und Ratschläge zu diesem Bereich.",
-    model="gpt-4"
-)
-
-agent_sgb = Agent(
-    name="Agent Sozialrecht",
-    instructions="Du bist spezialisiert auf das Sozialgesetzbuch (SGB) und gibst detaillierte Informationen und Ratschläge zu diesem Bereich.",
-    model="gpt-4"
-)
-
-agent_steuerrecht = Agent(
-    name="Agent Steuerrecht",
-    instructions="Du bist spezialisiert auf das Steuerrecht (AO, EStG, UStG, etc.) und gibst detaillierte Informationen und Ratschläge zu diesem Bereich.",
-    model="gpt-4"
-)
-
-agent_vwvfgg = Agent(
-    name="Agent Verwaltungsverfahrensgesetz",
-    instructions="Du bist spezialisiert auf das Verwaltungsverfahrensgesetz (VwVfG) und gibst detaillierte Informationen und Ratschläge zu diesem Bereich.",
-    model="gpt-4"
-)
-
-agent_vwgo = Agent(
-    name="Agent Verwaltungsgerichtsordnung",
-    instructions="Du bist spezialisiert auf die Verwaltungsgerichtsordnung (VwGO) und gibst detaillierte Informationen und Ratschläge zu diesem Bereich.",
-    model="gpt-4"
-)
-
-agent_uwg = Agent(
-    name="Agent Gesetz gegen den unlauteren Wettbewerb",
-    instructions="Du bist spezialisiert auf das Gesetz gegen den unlauteren Wettbewerb (UWG) und gibst detaillierte Informationen und Ratschläge zu diesem Bereich.",
-    model="gpt-4"
-)
-
-agent_urhg = Agent(
-    name="Agent Urheberrechtsgesetz",
-    instructions="Du bist spezialisiert auf das Urheberrechtsgesetz (UrhG) und gibst detaillierte Informationen und Ratschläge zu diesem Bereich.",
-    model="gpt-4"
-)
-
-agent_patg = Agent(
-    name="Agent Patentrecht",
-    instructions="Du bist spezialisiert auf das Patentrecht (PatG) und gibst detaillierte Informationen und Ratschläge zu diesem Bereich.",
-    model="gpt-4"
-)
-
-agent_markeng = Agent(
-    name="Agent Markengesetz",
-    instructions="Du bist spezialisiert auf das Markengesetz (MarkenG) und gibst detaillierte Informationen und Ratschläge zu diesem Bereich.",
-    model="gpt-4"
-)
-
-agent_owig = Agent(
-    name="Agent Gesetz über Ordnungswidrigkeiten",
-    instructions="Du bist spezialisiert auf das Gesetz über Ordnungswidrigkeiten (OWiG) und gibst detaillierte Informationen und Ratschläge zu diesem Bereich.",
-    model="gpt-4"
-)
-
-agent_baubgb = Agent(
-    name="Agent Baurecht",
-    instructions="Du bist spezialisiert auf das Baugesetzbuch (BauGB) und gibst detaillierte Informationen und Ratschläge zu diesem Bereich.",
-    model="gpt-4"
-)
-
-# Diese Liste kann nützlich sein, falls wir später im Code über alle Agenten
-# iterieren möchten (z. B. zur Anzeige aller Agenten).
-agents_list = [
-    agent_dirk, agent_bgb, agent_hgb, agent_stgb, agent_arbgb, agent_sgb,
-    agent_steuerrecht, agent_vwvfgg, agent_vwgo, agent_uwg, agent_urhg,
-    agent_patg, agent_markeng, agent_owig, agent_baubgb
-]
+# Fan-out: Fragen, die mehrere Rechtsgebiete berühren, gehen gleichzeitig an
+# mehrere Fach-Agenten – entweder an die im Bereich "Mehrere Fachgebiete"
+# ausgewählten oder (mit SWARM_FANOUT=1) an alle, deren Schlüsselwörter der
+# Router in der Frage findet. Die Antworten erscheinen, sobald sie fertig sind,
+# und werden optional in einem letzten Aufruf zusammengeführt.
+FANOUT_AUTO = os.getenv("SWARM_FANOUT", "0") == "1"
+FANOUT_SYNTHESIS = os.getenv("SWARM_FANOUT_SYNTHESIS", "1") != "0"
+fan_out = FanOut(client, cache=response_cache, max_workers=int(os.getenv("SWARM_FANOUT_WORKERS", "8")))
+
+# Laufzeiten je Phase (Routing, Weiterleitung, erstes Textstück, Antwort) und
+# Tokens je Agent (swarm_metrics). Anzeige im Bereich *Statistik*; mit
+# SWARM_METRICS_PORT zusätzlich als Prometheus-Endpunkt /metrics.
+metrics = shared_metrics()
+
+# Ein Anteil der Turns (SWARM_TRACE_SAMPLE) wird als Span-Baum aus
+# Modellaufrufen, Funktionen und Weiterleitungen aufgezeichnet
+# (swarm_tracing.py, Export nach SWARM_TRACE_PATH).
+tracer = shared_tracer()
 
 # ---------------------------------------------------------------------
-# 4) Zentrale Variablen & Methoden: Chat-Logik
+# 4) Sitzungszustand & Methoden: Chat-Logik
 # ---------------------------------------------------------------------
-# 'messages' speichert die gesamte Unterhaltung in Form einer Liste von
-# Dictionary-Objekten, die jeweils eine Rolle ("role") und den Textinhalt
-# ("content") haben. "current_agent" ist der Agent, an den wir standardmäßig
-# die Anfrage senden (in diesem Beispiel: Agent Dirk als Startpunkt).
-messages = []
-current_agent = agent_dirk  # Wir starten mit Agent Dirk
-
-def send_message(user_input, chat_history):
+# Jede Browser-Sitzung erhält ihren eigenen Zustand (gr.State), damit sich
+# mehrere Nutzer nicht gegenseitig den Verlauf überschreiben:
+#  - "history": die gesamte Unterhaltung (HistoryManager) als Liste von
+#    Dictionaries mit Rolle ("role") und Textinhalt ("content"); an GPT-4
+#    geht davon nur das Fenster, das in das Token-Budget passt
+#  - "chat": der angezeigte Verlauf (ChatWindow). Er bleibt auf dem Server;
+#    der Browser erhält nur die letzten CHAT_WINDOW Turns
+#  - "agent_name": Name des Agenten, an den wir standardmäßig die Anfrage
+#    senden (Startpunkt: Agent Dirk). Hat ein Fach-Agent geantwortet, gehen
+#    Folgefragen direkt an ihn, bis das Thema wechselt (router.follow_up)
+#  - "session_id": Schlüssel der Sitzung im dauerhaften Gesprächsspeicher
+#    (wird beim Laden der Seite vergeben oder per ?session=<ID> übernommen)
+# Gespeichert wird nur der Name, nicht das Agent-Objekt selbst: Gradio kopiert
+# den Startwert für jede Sitzung (deepcopy), der Name bleibt dabei eindeutig.
+def new_session():
+    """
+    Liefert den Startzustand einer neuen Chat-Sitzung.
+    """
+    return {
+        "history": HistoryManager(
+            default_budget=TOKEN_BUDGET,
+            summarizer=swarm_summarizer(client),
+        ),
+        "chat": ChatWindow(window=CHAT_WINDOW),
+        "agent_name": agent_registry.dispatcher_name,
+        "session_id": None,
+    }
+
+# Token-Budget pro Anfrage (Verlauf + Instruktionen des Agenten). Ältere
+# Nachrichten werden ausgelassen und im Hintergrund zusammengefasst.
+TOKEN_BUDGET = int(os.getenv("SWARM_TOKEN_BUDGET", "6000"))
+
+# Dauerhafter Gesprächsspeicher (SQLite im WAL-Modus, nur Anhängen). Beim
+# Wiederherstellen einer Sitzung wird nur das Ende des Verlaufs geladen.
+conversation_store = ConversationStore(os.getenv("SWARM_STORE_PATH", "swarm_conversations.sqlite3"))
+TRANSCRIPT_TAIL = 40
+
+# Anzahl der Turns, die der Chatbot anzeigt (und Seitengröße beim Blättern).
+# Jede Nachricht überträgt so gleich viel, egal wie lang die Sitzung ist.
+CHAT_WINDOW = int(os.getenv("SWARM_CHAT_WINDOW", "20"))
+
+# Folgefragen direkt an den Fach-Agenten, der zuletzt geantwortet hat
+AGENT_AFFINITY = os.getenv("SWARM_AFFINITY", "1") != "0"
+
+# Wie viele Anfragen Gradio gleichzeitig abarbeitet und wie viele höchstens
+# in der Warteschlange stehen. Die Handler sind asynchron: Eine laufende
+# Anfrage kostet keinen Thread, daher sind hunderte gleichzeitig möglich.
+CONCURRENCY_LIMIT = int(os.getenv("SWARM_CONCURRENCY", "256"))
+QUEUE_MAX_SIZE = int(os.getenv("SWARM_QUEUE_SIZE", "1024"))
+
+@tracer.traced("turn")
+async def send_message(user_input, session, fanout_agents=None, synthesize=FANOUT_SYNTHESIS):
     """
     Wird von Gradio aufgerufen, sobald der Nutzer eine Nachricht absendet.
     ---------------------------------------------------------------------
     Parameter:
       - user_input: Der Text, den der Nutzer eingegeben hat
-      - chat_history: Die bisherige Historie, die der Chatbot in Gradio anzeigt
+      - session: Der Zustand dieser Browser-Sitzung (siehe new_session)
+      - fanout_agents: optional ausgewählte Fach-Agenten (Namen); ab zwei
+        Agenten werden alle gleichzeitig befragt (siehe send_fanout)
+      - synthesize: Antworten beim Fan-out zusammenführen
     ---------------------------------------------------------------------
     Ablauf:
       1) Prüfen, ob eine leere Nachricht vorliegt (falls ja, kein Update).
-      2) Speichern der Nutzernachricht in unserer internen 'messages'-Liste.
+      2) Speichern der Nutzernachricht im Verlauf ('history') der Sitzung.
       3) Aufruf von client.run(...) mit dem aktuellen Agenten (standardmäßig Dirk),
          wodurch GPT-4 eine Antwort erzeugt, ggf. an einen Fach-Agenten delegiert.
-      4) Speichern der erhaltenen KI-Antwort in 'messages' und Hinzufügen zum
-         Chatverlauf, das Gradio anzeigt.
-      5) Rückgabe des aktualisierten chat_history an Gradio, damit dieser
-         die neue Unterhaltung rendern kann.
+         Erkennt der lokale Schlüsselwort-Router eindeutig einen Fach-Agenten
+         (oder ist sich das gelernte Routing-Modell sicher), geht die Anfrage
+         direkt an diesen (ohne Routing-Aufruf an Dirk).
+      4) Speichern der erhaltenen KI-Antwort im Verlauf und Hinzufügen zum
+         Chatverlauf der Sitzung. Wird das Token-Budget überschritten,
+         fasst ein Hintergrund-Thread die ältesten Nachrichten zusammen.
+      5) Rückgabe der letzten Turns des Chatverlaufs (und des
+         Sitzungszustands) an Gradio, damit dieser sie rendern kann. Der
+         Browser schickt den Verlauf nie zurück.
+
+    Die Funktion ist ein asynchroner Generator und liefert jeweils
+    (Chatverlauf, laufender Turn, Sitzung). Im Streaming-Modus
+    (STREAM_RESPONSES) wächst nach jedem Textstück nur der laufende Turn
+    (eigenes Ausgabefeld unter dem Chatverlauf); das Fenster der letzten
+    Turns wird erst mit der fertigen Antwort einmal neu übertragen.
+    Übernimmt mitten im Stream ein anderer Agent, wird das im laufenden
+    Turn vermerkt. Während sie auf GPT-4 wartet, belegt sie keinen Thread.
+    Die Phasen des Turns werden in metrics gemessen; wird der Turn
+    aufgezeichnet, ist er die Wurzel eines Traces (tracer).
     """
-    global messages, current_agent
+    history = session["history"]
+    chat = session["chat"]
 
     # Falls nichts eingegeben wurde, aktualisieren wir den Chat nicht.
     if not user_input.strip():
-        return chat_history
+        yield gr.update(), gr.update(), session
+        return
+
+    # 1) User-Eingabe (Rolle: "user") im Verlauf ablegen
+    history.append({"role": "user", "content": user_input})
+    turn = metrics.turn()
+
+    # 2) GPT-4 Anfrage via Swarm. Hat zuletzt ein Fach-Agent geantwortet, geht
+    #    die Folgefrage direkt an ihn, außer das Thema wechselt. Solange Dirk
+    #    zuständig ist, prüft zuerst der lokale Router die Eingabe; bei genau
+    #    einem Treffer entfällt der Routing-Aufruf, sonst bleibt Dirk der
+    #    Ansprechpartner. Berührt die Frage mehrere Fachgebiete, werden diese
+    #    gleichzeitig befragt.
+    agent = None
+    with turn.phase("routing"):
+        if session["agent_name"] != agent_registry.dispatcher_name and not fanout_agents:
+            agent = router.follow_up(user_input, session["agent_name"])
+        if agent is None:
+            session["agent_name"] = agent_registry.dispatcher_name
+            targets = fanout_targets(user_input, fanout_agents)
+            if len(targets) <= 1:
+                agent = router.route(user_input)
+    if agent is None:
+        async for update in send_fanout(user_input, session, targets, synthesize):
+            yield update
+        turn.finish(" + ".join(target.name for target in targets))
+        return
+
+    tracer.current().set(agent=agent.name, session=session["session_id"])
+    swarm = await async_client.aget()
+    if not STREAM_RESPONSES:
+        try:
+            response = await response_cache.arun(swarm, agent, history.window(agent))
+        except Exception:
+            turn.finish(agent.name, error=True)
+            raise
+        agent_response = response.messages[-1]["content"]
+
+        # 'response.agent' enthält den Agenten, der zuletzt die Antwort gegeben hat.
+        answered_by = response.agent.name  # z. B. "Agent BGB" oder "Agent Dirk"
+        turn.finish(answered_by)
+        tracer.current().set(answered_by=answered_by)
+        router.observe(user_input, agent.name, answered_by)
+        remember_agent(session, answered_by)
+
+        # 3) Speichern der KI-Antwort im Verlauf, Rolle: "assistant"
+        history.append({"role": "assistant", "content": agent_response})
+        history.compact_in_background()
+        record_turn(session, answered_by, user_input, agent_response)
+
+        # 4) Auch in Gradio den Chatverlauf aktualisieren: Wir zeigen beim User-Teil
+        #    in eckigen Klammern an, welcher Agent geantwortet hat. Das ist optional,
+        #    macht aber nachvollziehbar, wer (laut Swarm) gesprochen hat.
+        chat.append(f"[{answered_by}] {user_input}", agent_response)
+        yield chat.view(), [], session
+        return
+
+    # Streaming: Der laufende Turn steht in einem eigenen Ausgabefeld und wird
+    # schrittweise mit den eintreffenden Textstücken gefüllt. Der Chatverlauf
+    # bleibt dabei unverändert (gr.update() überträgt nichts).
+    label = f"[{agent.name}] {user_input}"
+    streamed_text = ""
+    yield gr.update(), [(label, streamed_text)], session
+
+    active_name = agent.name
+    events = async_stream_events(swarm, agent, history.window(agent), cache=response_cache)
+    try:
+        async for event in events:
+            if event.kind == "delta":
+                turn.first_token(event.agent_name)
+                streamed_text += event.text
+            elif event.kind == "handoff":
+                # Sichtbarer Hinweis, dass ein anderer Agent übernommen hat
+                turn.handoff(active_name)
+                active_name = event.agent_name
+                label = f"[{event.agent_name}] {user_input}"
+                streamed_text += f"\n\n*→ weitergeleitet an {event.agent_name}*\n\n"
+            elif event.kind == "done":
+                # 3) Speichern der vollständigen KI-Antwort im Verlauf
+                turn.finish(event.response.agent.name)
+                tracer.current().set(answered_by=event.response.agent.name)
+                agent_response = event.response.messages[-1]["content"]
+                history.append({"role": "assistant", "content": agent_response})
+                history.compact_in_background()
+                record_turn(session, event.response.agent.name, user_input, agent_response)
+                router.observe(user_input, agent.name, event.response.agent.name)
+                remember_agent(session, event.response.agent.name)
+                # Fertig: Turn in den Chatverlauf übernehmen, Feld leeren
+                chat.append(label, streamed_text.strip())
+                yield chat.view(), [], session
+                continue
+            yield gr.update(), [(label, streamed_text.strip())], session
+    except Exception:
+        turn.finish(active_name, error=True)
+        raise
+
+def remember_agent(session, agent_name):
+    """
+    Merkt sich den Fach-Agenten, der geantwortet hat, für die Folgefragen der
+    Sitzung (SWARM_AFFINITY=0 schaltet das ab). Antwortet Dirk selbst, bleibt
+    er zuständig.
+    """
+    if AGENT_AFFINITY and agent_name in agents_by_name:
+        session["agent_name"] = agent_name
 
-    # 1) User-Eingabe (Rolle: "user") in 'messages' ablegen
-    messages.append({"role": "user", "content": user_input})
+def new_topic(session):
+    """Button "Neues Thema": Die nächste Frage geht wieder an Agent Dirk."""
+    session["agent_name"] = agent_registry.dispatcher_name
+    return session
 
-    # 2) GPT-4 Anfrage via Swarm
-    response = client.run(agent=current_agent, messages=messages)
-    agent_response = response.messages[-1]["content"]
+def fanout_targets(user_input, selected):
+    """
+    Fach-Agenten für den Fan-out: die ausgewählten, sonst (mit SWARM_FANOUT=1)
+    alle, die der Schlüsselwort-Router in der Frage erkennt.
+    """
+    if selected:
+        return [agents_by_name[name] for name in selected]
+    if FANOUT_AUTO:
+        return list(keyword_router.match(user_input).values())
+    return []
 
-    # 'response.agent' enthält den Agenten, der zuletzt die Antwort gegeben hat.
-    answered_by = response.agent.name  # z. B. "Agent BGB" oder "Agent Dirk"
+async def send_fanout(user_input, session, agents, synthesize):
+    """
+    Befragt mehrere Fach-Agenten gleichzeitig. Jede Antwort erscheint, sobald
+    sie fertig ist; die Wartezeit entspricht dem langsamsten Agenten. Zum
+    Schluss werden die Antworten optional zu einer zusammengeführt.
+    """
+    history = session["history"]
+    chat = session["chat"]
+    names = " + ".join(agent.name for agent in agents)
+    label = f"[{names}] {user_input}"
+    text = ""
+    yield gr.update(), [(label, text)], session
+
+    swarm = await async_client.aget()
+    results = []
+    async for result in fan_out.aask(swarm, agents, history.window):
+        results.append(result)
+        text += format_result(result)
+        yield gr.update(), [(label, text.strip())], session
+
+    answer = text.strip()
+    if synthesize and sum(result.error is None for result in results) > 1:
+        yield gr.update(), [(label, f"{answer}\n\n*Antworten werden zusammengeführt …*")], session
+        try:
+            answer = f"{text}**Zusammenfassung:**\n{await fan_out.asynthesize(swarm, user_input, results)}"
+        except Exception as e:
+            answer = f"{text}Zusammenführung fehlgeschlagen: {e}"
+
+    history.append({"role": "assistant", "content": answer})
+    history.compact_in_background()
+    record_turn(session, names, user_input, answer)
+    chat.append(label, answer)
+    yield chat.view(), [], session
+
+def load_earlier(session):
+    """
+    Button "Ältere Nachrichten laden": zeigt CHAT_WINDOW ältere Turns mehr an.
+    Was nicht mehr im Arbeitsspeicher liegt, kommt aus dem Gesprächsspeicher.
+    """
+    return session["chat"].load_earlier(conversation_store, session["session_id"]), session
 
-    # 3) Speichern der KI-Antwort in 'messages', Rolle: "assistant"
-    messages.append({"role": "assistant", "content": agent_response})
+def restore_session(session, request: gr.Request):
+    """
+    Wird beim Laden der Seite aufgerufen. Mit ?session=<ID> in der URL wird
+    eine frühere Sitzung fortgesetzt: Das Ende ihres Verlaufs erscheint im
+    Chat und dient wieder als Gesprächskontext. Ohne ID beginnt eine neue
+    Sitzung mit frischer ID.
+    """
+    session_id = request.query_params.get("session") if request else None
+    session["session_id"] = session_id or uuid.uuid4().hex
 
-    # 4) Auch in Gradio den Chatverlauf aktualisieren: Wir zeigen beim User-Teil
-    #    in eckigen Klammern an, welcher Agent geantwortet hat. Das ist optional,
-    #    macht aber nachvollziehbar, wer (laut Swarm) gesprochen hat.
-    chat_history.append((f"[{answered_by}] {user_input}", agent_response))
+    stored = conversation_store.tail(session["session_id"], limit=TRANSCRIPT_TAIL)
+    session["history"].extend({"role": message.role, "content": message.content} for message in stored)
+    session["chat"].restore(stored)
+    return session["chat"].view(), session, session["session_id"]
 
-    return chat_history
+def record_turn(session, agent_name, user_input, agent_response):
+    """
+    Legt Frage und Antwort dauerhaft ab. Kehrt sofort zurück – geschrieben
+    wird gebündelt in einem Hintergrund-Thread.
+    """
+    if session["session_id"] is None:
+        session["session_id"] = uuid.uuid4().hex
+    conversation_store.append(session["session_id"], agent_name, "user", user_input)
+    conversation_store.append(session["session_id"], agent_name, "assistant", agent_response)
 
 def set_api_key(new_key):
     """
@@ -323,17 +438,42 @@ def set_api_key(new_key):
       - new_key: Der vom Nutzer eingegebene neue API-Schlüssel
     Ablauf:
       1) Prüfen, ob der Schlüssel nicht leer ist.
-      2) In der .env-Datei setzen und openai.api_key aktualisieren.
+      2) In der .env-Datei setzen und beide Swarm-Clients atomar durch neue
+         mit diesem Schlüssel ersetzen. Laufende Anfragen enden noch auf
+         dem alten Client.
       3) Rückgabe einer Erfolgsmeldung (oder Fehlermeldung) an Gradio.
     """
     if new_key.strip():
         set_key(".env", "OPENAI_API_KEY", new_key)
-        openai.api_key = new_key
+        os.environ["OPENAI_API_KEY"] = new_key
+        async_client.rotate(new_key)
+        client.rotate(new_key)
         return "API-Schlüssel erfolgreich gespeichert."
     else:
         return "Kein Schlüssel eingegeben oder ungültig."
 
 
+def describe_stats():
+    """
+    Statistik für den Bereich *Statistik*: Antwort-Cache, zusammengelegte
+    Anfragen, eingesparte Routing-Aufrufe, Rate-Limiter sowie Laufzeiten
+    je Phase und Tokens je Agent.
+    swarm_ratelimit (mit httpx) wird erst hier importiert, um den Start
+    nicht zu verlangsamen.
+    """
+    from swarm_ratelimit import shared_limiter
+
+    lines = [response_cache.describe()]
+    if response_cache.flights is not None:
+        lines.append(response_cache.flights.describe())
+    lines.append(router.describe())
+    limiter = shared_limiter()
+    if limiter is not None:
+        lines.append(limiter.describe())
+    lines.extend(metrics.describe().splitlines())
+    return "  \n".join(lines)
+
+
 # ---------------------------------------------------------------------
 # 5) Gradio-UI
 # ---------------------------------------------------------------------
@@ -344,8 +484,16 @@ def set_api_key(new_key):
 with gr.Blocks() as demo:
     gr.Markdown("## Swarm-Chat mit Agent Dirk (Weiterleitung zu Fachagenten)")
 
-    # Das zentrale Chat-Widget
+    # Das zentrale Chat-Widget. Es zeigt nur die letzten CHAT_WINDOW Turns;
+    # ältere holt der Button darüber seitenweise vom Server.
+    load_earlier_btn = gr.Button("Ältere Nachrichten laden", size="sm")
     chatbot = gr.Chatbot([], elem_id="chatbot", label="Chatverlauf")
+    # Der gerade entstehende Turn: Beim Streaming wird nur dieses Feld nach
+    # jedem Textstück neu übertragen, nicht das ganze Fenster darüber.
+    current_turn = gr.Chatbot([], elem_id="current_turn", label="Aktuelle Antwort", height=240)
+
+    # Sitzungszustand: Gradio legt für jeden Browser-Tab eine eigene Kopie an.
+    session_state = gr.State(new_session())
 
     # Ein Eingabefeld und ein Button fürs Senden
     with gr.Row():
@@ -354,6 +502,7 @@ with gr.Blocks() as demo:
             placeholder="Ihre Nachricht eingeben...",
         )
         send_btn = gr.Button("Send")
+        new_topic_btn = gr.Button("Neues Thema")
 
     # Eingabefeld und Button, um den OpenAI-Schlüssel zur Laufzeit zu setzen
     api_key_input = gr.Textbox(
@@ -363,15 +512,64 @@ with gr.Blocks() as demo:
     )
     api_key_save_btn = gr.Button("Speichern")
 
+    # Sitzungs-ID: Mit ?session=<ID> in der URL lässt sich die Sitzung nach
+    # einem Neustart der Anwendung fortsetzen.
+    session_id_box = gr.Textbox(
+        label="Sitzungs-ID (zum Fortsetzen: ?session=<ID> an die URL anhängen)",
+        interactive=False,
+    )
+
+    # Fan-out: ab zwei ausgewählten Fach-Agenten geht die Frage gleichzeitig
+    # an alle ausgewählten (statt über Dirk an einen einzigen)
+    with gr.Accordion("Mehrere Fachgebiete gleichzeitig", open=False):
+        fanout_box = gr.CheckboxGroup(
+            choices=[name for name in agent_registry.names() if name != agent_registry.dispatcher_name],
+            label="Fach-Agenten parallel befragen",
+        )
+        synthesize_box = gr.Checkbox(value=FANOUT_SYNTHESIS, label="Antworten zusammenführen")
+
+    # Treffer/Fehlzugriffe des Antwort-Caches und Zustand des Rate-Limiters
+    # auf Knopfdruck anzeigen
+    with gr.Accordion("Statistik", open=False):
+        cache_stats = gr.Markdown(response_cache.describe())
+        cache_stats_btn = gr.Button("Aktualisieren")
+
     # Verknüpfung von Nutzeraktionen mit den oben definierten Funktionen:
     # Sobald im user_input_box ENTER gedrückt wird, ruft Gradio 'send_message'
-    # auf und übergibt (user_input_box, chatbot) als Inputs. Das Ergebnis (chat_history)
-    # wird im chatbot (Ausgabe-Element) angezeigt.
-    user_input_box.submit(send_message, inputs=[user_input_box, chatbot], outputs=chatbot)
-    send_btn.click(send_message, inputs=[user_input_box, chatbot], outputs=chatbot)
+    # auf und übergibt (user_input_box, session_state, Fan-out-Auswahl) als Inputs. Der
+    # chatbot ist nur Ausgabe: Er erhält die letzten Turns, der Verlauf selbst
+    # bleibt im Sitzungszustand auf dem Server. Die gestreamten Textstücke
+    # gehen nur an current_turn.
+    user_input_box.submit(
+        send_message,
+        inputs=[user_input_box, session_state, fanout_box, synthesize_box],
+        outputs=[chatbot, current_turn, session_state],
+    )
+    send_btn.click(
+        send_message,
+        inputs=[user_input_box, session_state, fanout_box, synthesize_box],
+        outputs=[chatbot, current_turn, session_state],
+    )
+    load_earlier_btn.click(load_earlier, inputs=session_state, outputs=[chatbot, session_state])
+    # Folgefragen wieder über Agent Dirk leiten
+    new_topic_btn.click(new_topic, inputs=session_state, outputs=session_state)
 
     # Setzen des API-Schlüssels
     api_key_save_btn.click(set_api_key, inputs=api_key_input, outputs=None)
 
-# Demo starten
-demo.launch()
+    # Beim Laden der Seite Sitzung vergeben bzw. wiederherstellen
+    demo.load(restore_session, inputs=session_state, outputs=[chatbot, session_state, session_id_box])
+
+    # Statistik aktualisieren
+    cache_stats_btn.click(describe_stats, inputs=None, outputs=cache_stats)
+
+# Demo starten. Die Queue ist nötig, damit Gradio die Zwischenstände des
+# Generators 'send_message' (Streaming) an den Browser weiterreichen kann.
+# Sie arbeitet bis zu CONCURRENCY_LIMIT Anfragen parallel ab – als
+# Coroutinen in Gradios Ereignisschleife, nicht als Threads.
+# Nur beim direkten Start – so lässt sich das Modul auch ohne Oberfläche
+# importieren (z. B. von swarm_loadtest.py).
+if __name__ == "__main__":
+    serve_from_env(metrics)
+    demo.queue(default_concurrency_limit=CONCURRENCY_LIMIT, max_size=QUEUE_MAX_SIZE)
+    demo.launch()
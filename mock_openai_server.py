@@ -0,0 +1,350 @@
+"""
+================================================================================
+Lokaler, OpenAI-kompatibler Mock-Server für Tests und Lasttests
+
+Ohne echtes API-Kontingent lässt sich der Swarm weder messen noch auf
+Regressionen prüfen. Dieses Skript startet einen kleinen HTTP-Server, der den
+Endpunkt `POST /v1/chat/completions` nachbildet – genau den, den `Swarm()`
+über den OpenAI-Client anspricht.
+
+Funktionen:
+ - Konfigurierbare Latenz (fest, gleichverteilt oder log-normal)
+ - Streaming Token für Token als Server-Sent Events (wie die echte API)
+ - Geskriptete Tool-Aufrufe, insbesondere `transfer_to_agent_*`-Handoffs
+   (auch über das Enum-Werkzeug `transfer_to_agent(agent)`)
+ - Eingestreute Fehler: 429 (mit Retry-After) und 500
+
+Verwendung:
+    python mock_openai_server.py --port 8800 --latency lognormal:-1.5,0.5
+
+Die Frontends (oder swarm_loadtest.py) werden dann mit
+    OPENAI_BASE_URL=http://127.0.0.1:8800/v1  OPENAI_API_KEY=mock
+gestartet.
+
+Skript-Datei (--script, JSON): Liste von Regeln, die erste passende gewinnt:
+    [{"match": "kündigung", "tool": "transfer_to_agent_arbgb"},
+     {"match": "433",       "content": "§ 433 BGB regelt den Kaufvertrag."}]
+Ohne passende Regel wird an den Agenten weitergeleitet, dessen Kürzel
+(z. B. "bgb" aus transfer_to_agent_bgb) in der Anfrage vorkommt, sonst mit
+Wahrscheinlichkeit --handoff-rate an einen zufälligen Agenten.
+================================================================================
+"""
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Füllwörter für die erzeugten Antworten
+_WORDS = (
+    "Nach ständiger Rechtsprechung ist der Anspruch begründet, sofern die "
+    "Voraussetzungen der Norm vorliegen und keine Einwendungen entgegenstehen. "
+    "Im Einzelfall kommt es auf die vertragliche Vereinbarung, die Fristen und "
+    "die Beweislast an."
+).split()
+
+TRANSFER_PREFIX = "transfer_to_agent_"
+ROUTING_TOOL_NAME = "transfer_to_agent"
+
+
+def parse_latency(spec):
+    """
+    Erzeugt aus einer Latenzangabe eine Funktion, die Sekunden liefert:
+      fixed:0.2 | uniform:0.1,0.5 | lognormal:mu,sigma
+    """
+    kind, _, values = spec.partition(":")
+    numbers = [float(value) for value in values.split(",") if value]
+    if kind == "fixed":
+        return lambda: numbers[0]
+    if kind == "uniform":
+        return lambda: random.uniform(numbers[0], numbers[1])
+    if kind == "lognormal":
+        return lambda: random.lognormvariate(numbers[0], numbers[1])
+    raise ValueError(f"Unbekannte Latenzverteilung: {spec}")
+
+
+class MockBackend:
+    """
+    Entscheidet, was auf eine Anfrage geantwortet wird (Text, Tool-Aufruf
+    oder Fehler) und zählt die bearbeiteten Anfragen.
+    """
+
+    def __init__(self, latency, tokens_per_second, response_tokens,
+                 error_429_rate, error_500_rate, handoff_rate, rules):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.response_tokens = response_tokens
+        self.error_429_rate = error_429_rate
+        self.error_500_rate = error_500_rate
+        self.handoff_rate = handoff_rate
+        self.rules = rules
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def count_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def injected_error(self):
+        roll = random.random()
+        if roll < self.error_429_rate:
+            return 429
+        if roll < self.error_429_rate + self.error_500_rate:
+            return 500
+        return None
+
+    def plan(self, request):
+        """
+        Liefert (content, tool_call): genau eins von beiden ist gesetzt;
+        tool_call ist ein Paar (Werkzeugname, Argumente als JSON).
+        """
+        messages = request.get("messages", [])
+        tools = [tool["function"]["name"] for tool in request.get("tools") or []]
+        transfers = _transfers(request.get("tools") or [])
+        last = messages[-1] if messages else {}
+        text = (last.get("content") or "") if last.get("role") == "user" else ""
+        lowered = text.lower()
+
+        for rule in self.rules:
+            if rule["match"].lower() in lowered:
+                if "tool" in rule and rule["tool"] in tools:
+                    return None, (rule["tool"], "{}")
+                if "tool" in rule and rule["tool"][len(TRANSFER_PREFIX):] in transfers:
+                    return None, transfers[rule["tool"][len(TRANSFER_PREFIX):]]
+                if "content" in rule:
+                    return rule["content"], None
+
+        # Handoffs nur direkt auf eine Nutzernachricht, nie auf Tool-Antworten
+        if text and transfers:
+            for suffix, tool_call in transfers.items():
+                if re.search(rf"\b{re.escape(suffix)}\b", lowered):
+                    return None, tool_call
+            if random.random() < self.handoff_rate:
+                return None, random.choice(list(transfers.values()))
+
+        words = [random.choice(_WORDS) for _ in range(self.response_tokens)]
+        return " ".join(words), None
+
+
+def _usage(request, completion_tokens):
+    prompt_tokens = sum(
+        len((message.get("content") or "")) // 4 + 4 for message in request.get("messages", [])
+    )
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+    }
+
+
+def _transfers(tools):
+    """
+    Mögliche Weiterleitungen einer Anfrage: Kürzel -> (Werkzeugname,
+    Argumente), aus transfer_to_agent_<kürzel>-Funktionen oder dem Enum des
+    Werkzeugs transfer_to_agent(agent).
+    """
+    transfers = {}
+    for tool in tools:
+        function = tool["function"]
+        name = function["name"]
+        if name.startswith(TRANSFER_PREFIX):
+            transfers[name[len(TRANSFER_PREFIX):]] = (name, "{}")
+        elif name == ROUTING_TOOL_NAME:
+            parameter = function.get("parameters", {}).get("properties", {}).get("agent", {})
+            for key in parameter.get("enum", []):
+                transfers[key] = (name, json.dumps({"agent": key}))
+    return transfers
+
+
+def _tool_call(tool_call):
+    tool_name, arguments = tool_call
+    return {
+        "id": f"call_{uuid.uuid4().hex[:24]}",
+        "type": "function",
+        "function": {"name": tool_name, "arguments": arguments},
+    }
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    """
+    HTTP-Handler für /v1/chat/completions (mit und ohne Streaming).
+    """
+
+    backend = None  # wird in main() gesetzt
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        # Kein Log pro Anfrage – bei Lasttests würde das nur bremsen
+        pass
+
+    def do_GET(self):
+        if self.path.rstrip("/") in ("/health", "/v1/models"):
+            self._send_json(200, {"status": "ok", "requests": self.backend.requests})
+        else:
+            self._send_json(404, {"error": {"message": "not found"}})
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": "not found"}})
+            return
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        self.backend.count_request()
+
+        time.sleep(self.backend.latency())
+
+        error = self.backend.injected_error()
+        if error == 429:
+            self._send_json(
+                429,
+                {"error": {"message": "Rate limit reached (mock)", "type": "requests", "code": "rate_limit_exceeded"}},
+                headers={"Retry-After": "1", "x-ratelimit-remaining-requests": "0"},
+            )
+            return
+        if error == 500:
+            self._send_json(500, {"error": {"message": "Internal server error (mock)", "type": "server_error"}})
+            return
+
+        content, tool_call = self.backend.plan(request)
+        if request.get("stream"):
+            self._stream(request, content, tool_call)
+        else:
+            self._complete(request, content, tool_call)
+
+    # -------------------------------------------------------------------------
+    # Antworten
+    # -------------------------------------------------------------------------
+    def _complete(self, request, content, tool_call):
+        message = {"role": "assistant", "content": content}
+        if tool_call:
+            message["tool_calls"] = [_tool_call(tool_call)]
+        completion_tokens = len(content.split()) if content else 8
+        self._send_json(200, {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "gpt-4"),
+            "choices": [{
+                "index": 0,
+                "message": message,
+                "finish_reason": "tool_calls" if tool_call else "stop",
+            }],
+            "usage": _usage(request, completion_tokens),
+        })
+
+    def _stream(self, request, content, tool_call):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        created = int(time.time())
+        model = request.get("model", "gpt-4")
+
+        def send_chunk(delta, finish_reason=None):
+            chunk = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }
+            self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        try:
+            send_chunk({"role": "assistant", "content": ""})
+            if tool_call:
+                call = _tool_call(tool_call)
+                send_chunk({"tool_calls": [{
+                    "index": 0, "id": call["id"], "type": "function",
+                    "function": {"name": call["function"]["name"], "arguments": ""},
+                }]})
+                send_chunk({"tool_calls": [{"index": 0, "function": {"arguments": call["function"]["arguments"]}}]})
+                send_chunk({}, "tool_calls")
+            else:
+                pause = 1.0 / self.backend.tokens_per_second if self.backend.tokens_per_second else 0
+                for index, word in enumerate(content.split()):
+                    send_chunk({"content": word if index == 0 else " " + word})
+                    if pause:
+                        time.sleep(pause)
+                send_chunk({}, "stop")
+            if request.get("stream_options", {}).get("include_usage"):
+                # Wie die API: letzter Chunk ohne choices, nur mit usage
+                completion_tokens = len(content.split()) if content else 8
+                chunk = {
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": created,
+                    "model": model,
+                    "choices": [],
+                    "usage": _usage(request, completion_tokens),
+                }
+                self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OpenAI-kompatibler Mock-Server für den Swarm")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8800)
+    parser.add_argument("--latency", default="fixed:0.2",
+                        help="fixed:S | uniform:MIN,MAX | lognormal:MU,SIGMA (Sekunden bis zur Antwort)")
+    parser.add_argument("--tokens-per-second", type=float, default=50.0,
+                        help="Streaming-Geschwindigkeit (0 = ohne Pause)")
+    parser.add_argument("--response-tokens", type=int, default=120,
+                        help="Länge der erzeugten Antworten in Wörtern")
+    parser.add_argument("--error-429", type=float, default=0.0, help="Anteil der Anfragen mit 429")
+    parser.add_argument("--error-500", type=float, default=0.0, help="Anteil der Anfragen mit 500")
+    parser.add_argument("--handoff-rate", type=float, default=0.5,
+                        help="Wahrscheinlichkeit eines zufälligen Handoffs ohne erkanntes Kürzel")
+    parser.add_argument("--script", help="JSON-Datei mit geskripteten Antworten/Tool-Aufrufen")
+    args = parser.parse_args()
+
+    rules = []
+    if args.script:
+        with open(args.script, encoding="utf-8") as script_file:
+            rules = json.load(script_file)
+
+    MockHandler.backend = MockBackend(
+        latency=parse_latency(args.latency),
+        tokens_per_second=args.tokens_per_second,
+        response_tokens=args.response_tokens,
+        error_429_rate=args.error_429,
+        error_500_rate=args.error_500,
+        handoff_rate=args.handoff_rate,
+        rules=rules,
+    )
+    server = ThreadingHTTPServer((args.host, args.port), MockHandler)
+    server.daemon_threads = True
+    print(f"Mock-Server läuft auf http://{args.host}:{args.port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""
+================================================================================
+Asyncio-Variante des Swarm-Clients
+
+`Swarm.run(...)` ist synchron: Jede laufende Unterhaltung belegt einen Thread,
+der die meiste Zeit nur auf die OpenAI-API wartet – in der Gradio-App also
+einen Worker-Thread pro Anfrage.
+
+Der AsyncSwarm bildet die Ablauflogik von Swarm nach (Agent-Instruktionen,
+`functions` als Werkzeuge, Handoff durch Rückgabe eines Agent-Objekts,
+context_variables, max_turns), wartet aber mit dem `AsyncOpenAI`-Client auf
+die Antworten. Werkzeug-Aufrufe und Ergebnisse werden unverändert von Swarm
+übernommen (`handle_tool_calls`), damit sich beide Clients gleich verhalten.
+
+    swarm = AsyncSwarm()
+    response = await swarm.run(agent=agent, messages=messages)
+    async for chunk in swarm.run(agent=agent, messages=messages, stream=True):
+        ...
+
+Die Stream-Chunks haben dasselbe Format wie bei Swarm ("delim", Deltas mit
+"sender", zum Schluss {"response": Response}); swarm_streaming.py übersetzt
+beide gleich in Ereignisse.
+
+Hinweis: Werkzeugfunktionen bleiben synchron (wie bei Swarm) und laufen in
+der Ereignisschleife. Die transfer_to_agent_*-Funktionen sind dafür kurz genug.
+================================================================================
+"""
+
+import copy
+import json
+from collections import defaultdict
+
+from openai import AsyncOpenAI
+from swarm import Swarm
+from swarm.types import ChatCompletionMessageToolCall, Function, Response
+from swarm.util import merge_chunk
+
+from swarm_tools import CachedToolsMixin
+
+
+class AsyncSwarm(CachedToolsMixin, Swarm):
+    """
+    Swarm-Client, dessen `run` eine Coroutine (bzw. mit stream=True einen
+    asynchronen Generator) liefert. Tool-Schemas kommen aus dem Cache von
+    swarm_tools.
+    """
+
+    def __init__(self, client=None):
+        """
+        - client: optionaler AsyncOpenAI-Client (Standard: aus den
+          Umgebungsvariablen OPENAI_API_KEY / OPENAI_BASE_URL)
+        """
+        super().__init__(client=client or AsyncOpenAI())
+
+    def run(self, agent, messages, context_variables={}, model_override=None, stream=False,
+            debug=False, max_turns=float("inf"), execute_tools=True):
+        if stream:
+            return self.run_and_stream(
+                agent=agent,
+                messages=messages,
+                context_variables=context_variables,
+                model_override=model_override,
+                debug=debug,
+                max_turns=max_turns,
+                execute_tools=execute_tools,
+            )
+        return self._run(agent, messages, context_variables, model_override, debug, max_turns, execute_tools)
+
+    async def _run(self, agent, messages, context_variables, model_override, debug, max_turns, execute_tools):
+        active_agent = agent
+        context_variables = copy.deepcopy(context_variables)
+        history = copy.deepcopy(messages)
+        init_len = len(messages)
+
+        while len(history) - init_len < max_turns and active_agent:
+            # get_chat_completion ruft client.chat.completions.create auf –
+            # mit AsyncOpenAI liefert das eine Coroutine
+            completion = await self.get_chat_completion(
+                agent=active_agent,
+                history=history,
+                context_variables=context_variables,
+                model_override=model_override,
+                stream=False,
+                debug=debug,
+            )
+            message = completion.choices[0].message
+            message.sender = active_agent.name
+            history.append(json.loads(message.model_dump_json()))
+
+            if not message.tool_calls or not execute_tools:
+                break
+
+            partial_response = self.handle_tool_calls(
+                message.tool_calls, active_agent.functions, context_variables, debug
+            )
+            history.extend(partial_response.messages)
+            context_variables.update(partial_response.context_variables)
+            if partial_response.agent:
+                active_agent = partial_response.agent
+
+        return Response(messages=history[init_len:], agent=active_agent, context_variables=context_variables)
+
+    async def run_and_stream(self, agent, messages, context_variables={}, model_override=None,
+                             debug=False, max_turns=float("inf"), execute_tools=True):
+        active_agent = agent
+        context_variables = copy.deepcopy(context_variables)
+        history = copy.deepcopy(messages)
+        init_len = len(messages)
+
+        while len(history) - init_len < max_turns:
+            message = {
+                "content": "",
+                "sender": active_agent.name,
+                "role": "assistant",
+                "function_call": None,
+                "tool_calls": defaultdict(
+                    lambda: {"function": {"arguments": "", "name": ""}, "id": "", "type": ""}
+                ),
+            }
+            completion = await self.get_chat_completion(
+                agent=active_agent,
+                history=history,
+                context_variables=context_variables,
+                model_override=model_override,
+                stream=True,
+                debug=debug,
+            )
+
+            yield {"delim": "start"}
+            async for chunk in completion:
+                if not chunk.choices:
+                    continue
+                delta = json.loads(chunk.choices[0].delta.model_dump_json())
+                if delta["role"] == "assistant":
+                    delta["sender"] = active_agent.name
+                yield delta
+                delta.pop("role", None)
+                delta.pop("sender", None)
+                merge_chunk(message, delta)
+            yield {"delim": "end"}
+
+            message["tool_calls"] = list(message.get("tool_calls", {}).values()) or None
+            history.append(message)
+
+            if not message["tool_calls"] or not execute_tools:
+                break
+
+            tool_calls = [
+                ChatCompletionMessageToolCall(
+                    id=tool_call["id"],
+                    function=Function(
+                        arguments=tool_call["function"]["arguments"],
+                        name=tool_call["function"]["name"],
+                    ),
+                    type=tool_call["type"],
+                )
+                for tool_call in message["tool_calls"]
+            ]
+            partial_response = self.handle_tool_calls(
+                tool_calls, active_agent.functions, context_variables, debug
+            )
+            history.extend(partial_response.messages)
+            context_variables.update(partial_response.context_variables)
+            if partial_response.agent:
+                active_agent = partial_response.agent
+
+        yield {
+            "response": Response(
+                messages=history[init_len:], agent=active_agent, context_variables=context_variables
+            )
+        }
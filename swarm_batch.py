@@ -0,0 +1,272 @@
+"""
+================================================================================
+Stapelverarbeitung: viele vorbereitete Fragen ohne Oberfläche beantworten
+
+Die Frontends setzen voraus, dass jemand jede Frage eintippt. Für Tausende
+vorbereiteter Rechtsfragen (eine JSON-Zeile pro Frage) gibt es hier einen
+Stapelbetrieb mit denselben Agenten und demselben Routing wie in
+ai_swarm_gradio.py / ai_swarm_2.py:
+ - Agenten aus der Registry (SWARM_AGENTS_PATH), Vorab-Routing über
+   Schlüsselwörter und das gelernte Modell, sonst Agent Dirk
+ - AsyncSwarm auf dem gepoolten, rate-limitierten Client (swarm_startup)
+ - Antwort-Cache wie in den Frontends (abschaltbar mit --no-cache)
+
+Die Eingabe wird zeilenweise gelesen, höchstens --concurrency Fragen laufen
+gleichzeitig. Jedes Ergebnis wird sofort als JSON-Zeile angehängt, mit dem
+Agenten, an den die Frage ging, dem Agenten, der geantwortet hat, und der
+Dauer.
+
+Die Ergebnisdatei ist zugleich der Checkpoint: Ein abgebrochener Lauf wird
+mit demselben Aufruf fortgesetzt; bereits beantwortete Fragen werden
+übersprungen, fehlgeschlagene erneut gestellt (außer mit --skip-errors).
+
+    python swarm_batch.py fragen.jsonl --concurrency 16
+    python swarm_batch.py requests.jsonl --field body --id-field request_id
+
+Jede Eingabezeile ist ein Objekt mit der Frage (Feld --field, sonst das
+erste vorhandene aus "question", "text", "prompt", "body"), optional einer
+ID (--id-field, sonst "id"; ohne ID zählt die Zeilennummer) und optional
+"agent" – dann geht die Frage ohne Routing direkt an diesen Agenten.
+================================================================================
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from collections import namedtuple
+
+# Felder, in denen ohne --field nach der Frage gesucht wird
+TEXT_FIELDS = ("question", "text", "prompt", "body")
+
+# Eine Eingabezeile: ID, Frage, optional gewünschter Agent
+BatchRecord = namedtuple("BatchRecord", ["record_id", "text", "agent_name"])
+
+
+def read_records(path, field=None, id_field="id"):
+    """
+    Liest die Eingabe Zeile für Zeile (Generator). Leere und ungültige
+    Zeilen sowie Zeilen ohne Frage werden mit einem Hinweis übersprungen.
+    """
+    with open(path, encoding="utf-8") as input_file:
+        for number, line in enumerate(input_file, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                print(f"Zeile {number}: kein gültiges JSON – übersprungen", file=sys.stderr)
+                continue
+            if field:
+                text = record.get(field)
+            else:
+                text = next((record[name] for name in TEXT_FIELDS if record.get(name)), None)
+            if not text:
+                print(f"Zeile {number}: keine Frage gefunden – übersprungen", file=sys.stderr)
+                continue
+            record_id = record.get(id_field)
+            yield BatchRecord(str(record_id if record_id is not None else number), text, record.get("agent"))
+
+
+def load_checkpoint(path, retry_errors=True):
+    """
+    IDs, die in der Ergebnisdatei schon stehen (mit retry_errors nur die
+    erfolgreichen). Eine beim Abbruch halb geschriebene letzte Zeile wird
+    abgeschnitten, damit neue Ergebnisse wieder auf einer eigenen Zeile
+    beginnen.
+    """
+    if not os.path.exists(path):
+        return set()
+    with open(path, "rb+") as output_file:
+        content = output_file.read()
+        end = content.rfind(b"\n") + 1
+        if end < len(content):
+            output_file.truncate(end)
+    done = set()
+    for line in content[:end].decode("utf-8").splitlines():
+        try:
+            result = json.loads(line)
+        except ValueError:
+            continue
+        if not (retry_errors and result.get("error")):
+            done.add(result["id"])
+    return done
+
+
+class BatchRunner:
+    """
+    Beantwortet BatchRecords mit begrenzter Parallelität und schreibt die
+    Ergebnisse sofort in eine JSONL-Datei.
+    """
+
+    def __init__(self, client, registry, router, cache=None, concurrency=8):
+        """
+        - client: AsyncSwarm (swarm_startup.create_async_swarm_client)
+        - registry: AgentRegistry
+        - router: LearnedRouter (bzw. KeywordRouter) für das Vorab-Routing
+        - cache: optionaler ResponseCache
+        - concurrency: Höchstzahl gleichzeitig laufender Fragen
+        """
+        self.client = client
+        self.registry = registry
+        self.router = router
+        self.cache = cache
+        self.concurrency = concurrency
+        self.done = 0
+        self.errors = 0
+        self.skipped = 0
+        self.durations = []
+
+    async def run(self, records, output_file, skip=frozenset(), progress_every=100):
+        """
+        Beantwortet alle records, deren ID nicht in 'skip' steht. Die Eingabe
+        wird nur so weit gelesen, wie Plätze frei sind.
+        """
+        from swarm_metrics import shared_metrics
+
+        metrics = shared_metrics()
+        slots = asyncio.Semaphore(self.concurrency)
+        tasks = set()
+        started = time.perf_counter()
+
+        async def answer(record):
+            try:
+                result = await self.answer(record, metrics)
+                output_file.write(json.dumps(result, ensure_ascii=False) + "\n")
+                output_file.flush()
+                if result.get("error"):
+                    self.errors += 1
+                else:
+                    self.done += 1
+                    self.durations.append(result["duration_ms"])
+                finished = self.done + self.errors
+                if progress_every and finished % progress_every == 0:
+                    rate = finished / (time.perf_counter() - started)
+                    print(f"{finished} beantwortet ({self.errors} Fehler), {rate:.1f}/s", file=sys.stderr)
+            finally:
+                slots.release()
+
+        for record in records:
+            if record.record_id in skip:
+                self.skipped += 1
+                continue
+            await slots.acquire()
+            task = asyncio.ensure_future(answer(record))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.gather(*tasks)
+        return time.perf_counter() - started
+
+    async def answer(self, record, metrics):
+        """Eine Frage beantworten; liefert das Ergebnis als Dictionary."""
+        turn = metrics.turn()
+        result = {"id": record.record_id, "question": record.text}
+        try:
+            with turn.phase("routing"):
+                if record.agent_name:
+                    agent = self.registry[record.agent_name]
+                else:
+                    agent = self.router.route(record.text)
+            result["asked"] = agent.name
+            result["routed_locally"] = agent.name != self.registry.dispatcher_name
+            messages = [{"role": "user", "content": record.text}]
+            if self.cache is not None:
+                response = await self.cache.arun(self.client, agent, messages)
+            else:
+                response = await self.client.run(agent=agent, messages=messages)
+            result["answered_by"] = response.agent.name
+            result["answer"] = response.messages[-1]["content"]
+            if not record.agent_name:
+                self.router.observe(record.text, agent.name, response.agent.name)
+            turn.finish(response.agent.name)
+        except Exception as e:
+            result["error"] = f"{type(e).__name__}: {e}"
+            turn.finish(result.get("asked", ""), error=True)
+        result["duration_ms"] = round((time.perf_counter() - turn.started) * 1000, 1)
+        return result
+
+    def summary(self, wall_time):
+        durations = sorted(self.durations)
+        result = {
+            "answered": self.done,
+            "errors": self.errors,
+            "skipped": self.skipped,
+            "wall_time": wall_time,
+            "throughput": (self.done + self.errors) / wall_time if wall_time else 0.0,
+        }
+        if durations:
+            result["duration_ms"] = {
+                "p50": durations[len(durations) // 2],
+                "p95": durations[min(len(durations) - 1, int(len(durations) * 0.95))],
+                "max": durations[-1],
+            }
+        return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Vorbereitete Fragen (JSONL) ohne Oberfläche beantworten")
+    parser.add_argument("input", help="Eingabedatei, eine JSON-Zeile pro Frage")
+    parser.add_argument("--output", help="Ergebnisdatei (Standard: <Eingabe>.results.jsonl)")
+    parser.add_argument("--field", help="Feld mit der Frage (Standard: question, text, prompt oder body)")
+    parser.add_argument("--id-field", default="id", help="Feld mit der ID (Standard: id, sonst Zeilennummer)")
+    parser.add_argument("--concurrency", type=int, default=int(os.getenv("SWARM_BATCH_CONCURRENCY", "8")))
+    parser.add_argument("--skip-errors", action="store_true", help="fehlgeschlagene Fragen nicht erneut stellen")
+    parser.add_argument("--no-cache", action="store_true", help="Antwort-Cache nicht verwenden")
+    parser.add_argument("--progress", type=int, default=100, help="Fortschritt alle N Fragen (0 = aus)")
+    parser.add_argument("--json", action="store_true", help="Zusammenfassung zusätzlich als JSON ausgeben")
+    args = parser.parse_args()
+
+    from dotenv import load_dotenv
+
+    from swarm_cache import ResponseCache
+    from swarm_classifier import LearnedRouter
+    from swarm_metrics import shared_metrics
+    from swarm_registry import DEFAULT_REGISTRY_PATH, AgentRegistry
+    from swarm_router import KeywordRouter
+    from swarm_startup import create_async_swarm_client
+
+    load_dotenv()
+    # Dieselben Agenten und dasselbe Routing wie in den Frontends
+    registry = AgentRegistry.load(
+        os.getenv("SWARM_AGENTS_PATH", DEFAULT_REGISTRY_PATH),
+        single_routing_tool=os.getenv("SWARM_SINGLE_ROUTING_TOOL", "1") != "0",
+    )
+    router = LearnedRouter.from_env(KeywordRouter.from_registry(registry), registry)
+    cache = None
+    if not args.no_cache:
+        cache = ResponseCache(
+            registry,
+            path=os.getenv("SWARM_CACHE_PATH", "swarm_cache.sqlite3"),
+            ttl=int(os.getenv("SWARM_CACHE_TTL", str(24 * 60 * 60))),
+        )
+
+    output_path = args.output or f"{os.path.splitext(args.input)[0]}.results.jsonl"
+    skip = load_checkpoint(output_path, retry_errors=not args.skip_errors)
+    if skip:
+        print(f"Fortsetzung: {len(skip)} Fragen sind bereits beantwortet.", file=sys.stderr)
+
+    runner = BatchRunner(create_async_swarm_client(), registry, router, cache, args.concurrency)
+    records = read_records(args.input, args.field, args.id_field)
+    with open(output_path, "a", encoding="utf-8") as output_file:
+        try:
+            wall_time = asyncio.run(runner.run(records, output_file, skip, args.progress))
+        except KeyboardInterrupt:
+            print("Abgebrochen – beim nächsten Aufruf geht es hier weiter.", file=sys.stderr)
+            return
+
+    result = runner.summary(wall_time)
+    print(f"Ergebnisse: {output_path}")
+    print(
+        f"Beantwortet: {result['answered']}, Fehler: {result['errors']}, übersprungen: {result['skipped']}, "
+        f"Dauer: {wall_time:.1f} s ({result['throughput']:.2f} Fragen/s)"
+    )
+    print(shared_metrics().describe())
+    if args.json:
+        print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,280 @@
+"""
+================================================================================
+Antwort-Cache für Swarm-Aufrufe (Arbeitsspeicher + SQLite)
+
+Viele Fragen ("Was regelt § 433 BGB?") werden täglich mehrfach gestellt, und
+jede kostet einen vollständigen GPT-4-Aufruf über `client.run(...)`. Dieser
+Cache legt sich um den Swarm-Aufruf:
+
+Schlüssel:
+ - Name, Instruktionen und Modell des angefragten Agenten
+ - die letzten N Nachrichten des Verlaufs, normalisiert (Rolle, Text ohne
+   überflüssigen Leerraum, Kleinschreibung)
+
+Zwei Stufen:
+ - LRU im Arbeitsspeicher mit Ablaufzeit (TTL) – Treffer in Mikrosekunden
+ - SQLite-Datei auf der Festplatte – übersteht Neustarts der Anwendung
+
+Gespeichert werden der Text der Antwort und der Name des Agenten, der sie
+gegeben hat (nach einer eventuellen Weiterleitung durch Agent Dirk).
+Über `stats()` lassen sich Treffer und Fehlzugriffe abfragen.
+
+In asynchronen Handlern (aget/aput/arun) wird nur die LRU direkt auf der
+Ereignisschleife gelesen; Zugriffe auf die SQLite-Datei laufen in einem
+Thread (asyncio.to_thread), damit ein Plattenzugriff nicht alle anderen
+Sitzungen aufhält.
+
+Fehlzugriffe mit demselben Schlüssel, die eintreffen, während die Antwort
+noch erzeugt wird, hängen sich an den laufenden Aufruf an (`flights`,
+swarm_singleflight.py) – auch beim Streaming (swarm_streaming.py).
+================================================================================
+"""
+
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Mapping
+
+from swarm_singleflight import SingleFlight
+
+
+def _normalize_text(text):
+    return " ".join((text or "").split()).casefold()
+
+
+class CachedResponse:
+    """
+    Schlanker Ersatz für swarm.types.Response bei einem Cache-Treffer.
+    Bietet dieselben Attribute, die die Frontends verwenden.
+    """
+
+    def __init__(self, agent, content):
+        self.agent = agent
+        self.messages = [{"role": "assistant", "content": content, "sender": agent.name}]
+        self.context_variables = {}
+        self.cached = True
+
+
+class ResponseCache:
+    """
+    Zweistufiger Antwort-Cache (LRU im Speicher + SQLite auf der Platte).
+    """
+
+    def __init__(self, agents, path="swarm_cache.sqlite3", max_entries=512,
+                 ttl=24 * 60 * 60, suffix_length=3, coalesce=True):
+        """
+        - agents: alle Agenten, die als Antwortgeber vorkommen können
+          (für die Rückübersetzung des gespeicherten Agentennamens) – als
+          Liste oder als Zuordnung Name -> Agent, z. B. eine AgentRegistry
+        - path: Pfad der SQLite-Datei (None = nur Arbeitsspeicher)
+        - max_entries: Größe der LRU im Arbeitsspeicher
+        - ttl: Gültigkeitsdauer eines Eintrags in Sekunden
+        - suffix_length: wie viele der letzten Nachrichten in den Schlüssel eingehen
+        - coalesce: gleichzeitige Fehlzugriffe mit demselben Schlüssel zu
+          einem Aufruf zusammenlegen
+        """
+        if isinstance(agents, Mapping):
+            self.agents_by_name = agents
+        else:
+            self.agents_by_name = {agent.name: agent for agent in agents}
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.suffix_length = suffix_length
+        self.hits_memory = 0
+        self.hits_disk = 0
+        self.misses = 0
+        self.flights = SingleFlight() if coalesce else None
+        self._memory = OrderedDict()  # Schlüssel -> (Ablaufzeit, Agentenname, Text)
+        self._lock = threading.Lock()      # LRU und Zähler
+        self._db_lock = threading.Lock()   # SQLite-Verbindung
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " key TEXT PRIMARY KEY,"
+                " agent_name TEXT NOT NULL,"
+                " content TEXT NOT NULL,"
+                " expires_at REAL NOT NULL)"
+            )
+            self._db.commit()
+
+    # -------------------------------------------------------------------------
+    # Schlüssel
+    # -------------------------------------------------------------------------
+    def key_for(self, agent, messages):
+        instructions = agent.instructions if isinstance(agent.instructions, str) else ""
+        suffix = [
+            [message.get("role"), _normalize_text(message.get("content"))]
+            for message in messages[-self.suffix_length:]
+        ]
+        payload = json.dumps(
+            [agent.name, instructions, agent.model, suffix], ensure_ascii=False
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    # -------------------------------------------------------------------------
+    # Lesen / Schreiben
+    # -------------------------------------------------------------------------
+    def get(self, agent, messages):
+        """
+        Liefert eine CachedResponse oder None (Fehlzugriff).
+        """
+        key = self.key_for(agent, messages)
+        now = time.time()
+        cached = self._lookup_memory(key, now)
+        if cached is None:
+            cached = self._disk_result(key, self._read_disk(key), now)
+        return cached
+
+    async def aget(self, agent, messages):
+        """
+        Wie get, für die Ereignisschleife: Die SQLite-Datei wird nur bei einem
+        Fehlzugriff in der LRU gelesen, und zwar in einem Thread.
+        """
+        key = self.key_for(agent, messages)
+        now = time.time()
+        cached = self._lookup_memory(key, now)
+        if cached is None:
+            row = await asyncio.to_thread(self._read_disk, key) if self._db is not None else None
+            cached = self._disk_result(key, row, now)
+        return cached
+
+    def put(self, agent, messages, response):
+        """
+        Speichert die Antwort eines erfolgreichen Swarm-Laufs.
+        """
+        entry = self._store_memory(agent, messages, response)
+        if entry is not None:
+            self._write_disk(*entry)
+
+    async def aput(self, agent, messages, response):
+        """
+        Wie put, für die Ereignisschleife: in die LRU sofort, in die
+        SQLite-Datei in einem Thread.
+        """
+        entry = self._store_memory(agent, messages, response)
+        if entry is not None and self._db is not None:
+            await asyncio.to_thread(self._write_disk, *entry)
+
+    def run(self, client, agent, messages, **run_kwargs):
+        """
+        Ersatz für client.run(agent=..., messages=...) mit Cache davor.
+        """
+        cached = self.get(agent, messages)
+        if cached is not None:
+            return cached
+
+        def call():
+            response = client.run(agent=agent, messages=messages, **run_kwargs)
+            self.put(agent, messages, response)
+            return response
+
+        if self.flights is None or run_kwargs:
+            return call()
+        return self.flights.do(self.key_for(agent, messages), call)
+
+    async def arun(self, client, agent, messages, **run_kwargs):
+        """
+        Wie run, aber für einen AsyncSwarm-Client (swarm_async.py).
+        """
+        cached = await self.aget(agent, messages)
+        if cached is not None:
+            return cached
+
+        async def call():
+            response = await client.run(agent=agent, messages=messages, **run_kwargs)
+            await self.aput(agent, messages, response)
+            return response
+
+        if self.flights is None or run_kwargs:
+            return await call()
+        return await self.flights.ado(self.key_for(agent, messages), call)
+
+    def stats(self):
+        with self._lock:
+            hits = self.hits_memory + self.hits_disk
+            total = hits + self.misses
+            return {
+                "hits_memory": self.hits_memory,
+                "hits_disk": self.hits_disk,
+                "misses": self.misses,
+                "hit_rate": hits / total if total else 0.0,
+                "memory_entries": len(self._memory),
+            }
+
+    def describe(self):
+        """Kurze, lesbare Zusammenfassung von stats() für die Oberflächen."""
+        stats = self.stats()
+        return (
+            f"Cache: {stats['hits_memory'] + stats['hits_disk']} Treffer "
+            f"({stats['hits_memory']} Speicher, {stats['hits_disk']} Platte), "
+            f"{stats['misses']} Fehlzugriffe, Trefferquote {stats['hit_rate']:.0%}"
+        )
+
+    # -------------------------------------------------------------------------
+    # Interna
+    # -------------------------------------------------------------------------
+    def _lookup_memory(self, key, now):
+        # Treffer in der LRU (als CachedResponse) oder None
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and entry[0] > now and entry[1] in self.agents_by_name:
+                self._memory.move_to_end(key)
+                self.hits_memory += 1
+                return self._response(entry[1], entry[2])
+        return None
+
+    def _read_disk(self, key):
+        if self._db is None:
+            return None
+        with self._db_lock:
+            return self._db.execute(
+                "SELECT agent_name, content, expires_at FROM responses WHERE key = ?",
+                (key,),
+            ).fetchone()
+
+    def _disk_result(self, key, row, now):
+        # Wertet eine Zeile aus _read_disk aus und zählt Treffer/Fehlzugriff
+        with self._lock:
+            if row is not None and row[2] > now and row[0] in self.agents_by_name:
+                self._remember(key, row[2], row[0], row[1])
+                self.hits_disk += 1
+                return self._response(row[0], row[1])
+            self.misses += 1
+            return None
+
+    def _store_memory(self, agent, messages, response):
+        # Legt die Antwort in der LRU ab; liefert die Zeile für _write_disk
+        content = response.messages[-1].get("content") if response.messages else None
+        if not content:
+            return None
+        key = self.key_for(agent, messages)
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            self._remember(key, expires_at, response.agent.name, content)
+        return key, response.agent.name, content, expires_at
+
+    def _write_disk(self, key, agent_name, content, expires_at):
+        if self._db is None:
+            return
+        with self._db_lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, agent_name, content, expires_at)"
+                " VALUES (?, ?, ?, ?)",
+                (key, agent_name, content, expires_at),
+            )
+            self._db.commit()
+
+    def _remember(self, key, expires_at, agent_name, content):
+        self._memory[key] = (expires_at, agent_name, content)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _response(self, agent_name, content):
+        return CachedResponse(self.agents_by_name[agent_name], content)
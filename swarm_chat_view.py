@@ -0,0 +1,264 @@
+"""
+================================================================================
+Begrenzte, gebündelte Darstellung des Chatverlaufs (Tk-Text-Widgets)
+
+Bisher wuchs jedes ScrolledText-Widget mit jedem Turn weiter; jedes Einfügen
+löste sofort ein Neuzeichnen aus, und auch Tabs, die gerade niemand ansieht,
+wurden laufend aktualisiert. Bei langen Sitzungen wurde das Fenster dadurch
+immer träger.
+
+Der ChatView legt sich zwischen Anwendung und Widget:
+ - Fenster: Im Widget stehen höchstens `max_turns` Turns. Ältere Turns
+   werden oben entfernt; sie liegen ohnehin im ConversationStore und werden
+   beim Hochscrollen seitenweise wieder eingefügt (`prepend_turns`).
+ - Bündelung: `begin_turn`/`append` sammeln Änderungen nur. Pro Frame
+   (Standard 16 ms) werden alle gesammelten Änderungen in einem einzigen
+   NORMAL/DISABLED-Durchgang eingefügt.
+ - Verborgene Tabs: Solange ein View nicht sichtbar ist (`hide`), wird nichts
+   gezeichnet; die Änderungen werden gepuffert und beim nächsten `show`
+   gesammelt übernommen. Auch der Puffer behält höchstens `max_turns` Turns.
+
+Alle Methoden müssen im Tk-Hauptthread aufgerufen werden (Worker-Threads
+verwenden wie bisher root.after).
+================================================================================
+"""
+
+# Tk-Konstanten als Text, damit das Modul ohne GUI-Import auskommt
+_END = "end"
+_NORMAL = "normal"
+_DISABLED = "disabled"
+
+
+def stored_turns(stored_messages, agent_name=None):
+    """
+    Gruppiert gespeicherte Nachrichten zu Turns: Liste von (ID, Text), wobei
+    ein Turn mit einer Nutzernachricht beginnt. Der Text entspricht dem, was
+    die Frontends für neue Nachrichten in den Chatverlauf schreiben.
+    - agent_name: Bezeichnung der Antworten (Standard: gespeicherter Agent)
+    """
+    turns = []
+    for message in stored_messages:
+        if message.role == "user":
+            turns.append([message.id, f"You: {message.content}\n"])
+            continue
+        text = f"{agent_name or message.agent_name}: {message.content}\n\n"
+        if turns:
+            turns[-1][1] += text
+        else:
+            # Seite beginnt mitten in einem Turn
+            turns.append([message.id, text])
+    return [tuple(turn) for turn in turns]
+
+
+def _resolve(store_id, timeout):
+    # int, None oder swarm_store.PendingId
+    if store_id is None or isinstance(store_id, int):
+        return store_id
+    return store_id.get(timeout)
+
+
+class ChatView:
+    """
+    Fenster der letzten Turns eines Chatverlaufs mit gebündelten Updates.
+    """
+
+    def __init__(self, max_turns=60, frame_interval_ms=16, id_timeout=1.0):
+        """
+        - max_turns: höchstens so viele Turns stehen im Widget
+        - frame_interval_ms: Abstand, in dem gesammelte Änderungen erscheinen
+        - id_timeout: Wartezeit auf noch nicht geschriebene Nachrichten-IDs
+        """
+        self.max_turns = max_turns
+        self.frame_interval_ms = frame_interval_ms
+        self.id_timeout = id_timeout
+        self.widget = None
+        self.visible = False
+        # True, solange ältere Turns im Speicher liegen, die nicht angezeigt
+        # werden (gesetzt beim Wiederherstellen und beim Verdrängen)
+        self.has_older = False
+
+        self._pending = []        # gesammelte Änderungen: (Art, Wert)
+        self._pending_turns = 0
+        self._turns = []          # angezeigte Turns: [Textmarke, ID]
+        self._mark_counter = 0
+        self._last_evicted_id = None
+        self._flush_scheduled = False
+
+    # -------------------------------------------------------------------------
+    # Sichtbarkeit
+    # -------------------------------------------------------------------------
+    def attach(self, widget):
+        """Verbindet den View mit seinem (erst jetzt gebauten) Text-Widget."""
+        self.widget = widget
+        self._schedule()
+
+    def show(self):
+        self.visible = True
+        self._schedule()
+
+    def hide(self):
+        self.visible = False
+
+    @property
+    def turn_count(self):
+        return len(self._turns)
+
+    # -------------------------------------------------------------------------
+    # Änderungen sammeln
+    # -------------------------------------------------------------------------
+    def begin_turn(self, store_id=None):
+        """
+        Beginnt einen neuen Turn. store_id ist die ID der Nutzernachricht im
+        ConversationStore (int oder PendingId) bzw. None für Turns, die nicht
+        gespeichert werden (z. B. Weiterleitungshinweise).
+        """
+        self._pending.append(("turn", store_id))
+        self._pending_turns += 1
+        if not self.visible and self._pending_turns > self.max_turns:
+            self._drop_oldest_pending_turn()
+        self._schedule()
+
+    def append(self, text):
+        """Hängt Text an den letzten Turn an."""
+        if not text:
+            return
+        if self._pending and self._pending[-1][0] == "text":
+            self._pending[-1] = ("text", self._pending[-1][1] + text)
+        else:
+            self._pending.append(("text", text))
+        self._schedule()
+
+    def set_turn_id(self, store_id):
+        """Trägt die Speicher-ID des letzten Turns nach (z. B. nach dem Streaming)."""
+        self._pending.append(("id", store_id))
+        self._schedule()
+
+    def _drop_oldest_pending_turn(self):
+        # Verborgener Tab: der älteste gepufferte Turn wird nie gezeichnet
+        start = next(index for index, (kind, _) in enumerate(self._pending) if kind == "turn")
+        end = next(
+            (index for index in range(start + 1, len(self._pending)) if self._pending[index][0] == "turn"),
+            len(self._pending),
+        )
+        for kind, value in self._pending[start:end]:
+            if kind != "text" and value is not None:
+                self._last_evicted_id = value
+        del self._pending[start:end]
+        self._pending_turns -= 1
+        self.has_older = True
+
+    def _schedule(self):
+        if self._flush_scheduled or not self._pending or not self.visible or self.widget is None:
+            return
+        self._flush_scheduled = True
+        self.widget.after(self.frame_interval_ms, self.flush)
+
+    # -------------------------------------------------------------------------
+    # Zeichnen
+    # -------------------------------------------------------------------------
+    def flush(self):
+        """
+        Übernimmt alle gesammelten Änderungen in einem Durchgang.
+        """
+        self._flush_scheduled = False
+        if not self.visible or self.widget is None or not self._pending:
+            return
+        pending, self._pending, self._pending_turns = self._pending, [], 0
+        widget = self.widget
+        widget.config(state=_NORMAL)
+        chunks = []
+        for kind, value in pending:
+            if kind == "text":
+                chunks.append(value)
+                continue
+            if chunks:
+                widget.insert(_END, "".join(chunks))
+                chunks = []
+            if kind == "turn":
+                mark = self._new_mark()
+                widget.mark_set(mark, "end-1c")
+                widget.mark_gravity(mark, "left")
+                self._turns.append([mark, value])
+            elif self._turns:
+                self._turns[-1][1] = value
+        if chunks:
+            widget.insert(_END, "".join(chunks))
+        self._trim()
+        widget.config(state=_DISABLED)
+        widget.see(_END)
+
+    def trim(self):
+        """
+        Entfernt überzählige Turns oben (z. B. wenn nach dem Nachladen
+        wieder ans Ende gescrollt wurde).
+        """
+        if self.widget is None or len(self._turns) <= self.max_turns:
+            return
+        self.widget.config(state=_NORMAL)
+        self._trim()
+        self.widget.config(state=_DISABLED)
+        self.widget.see(_END)
+
+    def _trim(self):
+        excess = len(self._turns) - self.max_turns
+        if excess <= 0:
+            return
+        evicted, self._turns = self._turns[:excess], self._turns[excess:]
+        self.widget.delete("1.0", self._turns[0][0])
+        for mark, store_id in evicted:
+            self.widget.mark_unset(mark)
+            if store_id is not None:
+                self._last_evicted_id = store_id
+        self.has_older = True
+
+    def _new_mark(self):
+        self._mark_counter += 1
+        return f"turn{self._mark_counter}"
+
+    # -------------------------------------------------------------------------
+    # Ältere Turns nachladen
+    # -------------------------------------------------------------------------
+    def older_before_id(self):
+        """
+        ID, vor der ältere Nachrichten nachzuladen sind (für
+        ConversationStore.page_before), oder None, wenn es keine gibt.
+        """
+        if not self.has_older:
+            return None
+        for _, store_id in self._turns:
+            value = _resolve(store_id, self.id_timeout)
+            if value is not None:
+                return value
+        # Kein angezeigter Turn ist gespeichert: direkt nach dem zuletzt
+        # verdrängten Turn weitermachen
+        last_evicted = _resolve(self._last_evicted_id, self.id_timeout)
+        return None if last_evicted is None else last_evicted + 1
+
+    def prepend_turns(self, turns):
+        """
+        Fügt ältere Turns [(ID, Text), ...] oben ein und behält die
+        Scrollposition bei. Die Fenstergröße wird dabei vorübergehend
+        überschritten; getrimmt wird erst wieder am Ende des Verlaufs.
+        """
+        if not turns:
+            return
+        widget = self.widget
+        widget.config(state=_NORMAL)
+        # Vorhandene Marken sollen beim Einfügen an Position 1.0 hinter dem
+        # neuen Text bleiben
+        for mark, _ in self._turns:
+            widget.mark_gravity(mark, "right")
+        new_turns = []
+        for store_id, text in reversed(turns):
+            widget.insert("1.0", text)
+            mark = self._new_mark()
+            widget.mark_set(mark, "1.0")
+            widget.mark_gravity(mark, "right")
+            new_turns.append([mark, store_id])
+        new_turns.reverse()
+        self._turns = new_turns + self._turns
+        for mark, _ in self._turns:
+            widget.mark_gravity(mark, "left")
+        widget.config(state=_DISABLED)
+        lines = sum(text.count("\n") for _, text in turns)
+        widget.yview(f"{lines + 1}.0")
@@ -0,0 +1,98 @@
+"""
+================================================================================
+Serverseitiger Chatverlauf mit Fensteransicht (Gradio)
+
+Bisher war der Gradio-Chatbot Ein- und Ausgabe jedes `send_message`-Aufrufs:
+Bei jeder Nachricht wanderte der komplette Verlauf vom Browser zum Server und
+wieder zurück – Datenmenge und Rendering wuchsen mit jedem Turn.
+
+Jetzt gehört der Verlauf dem Server (im Sitzungszustand). Der Browser
+bekommt nur noch ein Fenster der letzten Turns zu sehen:
+ - `view()` liefert höchstens `window` Turns; neue Nachrichten setzen die
+   Ansicht wieder auf dieses Fenster zurück. Ein Turn kommt erst mit der
+   fertigen Antwort hinzu – die gestreamten Textstücke zeigt die Oberfläche
+   in einem eigenen Feld, damit nicht jedes Stück das Fenster neu überträgt.
+ - `load_earlier(...)` vergrößert das Fenster seitenweise. Was noch nicht im
+   Arbeitsspeicher liegt (z. B. nach dem Fortsetzen einer Sitzung), wird aus
+   dem ConversationStore nachgeladen.
+
+Ein Turn ist ein Paar (Frage, Antwort) im Format des Gradio-Chatbots. Die
+Klasse enthält nur einfache Daten, damit gr.State sie pro Sitzung kopieren
+kann.
+================================================================================
+"""
+
+
+def stored_to_pairs(stored_messages):
+    """
+    Baut aus gespeicherten Nachrichten Paare (Frage, Antwort) für den
+    Gradio-Chatbot. Liefert (Paare, ID der ersten verwendeten Frage).
+    Antworten ohne zugehörige Frage am Anfang (abgeschnitten durch seitenweises
+    Laden) werden übersprungen; sie kommen mit der nächsten Seite wieder.
+    """
+    pairs = []
+    first_id = None
+    pending_question = None
+    for message in stored_messages:
+        if message.role == "user":
+            pending_question = message.content
+            if first_id is None:
+                first_id = message.id
+        elif pending_question is not None:
+            pairs.append((f"[{message.agent_name}] {pending_question}", message.content))
+            pending_question = None
+    return pairs, first_id
+
+
+class ChatWindow:
+    """
+    Verlauf einer Gradio-Sitzung, von dem nur die letzten Turns angezeigt werden.
+    """
+
+    def __init__(self, window=20):
+        """
+        - window: Anzahl der Turns, die der Browser normalerweise sieht
+          (zugleich die Seitengröße von load_earlier)
+        """
+        self.window = window
+        self.visible = window
+        self.turns = []
+        # ID der ältesten geladenen Nachricht im Speicher; None, solange
+        # nichts Älteres gespeichert sein kann
+        self.oldest_id = None
+
+    def view(self):
+        """Die angezeigten Turns (Wert für den gr.Chatbot)."""
+        return self.turns[-self.visible:] if self.visible else []
+
+    @property
+    def has_earlier(self):
+        return self.oldest_id is not None or len(self.turns) > self.visible
+
+    def append(self, question, answer):
+        """Neuer Turn; die Ansicht springt auf das normale Fenster zurück."""
+        self.turns.append((question, answer))
+        self.visible = self.window
+
+    def restore(self, stored_messages):
+        """Übernimmt das Ende eines gespeicherten Verlaufs."""
+        pairs, first_id = stored_to_pairs(stored_messages)
+        self.turns = pairs + self.turns
+        self.oldest_id = first_id
+
+    def load_earlier(self, store, conversation):
+        """
+        Zeigt eine Seite ältere Turns mehr an und lädt sie bei Bedarf aus dem
+        ConversationStore nach.
+        """
+        self.visible += self.window
+        while len(self.turns) < self.visible and self.oldest_id is not None:
+            stored = store.page_before(conversation, self.oldest_id, limit=2 * self.window)
+            pairs, first_id = stored_to_pairs(stored)
+            if not pairs:
+                self.oldest_id = None  # Anfang erreicht
+                break
+            self.turns = pairs + self.turns
+            self.oldest_id = first_id
+        self.visible = min(self.visible, len(self.turns))
+        return self.view()
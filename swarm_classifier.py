@@ -0,0 +1,497 @@
+"""
+================================================================================
+Gelernter lokaler Router aus protokollierten Weiterleitungen von Agent Dirk
+
+Der Schlüsselwort-Router (swarm_router.py) erkennt nur Anfragen, die ein
+Schlüsselwort wie "BGB" enthalten. Die meisten Fragen ("Mein Vermieter
+kündigt mir …") gehen weiterhin an GPT-4 – nur damit Agent Dirk einen
+Fach-Agenten auswählt.
+
+Dieses Modul lernt diese Auswahl:
+ - RoutingLog: Jede Entscheidung von Dirk (Frage -> Agent, der geantwortet
+   hat) wird als JSON-Zeile protokolliert (SWARM_ROUTING_LOG, Standard:
+   swarm_routing_log.jsonl), zusammen mit der Vorhersage des aktuellen
+   Modells. So lässt sich die Übereinstimmung mit Dirk laufend verfolgen.
+ - RoutingClassifier: TF-IDF (Wörter und Wortpaare) mit Nearest-Centroid in
+   NumPy. Eine Vorhersage dauert deutlich unter einer Millisekunde.
+ - LearnedRouter: steht vor Dirk wie der KeywordRouter. Erst entscheiden die
+   Schlüsselwörter; ohne eindeutigen Treffer entscheidet das Modell, sofern
+   es sich sicher genug ist (SWARM_ROUTER_CONFIDENCE, Standard 0.8). Alles
+   andere geht weiter an Dirk.
+ - Folgefragen (`follow_up`): Hat in einer Sitzung schon ein Fach-Agent
+   geantwortet, gehen weitere Fragen direkt an ihn. Zurück zu Dirk geht es
+   nur bei einem Themenwechsel: ein Schlüsselwort eines anderen Fach-Agenten,
+   eine sehr sichere Vorhersage für einen anderen (SWARM_TOPIC_SHIFT_CONFIDENCE,
+   Standard 0.9) oder ein ausdrücklicher Wunsch ("/neu", "neues Thema",
+   "zurück zu Dirk"). `describe()` zeigt, wie viele Routing-Aufrufe an Dirk
+   so entfallen sind.
+
+Training und Auswertung laufen offline:
+    python swarm_classifier.py train
+    python swarm_classifier.py evaluate
+
+`evaluate` trainiert auf einem Teil des Protokolls und misst auf dem Rest
+Genauigkeit und Abdeckung je Konfidenzschwelle; dazu die Übereinstimmung
+der protokollierten Live-Vorhersagen mit Dirk pro Tag. Ein neu trainiertes
+Modell (SWARM_ROUTER_MODEL, Standard: swarm_router_model.npz) wird von den
+laufenden Frontends innerhalb einer Minute übernommen.
+
+NumPy ist optional: Ohne NumPy arbeitet der LearnedRouter wie der reine
+Schlüsselwort-Router.
+================================================================================
+"""
+
+import argparse
+import atexit
+import json
+import math
+import os
+import queue
+import random
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+
+try:
+    import numpy as np
+except ImportError:  # optional: ohne NumPy kein gelerntes Routing
+    np = None
+
+DEFAULT_LOG_PATH = "swarm_routing_log.jsonl"
+DEFAULT_MODEL_PATH = "swarm_router_model.npz"
+
+_WORD_PATTERN = re.compile(r"\w+")
+
+# Ausdrücklicher Wunsch, mit einem neuen Thema wieder bei Dirk zu beginnen
+_RESET_PATTERN = re.compile(r"^\s*/(neu|dirk)\b|neues thema|anderes thema|zurück zu (agent )?dirk", re.IGNORECASE)
+
+# Markiert das Ende der Warteschlange des RoutingLog beim Schließen
+_CLOSE = object()
+
+# Art der Routing-Entscheidung (für stats/describe)
+_DECISIONS = ("keyword", "model", "affinity", "dispatcher")
+
+
+def terms(text):
+    """Wörter (ab zwei Zeichen, klein geschrieben) und Wortpaare eines Textes."""
+    words = [word for word in _WORD_PATTERN.findall(text.casefold()) if len(word) > 1]
+    return words + [f"{first} {second}" for first, second in zip(words, words[1:])]
+
+
+class RoutingLog:
+    """
+    Protokoll der Routing-Entscheidungen von Agent Dirk (JSON Lines).
+    Geschrieben wird gebündelt in einem Hintergrund-Thread: record() wird
+    auch aus asynchronen Handlern aufgerufen und darf die Ereignisschleife
+    nicht mit Dateizugriffen aufhalten.
+    """
+
+    def __init__(self, path=DEFAULT_LOG_PATH, flush_interval=1.0):
+        """
+        - path: Zieldatei (JSON Lines, eine Zeile pro Entscheidung)
+        - flush_interval: höchstens so viele Sekunden bis zum Schreiben
+        """
+        self.path = path
+        self.flush_interval = flush_interval
+        self._queue = queue.SimpleQueue()
+        self._writer_thread = None
+        self._lock = threading.Lock()
+
+    def record(self, text, agent_name, predicted=None, confidence=None):
+        """
+        Hängt eine Entscheidung an: 'agent_name' hat die Frage 'text' nach
+        Dirks Weiterleitung beantwortet. 'predicted'/'confidence' ist die
+        Vorhersage des lokalen Modells zum selben Zeitpunkt (falls vorhanden).
+        """
+        entry = {"time": time.time(), "text": text, "agent": agent_name}
+        if predicted is not None:
+            entry["predicted"] = predicted
+            entry["confidence"] = round(confidence, 4)
+        with self._lock:
+            if self._writer_thread is None:
+                self._writer_thread = threading.Thread(
+                    target=self._write_loop, name="swarm-routing-log", daemon=True
+                )
+                self._writer_thread.start()
+                atexit.register(self.close)
+        self._queue.put(json.dumps(entry, ensure_ascii=False))
+
+    def close(self):
+        """Schreibt ausstehende Einträge und beendet den Schreib-Thread."""
+        with self._lock:
+            thread, self._writer_thread = self._writer_thread, None
+        if thread is not None:
+            self._queue.put(_CLOSE)
+            thread.join(timeout=5)
+
+    def _write_loop(self):
+        while True:
+            item = self._queue.get()
+            batch = []
+            closing = False
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                if item is _CLOSE:
+                    closing = True
+                    break
+                batch.append(item)
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+            if batch:
+                try:
+                    with open(self.path, "a", encoding="utf-8") as log_file:
+                        log_file.write("\n".join(batch) + "\n")
+                except OSError:
+                    pass  # das Protokoll darf eine Antwort nie verhindern
+            if closing:
+                return
+
+    def entries(self):
+        """
+        Alle geschriebenen Einträge in Protokollreihenfolge (fehlerhafte
+        Zeilen werden übersprungen).
+        """
+        if not os.path.exists(self.path):
+            return []
+        entries = []
+        with open(self.path, encoding="utf-8") as log_file:
+            for line in log_file:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    continue
+        return entries
+
+
+class RoutingClassifier:
+    """
+    TF-IDF + Nearest-Centroid über die Ziel-Agenten. Erfordert NumPy.
+    """
+
+    def __init__(self, vocabulary, idf, centroids, labels, temperature=0.1):
+        """
+        - vocabulary: Liste der Terme (Spalten)
+        - idf: IDF-Gewicht je Term
+        - centroids: normierte Schwerpunkte, eine Zeile je Agent
+        - labels: Agentennamen in Zeilenreihenfolge
+        - temperature: Schärfe der Softmax über die Kosinus-Ähnlichkeiten
+        """
+        self.labels = list(labels)
+        self.index = {term: position for position, term in enumerate(vocabulary)}
+        self.idf = np.asarray(idf, dtype=np.float32)
+        self.centroids = np.asarray(centroids, dtype=np.float32)
+        self.temperature = temperature
+
+    @classmethod
+    def fit(cls, texts, labels, min_df=1, max_features=20000):
+        """Trainiert das Modell aus Fragen und den Agenten, die Dirk gewählt hat."""
+        document_terms = [set(terms(text)) for text in texts]
+        document_frequency = Counter(term for document in document_terms for term in document)
+        vocabulary = [term for term, count in document_frequency.most_common(max_features) if count >= min_df]
+        index = {term: position for position, term in enumerate(vocabulary)}
+        count = len(texts)
+        idf = np.array(
+            [math.log((1 + count) / (1 + document_frequency[term])) + 1 for term in vocabulary], dtype=np.float32
+        )
+
+        label_names = sorted(set(labels))
+        centroids = np.zeros((len(label_names), len(vocabulary)), dtype=np.float32)
+        row_of = {label: row for row, label in enumerate(label_names)}
+        for text, label in zip(texts, labels):
+            vector = np.zeros(len(vocabulary), dtype=np.float32)
+            for term, frequency in Counter(terms(text)).items():
+                if term in index:
+                    vector[index[term]] = frequency * idf[index[term]]
+            norm = np.linalg.norm(vector)
+            if norm:
+                centroids[row_of[label]] += vector / norm
+        norms = np.linalg.norm(centroids, axis=1, keepdims=True)
+        centroids /= np.where(norms == 0, 1, norms)
+        return cls(vocabulary, idf, centroids, label_names)
+
+    def scores(self, text):
+        """Kosinus-Ähnlichkeit der Frage zu jedem Agenten-Schwerpunkt."""
+        columns, weights = [], []
+        for term, frequency in Counter(terms(text)).items():
+            position = self.index.get(term)
+            if position is not None:
+                columns.append(position)
+                weights.append(frequency * self.idf[position])
+        if not columns:
+            return np.zeros(len(self.labels), dtype=np.float32)
+        weights = np.asarray(weights, dtype=np.float32)
+        weights /= np.linalg.norm(weights)
+        return self.centroids[:, columns] @ weights
+
+    def predict(self, text):
+        """Liefert (Agentenname, Konfidenz zwischen 0 und 1)."""
+        scores = self.scores(text)
+        if not scores.any():
+            return None, 0.0
+        exponentials = np.exp((scores - scores.max()) / self.temperature)
+        probabilities = exponentials / exponentials.sum()
+        best = int(probabilities.argmax())
+        return self.labels[best], float(probabilities[best])
+
+    def save(self, path):
+        vocabulary = sorted(self.index, key=self.index.get)
+        np.savez_compressed(
+            path,
+            vocabulary=np.array(vocabulary),
+            idf=self.idf,
+            centroids=self.centroids,
+            labels=np.array(self.labels),
+            temperature=np.array(self.temperature),
+        )
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            return cls(
+                data["vocabulary"].tolist(),
+                data["idf"],
+                data["centroids"],
+                data["labels"].tolist(),
+                temperature=float(data["temperature"]),
+            )
+
+
+class LearnedRouter:
+    """
+    KeywordRouter mit gelerntem Modell als zweiter Stufe vor Agent Dirk.
+    Bietet dieselben Methoden route/match wie der KeywordRouter.
+    """
+
+    def __init__(self, keyword_router, registry, model_path=DEFAULT_MODEL_PATH, log=None,
+                 threshold=0.8, shift_threshold=0.9, reload_interval=60.0):
+        """
+        - keyword_router: swarm_router.KeywordRouter (erste Stufe)
+        - registry: AgentRegistry (Agentennamen -> Agent, Name von Dirk)
+        - model_path: Datei des trainierten Modells (fehlt sie, entscheidet Dirk)
+        - log: RoutingLog für Dirks Entscheidungen (oder None)
+        - threshold: Mindestkonfidenz für lokales Routing
+        - shift_threshold: Mindestkonfidenz, mit der eine Folgefrage einem
+          anderen Fach-Agenten zugeordnet sein muss, um als Themenwechsel zu gelten
+        - reload_interval: Abstand in Sekunden, in dem eine neuere Modelldatei
+          übernommen wird
+        """
+        self.keyword_router = keyword_router
+        self.registry = registry
+        self.model_path = model_path
+        self.log = log
+        self.threshold = threshold
+        self.shift_threshold = shift_threshold
+        self.reload_interval = reload_interval
+        self.decisions = Counter()
+        self.topic_shifts = 0
+        self._classifier = None
+        self._model_mtime = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, keyword_router, registry):
+        return cls(
+            keyword_router,
+            registry,
+            model_path=os.getenv("SWARM_ROUTER_MODEL", DEFAULT_MODEL_PATH),
+            log=RoutingLog(os.getenv("SWARM_ROUTING_LOG", DEFAULT_LOG_PATH)),
+            threshold=float(os.getenv("SWARM_ROUTER_CONFIDENCE", "0.8")),
+            shift_threshold=float(os.getenv("SWARM_TOPIC_SHIFT_CONFIDENCE", "0.9")),
+        )
+
+    def classifier(self):
+        """Das aktuelle Modell (bei Bedarf neu geladen) oder None."""
+        if np is None:
+            return None
+        now = time.monotonic()
+        if now - self._checked < self.reload_interval:
+            return self._classifier
+        with self._lock:
+            self._checked = now
+            try:
+                mtime = os.path.getmtime(self.model_path)
+            except OSError:
+                return self._classifier
+            if mtime != self._model_mtime:
+                try:
+                    self._classifier = RoutingClassifier.load(self.model_path)
+                    self._model_mtime = mtime
+                except (OSError, ValueError, KeyError):
+                    pass  # halb geschriebene Datei: beim nächsten Mal erneut
+            return self._classifier
+
+    def predict(self, text):
+        """(Agentenname, Konfidenz) des Modells oder (None, 0.0)."""
+        classifier = self.classifier()
+        if classifier is None:
+            return None, 0.0
+        return classifier.predict(text)
+
+    def match(self, text):
+        return self.keyword_router.match(text)
+
+    def route(self, text):
+        """
+        Schlüsselwort-Treffer, sonst sichere Vorhersage des Modells, sonst Dirk.
+        """
+        agent = self.keyword_router.route(text)
+        if agent.name != self.registry.dispatcher_name:
+            self._count("keyword")
+            return agent
+        agent_name, confidence = self.predict(text)
+        if (agent_name and agent_name != self.registry.dispatcher_name
+                and confidence >= self.threshold and agent_name in self.registry):
+            self._count("model")
+            return self.registry[agent_name]
+        self._count("dispatcher")
+        return agent
+
+    def follow_up(self, text, agent_name):
+        """
+        Folgefrage in einer Sitzung, in der zuletzt der Fach-Agent 'agent_name'
+        geantwortet hat. Liefert diesen Agenten – oder None bei einem
+        Themenwechsel; dann ist wieder route() bzw. Dirk zuständig.
+        """
+        if _RESET_PATTERN.search(text):
+            return self._shift()
+        found = self.keyword_router.match(text)
+        if found and agent_name not in found:
+            return self._shift()
+        predicted, confidence = self.predict(text)
+        if (predicted and predicted not in (agent_name, self.registry.dispatcher_name)
+                and confidence >= self.shift_threshold):
+            return self._shift()
+        self._count("affinity")
+        return self.registry[agent_name]
+
+    def _shift(self):
+        with self._lock:
+            self.topic_shifts += 1
+        return None
+
+    def _count(self, decision):
+        with self._lock:
+            self.decisions[decision] += 1
+
+    def stats(self):
+        with self._lock:
+            total = sum(self.decisions.values())
+            skipped = total - self.decisions["dispatcher"]
+            return {
+                **{decision: self.decisions[decision] for decision in _DECISIONS},
+                "topic_shifts": self.topic_shifts,
+                "skip_rate": skipped / total if total else 0.0,
+            }
+
+    def describe(self):
+        """Kurze, lesbare Zusammenfassung von stats() für die Oberflächen."""
+        stats = self.stats()
+        return (
+            f"Routing: {stats['skip_rate']:.0%} ohne Aufruf an Dirk "
+            f"({stats['keyword']} Schlüsselwort, {stats['model']} Modell, "
+            f"{stats['affinity']} Folgefragen beim Fach-Agenten), "
+            f"{stats['dispatcher']} über Dirk, {stats['topic_shifts']} Themenwechsel"
+        )
+
+    def observe(self, text, asked_name, answered_name):
+        """
+        Nach einer Antwort aufrufen: Hat Dirk entschieden (asked_name ist
+        Dirk), wird seine Wahl mit der Vorhersage des Modells protokolliert.
+        """
+        if self.log is None or asked_name != self.registry.dispatcher_name:
+            return
+        predicted, confidence = self.predict(text)
+        self.log.record(text, answered_name, predicted, confidence)
+
+
+# -----------------------------------------------------------------------------
+# Offline: Training und Auswertung
+# -----------------------------------------------------------------------------
+def _examples(entries):
+    return [entry["text"] for entry in entries], [entry["agent"] for entry in entries]
+
+
+def evaluate(train_entries, test_entries, thresholds=(0.5, 0.6, 0.7, 0.8, 0.9, 0.95)):
+    """
+    Trainiert auf train_entries und liefert für test_entries die Genauigkeit
+    insgesamt sowie je Schwelle (Abdeckung, Genauigkeit der sicheren Fälle).
+    """
+    classifier = RoutingClassifier.fit(*_examples(train_entries))
+    predictions = [classifier.predict(entry["text"]) for entry in test_entries]
+    correct = [predicted == entry["agent"] for (predicted, _), entry in zip(predictions, test_entries)]
+    result = {"accuracy": sum(correct) / len(correct) if correct else 0.0, "thresholds": []}
+    for threshold in thresholds:
+        confident = [hit for hit, (_, confidence) in zip(correct, predictions) if confidence >= threshold]
+        result["thresholds"].append({
+            "threshold": threshold,
+            "coverage": len(confident) / len(correct) if correct else 0.0,
+            "accuracy": sum(confident) / len(confident) if confident else 0.0,
+        })
+    return result
+
+
+def live_agreement(entries):
+    """Übereinstimmung der protokollierten Live-Vorhersagen mit Dirk pro Tag."""
+    days = defaultdict(lambda: [0, 0])
+    for entry in entries:
+        if "predicted" not in entry:
+            continue
+        day = time.strftime("%Y-%m-%d", time.localtime(entry["time"]))
+        days[day][0] += entry["predicted"] == entry["agent"]
+        days[day][1] += 1
+    return {day: (hits, total) for day, (hits, total) in sorted(days.items())}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lokalen Routing-Klassifikator trainieren und auswerten")
+    parser.add_argument("command", choices=["train", "evaluate"])
+    parser.add_argument("--log", default=os.getenv("SWARM_ROUTING_LOG", DEFAULT_LOG_PATH))
+    parser.add_argument("--model", default=os.getenv("SWARM_ROUTER_MODEL", DEFAULT_MODEL_PATH))
+    parser.add_argument("--min-examples", type=int, default=20, help="Mindestzahl protokollierter Entscheidungen")
+    parser.add_argument("--holdout", type=float, default=0.2, help="Anteil der Testdaten (evaluate)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if np is None:
+        parser.error("Für den Routing-Klassifikator muss NumPy installiert sein.")
+    entries = RoutingLog(args.log).entries()
+    if len(entries) < args.min_examples:
+        parser.error(f"Nur {len(entries)} Entscheidungen in {args.log}, mindestens {args.min_examples} nötig.")
+
+    if args.command == "train":
+        classifier = RoutingClassifier.fit(*_examples(entries))
+        # Erst vollständig schreiben, dann ersetzen: laufende Frontends lesen nie eine halbe Datei
+        temporary_path = args.model + ".tmp.npz"
+        classifier.save(temporary_path)
+        os.replace(temporary_path, args.model)
+        counts = Counter(entry["agent"] for entry in entries)
+        print(f"{len(entries)} Entscheidungen, {len(classifier.labels)} Agenten, {len(classifier.index)} Terme -> {args.model}")
+        for agent_name, count in counts.most_common():
+            print(f"  {count:5d}  {agent_name}")
+        return
+
+    shuffled = list(entries)
+    random.Random(args.seed).shuffle(shuffled)
+    split = max(1, int(len(shuffled) * args.holdout))
+    result = evaluate(shuffled[split:], shuffled[:split])
+    print(f"Testmenge: {split} von {len(entries)} Entscheidungen")
+    print(f"Genauigkeit gegenüber Dirk (alle): {result['accuracy']:.1%}")
+    print("Schwelle  Abdeckung  Genauigkeit")
+    for row in result["thresholds"]:
+        print(f"  {row['threshold']:.2f}    {row['coverage']:7.1%}    {row['accuracy']:7.1%}")
+    agreement = live_agreement(entries)
+    if agreement:
+        print("Live-Vorhersagen, Übereinstimmung mit Dirk pro Tag:")
+        for day, (hits, total) in agreement.items():
+            print(f"  {day}  {hits / total:6.1%}  ({total} Entscheidungen)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+================================================================================
+Parallele Befragung mehrerer Fach-Agenten ("Fan-out")
+
+Viele Fälle berühren mehrere Rechtsgebiete, z. B. HGB und Steuerrecht oder
+Arbeitsrecht und Sozialrecht. Agent Dirk kann pro Turn aber nur an EINEN
+`transfer_to_agent_*`-Agenten weiterleiten – die Frage wird dann nur aus
+einer Sicht beantwortet oder braucht mehrere Turns nacheinander.
+
+Der FanOut schickt dieselbe Frage gleichzeitig an mehrere Fach-Agenten:
+ - `ask(agents, messages)` liefert die Antworten in der Reihenfolge, in der
+   sie fertig werden (FanOutResult). Die Gesamtdauer entspricht damit dem
+   langsamsten Fach-Agenten, nicht der Summe aller.
+ - `synthesize(question, results)` führt die Antworten optional in einem
+   abschließenden Aufruf ("Agent Synthese") zu einer Antwort zusammen.
+
+Mit einem ResponseCache werden die Einzelantworten wie gewohnt zwischen-
+gespeichert. Die Fach-Agenten laufen in einem eigenen, begrenzten Thread-Pool –
+oder, mit einem AsyncSwarm-Client (`aask`/`asynthesize`), als Coroutinen
+ganz ohne zusätzliche Threads.
+================================================================================
+"""
+
+import asyncio
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# content: Antwort des Fach-Agenten (bei einem Fehler "")
+# error: Fehlermeldung oder None
+# elapsed: Dauer des Aufrufs in Sekunden
+FanOutResult = namedtuple("FanOutResult", ["agent_name", "content", "error", "elapsed"])
+
+# Anweisungen für den Agenten, der die Einzelantworten zusammenführt
+SYNTHESIS_INSTRUCTIONS = (
+    "Du erhältst eine juristische Frage und die Antworten mehrerer Fach-Agenten "
+    "aus unterschiedlichen Rechtsgebieten. Führe sie zu einer zusammenhängenden "
+    "Antwort zusammen. Kennzeichne, aus welchem Rechtsgebiet eine Aussage stammt, "
+    "benenne Widersprüche und Wechselwirkungen und lasse keine genannten "
+    "Paragraphen oder Fristen weg."
+)
+
+
+class FanOut:
+    """
+    Befragt mehrere Fach-Agenten gleichzeitig und führt die Antworten
+    optional zusammen.
+    """
+
+    def __init__(self, client, cache=None, max_workers=8, synthesis_agent=None):
+        """
+        - client: Swarm-Client (oder BackgroundClient)
+        - cache: optionaler ResponseCache für die Einzelantworten
+        - max_workers: höchstens so viele Fach-Agenten laufen gleichzeitig
+          (über alle Anfragen hinweg)
+        - synthesis_agent: Agent für die Zusammenführung; ohne Angabe wird
+          "Agent Synthese" beim ersten Bedarf erzeugt
+        """
+        self.client = client
+        self.cache = cache
+        self._synthesis_agent = synthesis_agent
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="swarm-fanout")
+
+    def _ask_one(self, agent, messages):
+        started = time.perf_counter()
+        try:
+            if self.cache is not None:
+                response = self.cache.run(self.client, agent, messages)
+            else:
+                response = self.client.run(agent=agent, messages=messages)
+            return FanOutResult(agent.name, response.messages[-1]["content"], None, time.perf_counter() - started)
+        except Exception as e:
+            return FanOutResult(agent.name, "", str(e), time.perf_counter() - started)
+
+    def ask(self, agents, messages):
+        """
+        Schickt die Frage an alle 'agents' gleichzeitig und liefert je
+        Fach-Agent ein FanOutResult, sobald dessen Antwort vorliegt. Fehler
+        einzelner Agenten brechen die übrigen nicht ab.
+        - messages: Nachrichtenliste oder Funktion agent -> Nachrichtenliste
+          (z. B. HistoryManager.window für das Token-Budget je Agent)
+        """
+        window = messages if callable(messages) else (lambda agent: messages)
+        futures = [self._executor.submit(self._ask_one, agent, list(window(agent))) for agent in agents]
+        for future in as_completed(futures):
+            yield future.result()
+
+    async def aask(self, async_client, agents, messages):
+        """
+        Wie ask, aber mit einem AsyncSwarm-Client (asynchroner Generator).
+        """
+        window = messages if callable(messages) else (lambda agent: messages)
+
+        async def ask_one(agent):
+            started = time.perf_counter()
+            try:
+                if self.cache is not None:
+                    response = await self.cache.arun(async_client, agent, list(window(agent)))
+                else:
+                    response = await async_client.run(agent=agent, messages=list(window(agent)))
+                return FanOutResult(agent.name, response.messages[-1]["content"], None, time.perf_counter() - started)
+            except Exception as e:
+                return FanOutResult(agent.name, "", str(e), time.perf_counter() - started)
+
+        for next_result in asyncio.as_completed([ask_one(agent) for agent in agents]):
+            yield await next_result
+
+    def synthesis_agent(self):
+        if self._synthesis_agent is None:
+            from swarm import Agent
+            self._synthesis_agent = Agent(name="Agent Synthese", instructions=SYNTHESIS_INSTRUCTIONS, model="gpt-4")
+        return self._synthesis_agent
+
+    def synthesize(self, question, results):
+        """
+        Führt die erfolgreichen Einzelantworten in einem weiteren Aufruf zu
+        einer Antwort zusammen.
+        """
+        response = self.client.run(agent=self.synthesis_agent(), messages=_synthesis_messages(question, results))
+        return response.messages[-1]["content"]
+
+    async def asynthesize(self, async_client, question, results):
+        """Wie synthesize, aber mit einem AsyncSwarm-Client."""
+        response = await async_client.run(agent=self.synthesis_agent(), messages=_synthesis_messages(question, results))
+        return response.messages[-1]["content"]
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+
+def _synthesis_messages(question, results):
+    answers = "\n\n".join(
+        f"### {result.agent_name}\n{result.content}" for result in results if result.error is None
+    )
+    return [{"role": "user", "content": f"Frage:\n{question}\n\nAntworten der Fach-Agenten:\n\n{answers}"}]
+
+
+def format_result(result, markdown=True):
+    """
+    Text eines Einzelergebnisses für den Chatverlauf (Markdown für Gradio,
+    ohne Markdown für die Tk-Textfelder).
+    """
+    name = f"**{result.agent_name}:**" if markdown else f"{result.agent_name}:"
+    if result.error is not None:
+        return f"{name} Fehler: {result.error}\n\n"
+    return f"{name}\n{result.content}\n\n"
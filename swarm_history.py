@@ -0,0 +1,347 @@
+"""
+================================================================================
+Token-Budget für den Nachrichtenverlauf
+
+Bisher wuchs die Liste `messages` unbegrenzt und wurde bei jedem Aufruf von
+`client.run(...)` komplett mitgeschickt. Damit wuchsen Prompt-Größe, Latenz
+und Kosten linear mit der Dauer der Sitzung – bis das Kontextlimit des
+Modells die Sitzung abbrechen ließ.
+
+Der HistoryManager
+ - zählt die Tokens jeder Nachricht genau einmal beim Anhängen und führt eine
+   laufende Summe (kein erneutes Zählen des gesamten Verlaufs),
+ - liefert mit `window(agent)` nur so viele der neuesten Nachrichten, wie in
+   das Token-Budget des Agenten passen (abzüglich seiner Instruktionen, die
+   Swarm als System-Prompt voranstellt),
+ - behält dabei immer die letzten Nutzer-Nachrichten und eine vorhandene
+   Zusammenfassung am Anfang,
+ - fasst die ältesten Nachrichten bei Bedarf im Hintergrund zusammen
+   (`compact_in_background`), sodass der Anfragepfad nie auf die
+   Zusammenfassung warten muss.
+
+Tokens werden mit `tiktoken` gezählt, falls installiert; sonst dient eine
+Schätzung (ca. 4 Zeichen pro Token) als Ersatz.
+================================================================================
+"""
+
+import json
+import threading
+import traceback
+
+try:
+    import tiktoken
+except ImportError:  # optional: ohne tiktoken wird geschätzt
+    tiktoken = None
+
+# Zuschlag pro Nachricht für Rolle und Formatierung im Chat-Format
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# Anweisungen für den Agenten, der alte Gesprächsteile zusammenfasst
+SUMMARY_INSTRUCTIONS = (
+    "Du fasst einen Ausschnitt aus einer juristischen Beratungsunterhaltung "
+    "knapp und sachlich zusammen. Behalte alle Fakten, genannten Paragraphen, "
+    "Fristen und offenen Fragen bei. Antworte nur mit der Zusammenfassung."
+)
+
+# Präfix der Nachricht, die den zusammengefassten Teil ersetzt
+SUMMARY_PREFIX = "Zusammenfassung des bisherigen Gesprächs: "
+
+_encoding = None
+
+
+def count_tokens(text):
+    """
+    Zählt die Tokens eines Textes (tiktoken, sonst Schätzung).
+    """
+    global _encoding
+    if not text:
+        return 0
+    if tiktoken is not None:
+        if _encoding is None:
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        return len(_encoding.encode(text))
+    return max(1, len(text) // 4)
+
+
+def count_message_tokens(message):
+    """
+    Zählt die Tokens einer einzelnen Chat-Nachricht inklusive Tool-Aufrufen.
+    """
+    tokens = MESSAGE_OVERHEAD_TOKENS + count_tokens(message.get("content") or "")
+    if message.get("tool_calls"):
+        tokens += count_tokens(json.dumps(message["tool_calls"], ensure_ascii=False))
+    return tokens
+
+
+def swarm_summarizer(client, summary_agent=None):
+    """
+    Erzeugt eine Zusammenfassungsfunktion auf Basis eines Swarm-Clients.
+    Der übergebene Agent sollte SUMMARY_INSTRUCTIONS als Instruktionen haben.
+    Ohne Agent wird bei der ersten Zusammenfassung "Agent Zusammenfassung"
+    mit SUMMARY_INSTRUCTIONS erzeugt (swarm wird erst dann importiert).
+    """
+    agents = [summary_agent]
+
+    def summarize(messages):
+        if agents[0] is None:
+            from swarm import Agent
+            agents[0] = Agent(name="Agent Zusammenfassung", instructions=SUMMARY_INSTRUCTIONS, model="gpt-4")
+        transcript = "\n".join(
+            f"{message['role']}: {message.get('content') or ''}"
+            for message in messages
+            if message.get("content")
+        )
+        response = client.run(
+            agent=agents[0],
+            messages=[{"role": "user", "content": transcript}],
+        )
+        return response.messages[-1]["content"]
+    return summarize
+
+
+class HistoryManager:
+    """
+    Nachrichtenverlauf mit zwischengespeicherten Token-Zahlen und
+    Token-Budget pro Agent.
+    """
+
+    def __init__(self, messages=None, default_budget=6000, budgets=None,
+                 keep_last=4, summarizer=None):
+        """
+        - messages: optionale Startnachrichten
+        - default_budget: Token-Budget pro Anfrage (inkl. Instruktionen)
+        - budgets: optionales Dictionary Agentenname -> eigenes Budget
+        - keep_last: so viele der neuesten Nachrichten werden immer mitgeschickt
+        - summarizer: optionale Funktion summarize(messages) -> Text für die
+          Hintergrund-Zusammenfassung; ohne sie werden alte Nachrichten nur
+          aus dem Fenster ausgelassen
+        """
+        self.default_budget = default_budget
+        self.budgets = dict(budgets or {})
+        self.keep_last = keep_last
+        self.summarizer = summarizer
+        self._messages = []
+        self._token_counts = []
+        self._total_tokens = 0
+        self._instruction_tokens = {}
+        self._compacting = False
+        self._lock = threading.RLock()
+        self.extend(messages or [])
+
+    # -------------------------------------------------------------------------
+    # Verlauf pflegen
+    # -------------------------------------------------------------------------
+    def append(self, message):
+        tokens = count_message_tokens(message)
+        with self._lock:
+            self._messages.append(message)
+            self._token_counts.append(tokens)
+            self._total_tokens += tokens
+
+    def extend(self, messages):
+        # Am Stück: Frage und Antwort eines Turns bleiben zusammen, auch wenn
+        # ein anderer Thread gleichzeitig anhängt
+        with self._lock:
+            for message in messages:
+                self.append(message)
+
+    @property
+    def messages(self):
+        """Kopie des vollständigen (ggf. bereits zusammengefassten) Verlaufs."""
+        with self._lock:
+            return list(self._messages)
+
+    @property
+    def total_tokens(self):
+        return self._total_tokens
+
+    def __len__(self):
+        return len(self._messages)
+
+    def __deepcopy__(self, memo):
+        # Gradio kopiert den Startwert eines gr.State für jede Sitzung. Das
+        # Lock lässt sich nicht kopieren, daher wird ein neuer Manager mit
+        # denselben Einstellungen und einer Kopie des Verlaufs angelegt.
+        copy = HistoryManager(
+            default_budget=self.default_budget,
+            budgets=self.budgets,
+            keep_last=self.keep_last,
+            summarizer=self.summarizer,
+        )
+        with self._lock:
+            copy._messages = [dict(message) for message in self._messages]
+            copy._token_counts = list(self._token_counts)
+            copy._total_tokens = self._total_tokens
+        return copy
+
+    # -------------------------------------------------------------------------
+    # Kontextfenster für eine Anfrage
+    # -------------------------------------------------------------------------
+    def budget_for(self, agent):
+        return self.budgets.get(agent.name, self.default_budget)
+
+    def window(self, agent):
+        """
+        Liefert die Nachrichten, die für eine Anfrage an 'agent' mitgeschickt
+        werden: eine vorhandene Zusammenfassung, die letzten keep_last
+        Nachrichten und davor so viele ältere, wie in das Budget passen.
+        """
+        budget = self.budget_for(agent) - self._tokens_for_instructions(agent)
+        with self._lock:
+            pinned = 1 if self._is_summary(0) else 0
+            start = max(pinned, len(self._messages) - self.keep_last)
+            used = sum(self._token_counts[:pinned]) + sum(self._token_counts[start:])
+            while start > pinned and used + self._token_counts[start - 1] <= budget:
+                start -= 1
+                used += self._token_counts[start]
+            # Tool-Antworten nie ohne den zugehörigen Tool-Aufruf schicken
+            while start < len(self._messages) - 1 and self._messages[start].get("role") == "tool":
+                start += 1
+            return self._messages[:pinned] + self._messages[start:]
+
+    def _tokens_for_instructions(self, agent):
+        instructions = agent.instructions if isinstance(agent.instructions, str) else ""
+        cached = self._instruction_tokens.get(agent.name)
+        if cached is None or cached[0] != instructions:
+            cached = (instructions, count_tokens(instructions))
+            self._instruction_tokens[agent.name] = cached
+        return cached[1]
+
+    def _is_summary(self, index):
+        if index >= len(self._messages):
+            return False
+        message = self._messages[index]
+        return message.get("role") == "system" and (message.get("content") or "").startswith(SUMMARY_PREFIX)
+
+    # -------------------------------------------------------------------------
+    # Zusammenfassung im Hintergrund
+    # -------------------------------------------------------------------------
+    def compact_in_background(self):
+        """
+        Startet eine Zusammenfassung der ältesten Nachrichten in einem eigenen
+        Thread, sobald der Verlauf das Standardbudget überschreitet. Kehrt
+        sofort zurück; läuft bereits eine Zusammenfassung, passiert nichts.
+        """
+        if self.summarizer is None:
+            return None
+        with self._lock:
+            if self._compacting or self._total_tokens <= self.default_budget:
+                return None
+            cut = self._compaction_cut()
+            if cut <= 1:
+                return None
+            self._compacting = True
+            selected = self._messages[:cut]
+        thread = threading.Thread(target=self._compact, args=(selected,), daemon=True)
+        thread.start()
+        return thread
+
+    def _compaction_cut(self):
+        # Älteste Nachrichten so lange auswählen, bis der Rest etwa in das
+        # halbe Budget passt; die letzten keep_last bleiben immer erhalten.
+        limit = len(self._messages) - self.keep_last
+        remaining = self._total_tokens
+        cut = 0
+        while cut < limit and remaining > self.default_budget // 2:
+            remaining -= self._token_counts[cut]
+            cut += 1
+        # Nicht zwischen Tool-Aufruf und Tool-Antwort schneiden
+        while cut < limit and self._messages[cut].get("role") == "tool":
+            cut += 1
+        return cut
+
+    def _compact(self, selected):
+        try:
+            summary = self.summarizer(selected)
+        except Exception:
+            traceback.print_exc()
+            summary = None
+        with self._lock:
+            self._compacting = False
+            # Der Verlauf wird nur hinten ergänzt, der ausgewählte Anfang ist
+            # also unverändert – trotzdem sicherheitshalber prüfen.
+            cut = len(selected)
+            if not summary or self._messages[:cut] != selected:
+                return
+            summary_message = {"role": "system", "content": SUMMARY_PREFIX + summary}
+            summary_tokens = count_message_tokens(summary_message)
+            self._total_tokens += summary_tokens - sum(self._token_counts[:cut])
+            self._messages[:cut] = [summary_message]
+            self._token_counts[:cut] = [summary_tokens]
+
+
+class TabHistories:
+    """
+    Ein eigener HistoryManager je Tab (Agent), erst bei Bedarf angelegt.
+    So trägt eine Anfrage im Tab "Agent Patentrecht" nicht mehr jeden BGB-
+    oder StGB-Turn der anderen Tabs mit sich.
+
+    Kontext wird nur ausdrücklich weitergegeben (`share`), z. B. wenn Agent
+    Dirk an einen Fach-Agenten weiterleitet.
+    """
+
+    def __init__(self, factory, initial=None, restore=None):
+        """
+        - factory: Funktion ohne Parameter, die einen neuen HistoryManager liefert
+        - initial: optionales Dictionary Tabname -> Startnachrichten
+        - restore: optionale Funktion Tabname -> gespeicherte Nachrichten; sie
+          werden beim ersten Zugriff nach den Startnachrichten angehängt, so
+          kennt das Modell nach einem Neustart den bisherigen Verlauf
+        """
+        self._factory = factory
+        self._initial = dict(initial or {})
+        self._restore = restore
+        self._histories = {}
+        # Anzahl der bisher angehängten Nachrichten je Tab und wie weit davon
+        # schon an einen anderen Tab weitergegeben wurde
+        self._appended = {}
+        self._shared_until = {}
+        self._lock = threading.Lock()
+
+    def __getitem__(self, name):
+        with self._lock:
+            history = self._histories.get(name)
+            if history is None:
+                messages = self._initial.pop(name, [])
+                if self._restore is not None:
+                    messages = messages + list(self._restore(name))
+                history = self._histories[name] = self._factory()
+                history.extend(messages)
+                self._appended[name] = len(messages)
+            return history
+
+    def __contains__(self, name):
+        return name in self._histories
+
+    def add_turn(self, name, user_input, agent_response):
+        """
+        Hängt Frage und Antwort an den Verlauf eines Tabs an und startet bei
+        Bedarf die Zusammenfassung im Hintergrund.
+        """
+        history = self[name]
+        history.extend([
+            {"role": "user", "content": user_input},
+            {"role": "assistant", "content": agent_response},
+        ])
+        with self._lock:
+            self._appended[name] += 2
+        history.compact_in_background()
+
+    def share(self, from_name, to_name, limit=4):
+        """
+        Gibt die neuesten Nachrichten von 'from_name' an 'to_name' weiter –
+        höchstens 'limit' und nur solche, die dort noch nicht angekommen sind.
+        Liefert die Anzahl der übernommenen Nachrichten.
+        """
+        if from_name == to_name:
+            return 0
+        source, target = self[from_name], self[to_name]
+        with self._lock:
+            appended = self._appended[from_name]
+            new = appended - self._shared_until.get((from_name, to_name), 0)
+            self._shared_until[(from_name, to_name)] = appended
+        count = min(new, limit)
+        if count <= 0:
+            return 0
+        target.extend(source.messages[-count:])
+        return count
@@ -0,0 +1,245 @@
+"""
+================================================================================
+Lasttest für die Swarm-Frontends (ohne Browser und ohne Fensterbedienung)
+
+Treibt N gleichzeitige, synthetische Nutzer durch
+ - den Gradio-Pfad: `send_message` aus ai_swarm_gradio.py, eine eigene
+   Sitzung (`new_session()`) pro Nutzer, oder
+ - den Tk-Pfad: `process_message` aus ai_swarm_2.py (Fenster unsichtbar; der
+   Hauptthread verarbeitet nur die root.after-Aufrufe der Worker).
+
+Gedacht für den Betrieb gegen mock_openai_server.py, damit kein API-Kontingent
+verbraucht wird:
+
+    python mock_openai_server.py --port 8800 --latency lognormal:-1.5,0.5 &
+    python swarm_loadtest.py --frontend gradio --users 16 --turns 5
+
+Ausgabe: p50/p95/p99 der Antwortzeit (bei Gradio auch der Zeit bis zum ersten
+Textstück), Durchsatz und Fehlerzahl. Mit --json wird das Ergebnis zusätzlich
+maschinenlesbar ausgegeben (z. B. zum Vergleich zweier Läufe).
+
+Der Tk-Pfad braucht ein Display; auf Servern z. B. `xvfb-run python ...`.
+================================================================================
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+
+# Themen, aus denen die synthetischen Anfragen gebaut werden. Die Kürzel sorgen
+# dafür, dass sowohl der lokale Router als auch der Mock-Server weiterleiten.
+PROMPTS = (
+    "Was regelt § 433 BGB beim Kaufvertrag?",
+    "Welche Pflichten hat ein Kaufmann nach dem HGB?",
+    "Ist Ladendiebstahl nach StGB immer strafbar?",
+    "Wie lang ist die Kündigungsfrist nach ArbGB?",
+    "Welche Leistungen sieht das SGB II vor?",
+    "Kann ich mein Arbeitszimmer steuerlich absetzen?",
+    "Wie lege ich Widerspruch gegen einen Bescheid ein?",
+    "Was ist irreführende Werbung nach dem UWG?",
+    "Darf ich fremde Fotos auf meiner Website nutzen?",
+    "Hallo, ich habe eine allgemeine Frage zu meinem Mietvertrag.",
+)
+
+
+def percentile(values, fraction):
+    """
+    Perzentil nach der Nearest-Rank-Methode (values muss sortiert sein).
+    """
+    if not values:
+        return 0.0
+    rank = max(1, math.ceil(fraction * len(values)))
+    return values[min(rank, len(values)) - 1]
+
+
+def make_prompt(user, turn, repeat_prompts):
+    prompt = PROMPTS[(user + turn) % len(PROMPTS)]
+    if repeat_prompts:
+        return prompt
+    # Eindeutige Anfragen, damit der Antwort-Cache die Messung nicht verfälscht
+    return f"{prompt} (Nutzer {user}, Frage {turn})"
+
+
+class Recorder:
+    """
+    Sammelt die Messwerte aller Nutzer-Threads.
+    """
+
+    def __init__(self):
+        self.latencies = []
+        self.first_token = []
+        self.errors = []
+        self._lock = threading.Lock()
+
+    def record(self, latency, first_token=None):
+        with self._lock:
+            self.latencies.append(latency)
+            if first_token is not None:
+                self.first_token.append(first_token)
+
+    def error(self, message):
+        with self._lock:
+            self.errors.append(message)
+
+    def summary(self, wall_time):
+        latencies = sorted(self.latencies)
+        first_token = sorted(self.first_token)
+        result = {
+            "turns": len(latencies),
+            "errors": len(self.errors),
+            "wall_time": wall_time,
+            "throughput": len(latencies) / wall_time if wall_time else 0.0,
+        }
+        for name, values in (("latency", latencies), ("first_token", first_token)):
+            if values:
+                result[name] = {
+                    "p50": percentile(values, 0.50),
+                    "p95": percentile(values, 0.95),
+                    "p99": percentile(values, 0.99),
+                    "max": values[-1],
+                }
+        return result
+
+
+# -----------------------------------------------------------------------------
+# Gradio-Pfad
+# -----------------------------------------------------------------------------
+def run_gradio(args, recorder):
+    import ai_swarm_gradio as app
+
+    # send_message ist ein asynchroner Generator: alle Nutzer laufen als
+    # Coroutinen in einer Ereignisschleife (wie in Gradio), ohne Threads
+    async def user_loop(user):
+        session = app.new_session()
+        for turn in range(args.turns):
+            prompt = make_prompt(user, turn, args.repeat_prompts)
+            started = time.perf_counter()
+            first_token = None
+            try:
+                async for chat_history, current_turn, session in app.send_message(prompt, session):
+                    # Gestreamte Textstücke stehen im laufenden Turn, fertige
+                    # Antworten (ohne Streaming) direkt im Chatverlauf
+                    answered = current_turn or chat_history
+                    if first_token is None and isinstance(answered, list) and answered and answered[-1][1]:
+                        first_token = time.perf_counter() - started
+            except Exception as e:
+                recorder.error(f"Nutzer {user}, Frage {turn}: {e}")
+                continue
+            recorder.record(time.perf_counter() - started, first_token)
+
+    async def run_users():
+        started = time.perf_counter()
+        await asyncio.gather(*(user_loop(user) for user in range(args.users)))
+        return time.perf_counter() - started
+
+    wall_time = asyncio.run(run_users())
+    app.conversation_store.close()
+    return wall_time
+
+
+# -----------------------------------------------------------------------------
+# Tk-Pfad
+# -----------------------------------------------------------------------------
+def run_tk(args, recorder):
+    import ai_swarm_2 as app
+
+    app.root.withdraw()
+
+    # process_message fängt Fehler selbst ab und zeigt sie im Chat an. Eine
+    # Antwort gilt deshalb nur dann als erfolgreich, wenn record_turn im
+    # selben Thread aufgerufen wurde.
+    succeeded = threading.local()
+    record_turn = app.record_turn
+
+    def counting_record_turn(*record_args):
+        succeeded.value = True
+        return record_turn(*record_args)
+
+    app.record_turn = counting_record_turn
+    # Die Nutzer-Threads umgehen den Worker-Pool: Eine vorab an einen
+    # Fach-Agenten geroutete Frage wird direkt im selben Thread beantwortet
+    app.worker_pool.forward = lambda lane, function, *forward_args: function(*forward_args)
+
+    def user_loop(user):
+        for turn in range(args.turns):
+            prompt = make_prompt(user, turn, args.repeat_prompts)
+            succeeded.value = False
+            started = time.perf_counter()
+            app.process_message(prompt, app.agent_registry.dispatcher_name)
+            if succeeded.value:
+                recorder.record(time.perf_counter() - started)
+            else:
+                recorder.error(f"Nutzer {user}, Frage {turn}: keine Antwort")
+
+    threads = [threading.Thread(target=user_loop, args=(user,), daemon=True) for user in range(args.users)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    # Der Hauptthread arbeitet die GUI-Aktualisierungen der Worker ab
+    while any(thread.is_alive() for thread in threads):
+        app.root.update()
+        time.sleep(0.005)
+    wall_time = time.perf_counter() - started
+    app.root.update()
+    app.worker_pool.shutdown()
+    app.conversation_store.close()
+    app.root.destroy()
+    return wall_time
+
+
+def print_summary(frontend, args, result):
+    print(f"Frontend: {frontend}, {args.users} Nutzer x {args.turns} Fragen")
+    print(f"Antworten: {result['turns']}, Fehler: {result['errors']}")
+    print(f"Dauer: {result['wall_time']:.2f} s, Durchsatz: {result['throughput']:.2f} Antworten/s")
+    for name, label in (("latency", "Antwortzeit"), ("first_token", "Erstes Textstück")):
+        if name in result:
+            values = result[name]
+            print(
+                f"{label}: p50 {values['p50'] * 1000:.0f} ms, p95 {values['p95'] * 1000:.0f} ms, "
+                f"p99 {values['p99'] * 1000:.0f} ms, max {values['max'] * 1000:.0f} ms"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lasttest für die Swarm-Frontends")
+    parser.add_argument("--frontend", choices=("gradio", "tk"), default="gradio")
+    parser.add_argument("--users", type=int, default=8, help="gleichzeitige synthetische Nutzer")
+    parser.add_argument("--turns", type=int, default=5, help="Fragen pro Nutzer")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8800/v1",
+                        help="OpenAI-kompatibler Endpunkt (Standard: lokaler Mock-Server)")
+    parser.add_argument("--repeat-prompts", action="store_true",
+                        help="gleiche Fragen wiederholen (misst den Antwort-Cache mit)")
+    parser.add_argument("--no-stream", action="store_true", help="blockierenden Modus messen")
+    parser.add_argument("--json", action="store_true", help="Ergebnis zusätzlich als JSON ausgeben")
+    args = parser.parse_args()
+
+    # Vor dem Import der Frontends setzen: Endpunkt, Modus und eigene,
+    # temporäre Cache-/Speicherdateien (die echten Daten bleiben unberührt).
+    workdir = tempfile.mkdtemp(prefix="swarm_loadtest_")
+    os.environ["OPENAI_BASE_URL"] = args.base_url
+    os.environ.setdefault("OPENAI_API_KEY", "mock")
+    os.environ["SWARM_STREAM"] = "0" if args.no_stream else "1"
+    os.environ["SWARM_CACHE_PATH"] = os.path.join(workdir, "cache.sqlite3")
+    os.environ["SWARM_STORE_PATH"] = os.path.join(workdir, "conversations.sqlite3")
+
+    recorder = Recorder()
+    if args.frontend == "gradio":
+        wall_time = run_gradio(args, recorder)
+    else:
+        wall_time = run_tk(args, recorder)
+
+    result = recorder.summary(wall_time)
+    print_summary(args.frontend, args, result)
+    for message in recorder.errors[:5]:
+        print(f"  Fehler: {message}")
+    if args.json:
+        print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
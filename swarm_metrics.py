@@ -0,0 +1,401 @@
+"""
+================================================================================
+Laufzeit- und Token-Messung pro Turn mit Prometheus-Endpunkt
+
+Bei einer langsamen Antwort war bisher nicht zu erkennen, ob die Zeit im
+Routing, bei einer Weiterleitung, in der Modellantwort oder in der Oberfläche
+verloren ging – `process_message` und `send_message` behalten nur den Text.
+
+Dieses Modul misst jeden Turn in Phasen:
+ - "queue":       Wartezeit im Worker-Pool bis zum Start der Bearbeitung
+ - "routing":     lokales Vorab-Routing (Schlüsselwörter, gelerntes Modell)
+ - "handoff":     Zeit bis zu einer Weiterleitung (je Weiterleitung)
+ - "first_token": Zeit bis zum ersten Textstück
+ - "completion":  Zeit bis die Antwort vollständig ist
+ - "render":      Verzögerung, bis root.after(...) die Anzeige aktualisiert hat
+ - "model_call":  jeder einzelne Modellaufruf, je Agent – bei Agent Dirk ist
+                  das der Routing-Aufruf (gemessen in swarm_tools)
+
+Prompt- und Completion-Tokens werden je Agent aus der `usage` der API
+gezählt (beim Streaming über stream_options.include_usage).
+
+Alle Werte landen in Histogrammen (feste Bucket-Grenzen wie bei Prometheus):
+ - `Metrics.describe()`: kurze Übersicht (Median, p95) für die Oberflächen
+ - `Metrics.render()`:   Textformat von Prometheus
+ - `serve_from_env()`:   mit SWARM_METRICS_PORT liefert ein kleiner
+                         HTTP-Server unter /metrics dieses Format aus
+================================================================================
+"""
+
+import bisect
+import os
+import threading
+import time
+from collections import defaultdict
+
+# Anzeigenamen der Phasen (Reihenfolge für describe)
+PHASES = {
+    "queue": "Warteschlange",
+    "routing": "Lokales Routing",
+    "handoff": "Bis zur Weiterleitung",
+    "first_token": "Erstes Textstück",
+    "completion": "Antwort vollständig",
+    "render": "Anzeige",
+    "model_call": "Modellaufruf",
+}
+
+# Bucket-Grenzen in Sekunden
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+class Histogram:
+    """
+    Zählt Messwerte je Bucket (obere Grenze einschließlich, wie "le" bei
+    Prometheus) sowie Anzahl und Summe.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # letzter Eintrag: +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def merge(self, other):
+        for index, count in enumerate(other.counts):
+            self.counts[index] += count
+        self.count += other.count
+        self.sum += other.sum
+
+    def quantile(self, q):
+        """
+        Geschätztes Quantil (lineare Interpolation im Bucket, wie
+        histogram_quantile bei Prometheus).
+        """
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        cumulative = 0
+        lower = 0.0
+        for index, count in enumerate(self.counts):
+            if index == len(self.buckets):
+                return self.buckets[-1]
+            upper = self.buckets[index]
+            if count and cumulative + count >= rank:
+                return lower + (upper - lower) * (rank - cumulative) / count
+            cumulative += count
+            lower = upper
+        return self.buckets[-1]
+
+
+class Metrics:
+    """
+    Sammelt Phasen-Histogramme (je Phase und Agent) und Token-Zähler je
+    Agent. Alle Methoden sind threadsicher.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._histograms = {}  # (Phase, Agentenname) -> Histogram
+        self._tokens = defaultdict(lambda: [0, 0])  # Agentenname -> [prompt, completion]
+        self.turns = 0
+        self.errors = 0
+
+    def observe(self, phase, seconds, agent_name=""):
+        with self._lock:
+            histogram = self._histograms.get((phase, agent_name))
+            if histogram is None:
+                histogram = self._histograms[(phase, agent_name)] = Histogram(self.buckets)
+            histogram.observe(seconds)
+
+    def add_tokens(self, agent_name, prompt_tokens, completion_tokens):
+        with self._lock:
+            tokens = self._tokens[agent_name]
+            tokens[0] += prompt_tokens or 0
+            tokens[1] += completion_tokens or 0
+
+    def add_usage(self, agent_name, usage):
+        """Übernimmt die `usage` einer Chat-Completion (falls vorhanden)."""
+        if usage is not None:
+            self.add_tokens(agent_name, usage.prompt_tokens, usage.completion_tokens)
+
+    def turn(self, started=None):
+        """Beginnt die Messung eines Turns (siehe Turn)."""
+        return Turn(self, started)
+
+    def _finish_turn(self, error):
+        with self._lock:
+            self.turns += 1
+            self.errors += bool(error)
+
+    # -------------------------------------------------------------------------
+    # Modellaufrufe (aus swarm_tools.CachedToolsMixin)
+    # -------------------------------------------------------------------------
+    def track_completion(self, agent_name, completion, stream, started, span=None):
+        """
+        Misst einen Modellaufruf: 'completion' ist das Ergebnis von
+        chat.completions.create (beim AsyncOpenAI-Client eine Coroutine).
+        Liefert ein gleichwertiges Ergebnis zurück; Stream-Chunks ohne
+        choices (nur usage) werden dabei herausgefiltert. Ein Span
+        (swarm_tracing) wird am Ende des Aufrufs mit den Tokens beendet.
+        """
+        if hasattr(completion, "__await__"):
+            return self._track_async(agent_name, completion, stream, started, span)
+        if stream:
+            return self._stream(agent_name, completion, started, span)
+        self._finish_call(agent_name, started, getattr(completion, "usage", None), span)
+        return completion
+
+    async def _track_async(self, agent_name, completion, stream, started, span):
+        try:
+            completion = await completion
+        except Exception as e:
+            if span is not None:
+                span.end(e)
+            raise
+        if stream:
+            return self._astream(agent_name, completion, started, span)
+        self._finish_call(agent_name, started, getattr(completion, "usage", None), span)
+        return completion
+
+    def _stream(self, agent_name, chunks, started, span):
+        usage, error = None, None
+        try:
+            for chunk in chunks:
+                usage = getattr(chunk, "usage", None) or usage
+                if chunk.choices:
+                    yield chunk
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self._finish_call(agent_name, started, usage, span, error)
+            close = getattr(chunks, "close", None)
+            if close is not None:
+                close()
+
+    async def _astream(self, agent_name, chunks, started, span):
+        usage, error = None, None
+        try:
+            async for chunk in chunks:
+                usage = getattr(chunk, "usage", None) or usage
+                if chunk.choices:
+                    yield chunk
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self._finish_call(agent_name, started, usage, span, error)
+            close = getattr(chunks, "close", None)
+            if close is not None:
+                await close()
+
+    def _finish_call(self, agent_name, started, usage, span, error=None):
+        self.observe("model_call", time.perf_counter() - started, agent_name)
+        self.add_usage(agent_name, usage)
+        if span is not None:
+            if usage is not None:
+                span.set(prompt_tokens=usage.prompt_tokens, completion_tokens=usage.completion_tokens)
+            span.end(error)
+
+    # -------------------------------------------------------------------------
+    # Auswertung
+    # -------------------------------------------------------------------------
+    def stats(self):
+        """
+        Median/p95/Anzahl je Phase (über alle Agenten), Modellaufrufe und
+        Tokens je Agent.
+        """
+        with self._lock:
+            phases = {}
+            model_calls = {}
+            for (phase, agent_name), histogram in self._histograms.items():
+                merged = phases.setdefault(phase, Histogram(self.buckets))
+                merged.merge(histogram)
+                if phase == "model_call":
+                    model_calls[agent_name] = _summary(histogram)
+            return {
+                "turns": self.turns,
+                "errors": self.errors,
+                "phases": {phase: _summary(histogram) for phase, histogram in phases.items()},
+                "model_calls": model_calls,
+                "tokens": {
+                    agent_name: {"prompt": prompt, "completion": completion}
+                    for agent_name, (prompt, completion) in self._tokens.items()
+                },
+            }
+
+    def describe(self):
+        """Kurze, lesbare Zusammenfassung von stats() für die Oberflächen."""
+        stats = self.stats()
+        lines = [f"Turns: {stats['turns']} ({stats['errors']} mit Fehler)"]
+        for phase, label in PHASES.items():
+            summary = stats["phases"].get(phase)
+            if summary:
+                lines.append(
+                    f"{label}: Median {summary['p50'] * 1000:.0f} ms, "
+                    f"p95 {summary['p95'] * 1000:.0f} ms ({summary['count']}×)"
+                )
+        for agent_name, summary in sorted(stats["model_calls"].items()):
+            tokens = stats["tokens"].get(agent_name, {"prompt": 0, "completion": 0})
+            lines.append(
+                f"{agent_name}: {summary['count']} Aufrufe, Median {summary['p50']:.2f} s, "
+                f"{tokens['prompt']} Prompt- / {tokens['completion']} Completion-Tokens"
+            )
+        return "\n".join(lines)
+
+    def render(self):
+        """Alle Werte im Textformat von Prometheus (Version 0.0.4)."""
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+            tokens = sorted(self._tokens.items())
+            turns, errors = self.turns, self.errors
+
+        lines = [
+            "# HELP swarm_phase_seconds Dauer der Phasen eines Turns und der Modellaufrufe.",
+            "# TYPE swarm_phase_seconds histogram",
+        ]
+        for (phase, agent_name), histogram in histograms:
+            labels = f'phase="{_escape(phase)}",agent="{_escape(agent_name)}"'
+            cumulative = 0
+            for bound, count in zip(histogram.buckets + (float("inf"),), histogram.counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'swarm_phase_seconds_bucket{{{labels},le="{le}"}} {cumulative}')
+            lines.append(f"swarm_phase_seconds_sum{{{labels}}} {histogram.sum!r}")
+            lines.append(f"swarm_phase_seconds_count{{{labels}}} {histogram.count}")
+
+        lines += [
+            "# HELP swarm_tokens_total Verbrauchte Tokens je Agent.",
+            "# TYPE swarm_tokens_total counter",
+        ]
+        for agent_name, (prompt, completion) in tokens:
+            lines.append(f'swarm_tokens_total{{agent="{_escape(agent_name)}",kind="prompt"}} {prompt}')
+            lines.append(f'swarm_tokens_total{{agent="{_escape(agent_name)}",kind="completion"}} {completion}')
+
+        lines += [
+            "# HELP swarm_turns_total Abgeschlossene Turns.",
+            "# TYPE swarm_turns_total counter",
+            f"swarm_turns_total {turns}",
+            "# HELP swarm_turn_errors_total Turns, die mit einem Fehler endeten.",
+            "# TYPE swarm_turn_errors_total counter",
+            f"swarm_turn_errors_total {errors}",
+        ]
+        return "\n".join(lines) + "\n"
+
+
+class Turn:
+    """
+    Messung eines Turns. Zeiten wie first_token und completion zählen ab
+    'started' (Standard: jetzt).
+    """
+
+    def __init__(self, metrics, started=None):
+        self.metrics = metrics
+        self.started = time.perf_counter() if started is None else started
+        self._last_handoff = self.started
+        self._first_token = False
+
+    def phase(self, name, agent_name=""):
+        """Kontextmanager: misst die Dauer des Blocks als Phase 'name'."""
+        return _Phase(self.metrics, name, agent_name)
+
+    def first_token(self, agent_name=""):
+        """Erstes Textstück des Turns (weitere Aufrufe werden ignoriert)."""
+        if not self._first_token:
+            self._first_token = True
+            self.metrics.observe("first_token", time.perf_counter() - self.started, agent_name)
+
+    def handoff(self, agent_name=""):
+        """Weiterleitung durch 'agent_name': Zeit seit Beginn bzw. der letzten Weiterleitung."""
+        now = time.perf_counter()
+        self.metrics.observe("handoff", now - self._last_handoff, agent_name)
+        self._last_handoff = now
+
+    def finish(self, agent_name="", error=False):
+        """Ende des Turns; 'agent_name' ist der Agent, der geantwortet hat."""
+        self.metrics.observe("completion", time.perf_counter() - self.started, agent_name)
+        self.metrics._finish_turn(error)
+
+
+class _Phase:
+    def __init__(self, metrics, name, agent_name):
+        self.metrics = metrics
+        self.name = name
+        self.agent_name = agent_name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.metrics.observe(self.name, time.perf_counter() - self.started, self.agent_name)
+        return False
+
+
+def _summary(histogram):
+    return {
+        "count": histogram.count,
+        "mean": histogram.sum / histogram.count if histogram.count else 0.0,
+        "p50": histogram.quantile(0.5),
+        "p95": histogram.quantile(0.95),
+    }
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+# -----------------------------------------------------------------------------
+# Gemeinsame Instanz und HTTP-Endpunkt
+# -----------------------------------------------------------------------------
+_shared = Metrics()
+
+
+def shared_metrics():
+    """Die Messwerte dieses Prozesses (gemeinsam für alle Clients und Frontends)."""
+    return _shared
+
+
+def serve(metrics, port, host="127.0.0.1"):
+    """
+    Startet einen HTTP-Server in einem Hintergrund-Thread, der unter
+    /metrics metrics.render() ausliefert. Liefert den Server zurück.
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            if self.path.split("?")[0].rstrip("/") != "/metrics":
+                self.send_error(404)
+                return
+            body = metrics.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="swarm-metrics", daemon=True).start()
+    return server
+
+
+def serve_from_env(metrics=None):
+    """
+    Startet den Endpunkt, wenn SWARM_METRICS_PORT gesetzt ist
+    (SWARM_METRICS_HOST, Standard 127.0.0.1). Sonst None.
+    """
+    port = os.getenv("SWARM_METRICS_PORT")
+    if not port:
+        return None
+    return serve(metrics or _shared, int(port), os.getenv("SWARM_METRICS_HOST", "127.0.0.1"))
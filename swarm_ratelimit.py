@@ -0,0 +1,538 @@
+"""
+================================================================================
+Clientseitige Ratenbegrenzung für alle OpenAI-Aufrufe
+
+Wenn mehrere Nutzer gleichzeitig fragen, laufen die Frontends in die
+Rate-Limits der OpenAI-API (Anfragen und Tokens pro Minute). Bisher landete
+der 429-Fehler dann einfach als "Fehler: ..." im Chat.
+
+Der RateLimiter sitzt als httpx-Transport unter den OpenAI-Clients, die
+swarm_startup.py erzeugt – damit gilt er für jeden `client.run(...)`, egal ob
+aus den Frontends, dem Cache, dem Fan-out oder dem Zusammenfasser:
+ - Token-Buckets: je einer für Anfragen/Minute und Tokens/Minute. Vor dem
+   Senden wird der Tokenbedarf aus Nachrichten und max_tokens geschätzt.
+   Die Header x-ratelimit-limit-*/x-ratelimit-remaining-* jeder Antwort
+   gleichen Größe und Füllstand der Buckets mit dem Stand beim Server ab.
+ - Retry-After: Auf 429 (und 408/409/5xx, Verbindungsfehler) wartet der
+   Limiter die vom Server genannte Zeit plus einen zufälligen Backoff-Anteil
+   und wiederholt die Anfrage. Bei 429 pausieren alle Anfragen gemeinsam.
+   Ein 429 mit "insufficient_quota" (Kontingent aufgebraucht) erholt sich
+   nicht von selbst: Es wird sofort zurückgegeben, ohne Wiederholung und
+   ohne das Fenster zu verkleinern.
+ - AIMD-Fenster: Höchstens `window` Anfragen sind gleichzeitig unterwegs.
+   Jede erfolgreiche Antwort vergrößert das Fenster um 1/window (also etwa
+   +1 pro Fensterrunde), jedes 429 halbiert es. So pendelt sich der Durchsatz
+   knapp unter der Grenze ein, statt Anfragen scheitern zu lassen.
+
+Gestreamte Antworten belegen ihren Platz im Fenster, bis der Stream gelesen
+oder geschlossen ist. Die Wiederholungen übernimmt allein der Limiter; die
+OpenAI-Clients werden deshalb mit max_retries=0 erzeugt.
+
+Einstellungen (Umgebung): SWARM_RATE_RPM, SWARM_RATE_TPM (Startwerte, bis der
+Server seine Grenzen meldet), SWARM_RATE_CONCURRENCY (Startfenster),
+SWARM_RATE_MAX_CONCURRENCY, SWARM_RATE_MAX_RETRIES, SWARM_RATE_COMPLETION_TOKENS
+(geschätzte Antwortlänge ohne max_tokens). SWARM_RATE_LIMIT=0 schaltet ab.
+================================================================================
+"""
+
+import asyncio
+import email.utils
+import json
+import os
+import random
+import re
+import threading
+import time
+
+import httpx
+
+# Statuscodes, bei denen eine Wiederholung sinnvoll ist (wie im OpenAI-Client)
+RETRY_STATUSES = {408, 409, 429, 500, 502, 503, 504}
+
+# "6m0s", "1.5s", "20ms" aus den x-ratelimit-reset-*-Headern
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def parse_duration(value):
+    """Dauer im Format der x-ratelimit-reset-*-Header in Sekunden (oder None)."""
+    if not value:
+        return None
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        return None
+    return sum(float(number) * _DURATION_UNITS[unit] for number, unit in parts)
+
+
+def retry_after_seconds(headers, status_code=429):
+    """
+    Wartezeit, die der Server verlangt: retry-after-ms, Retry-After (Sekunden
+    oder HTTP-Datum), bei 429 ersatzweise x-ratelimit-reset-requests/-tokens.
+    Diese Header stehen auch an anderen Antworten – bei einem 5xx sagen sie
+    aber nichts darüber, wann ein neuer Versuch lohnt ("6m0s" Token-Reset).
+    """
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if value:
+        try:
+            return float(value)
+        except ValueError:
+            try:
+                return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
+    if status_code != 429:
+        return None
+    resets = [
+        parse_duration(headers.get("x-ratelimit-reset-requests")),
+        parse_duration(headers.get("x-ratelimit-reset-tokens")),
+    ]
+    resets = [reset for reset in resets if reset is not None]
+    return max(resets) if resets else None
+
+
+def is_quota_error(headers, raw):
+    """
+    True, wenn der (rohe) Body eines 429 "insufficient_quota" meldet – das
+    Kontingent des Kontos ist aufgebraucht, Warten hilft nicht.
+    """
+    try:
+        body = httpx.Response(429, headers=headers, content=raw).json()
+    except (ValueError, httpx.HTTPError):
+        return False
+    error = body.get("error") if isinstance(body, dict) else None
+    if not isinstance(error, dict):
+        return False
+    return "insufficient_quota" in (error.get("code"), error.get("type"))
+
+
+def estimate_tokens(body, completion_tokens=500):
+    """
+    Grobe Schätzung des Tokenbedarfs einer Chat-Anfrage (JSON-Body): etwa
+    vier Zeichen je Token für die Nachrichten plus die erwartete Antwort.
+    """
+    try:
+        request = json.loads(body)
+    except (TypeError, ValueError):
+        return 0
+    if not isinstance(request, dict) or "messages" not in request:
+        return 0
+    characters = sum(len(str(message.get("content") or "")) for message in request["messages"])
+    characters += len(json.dumps(request.get("tools") or []))
+    expected = request.get("max_completion_tokens") or request.get("max_tokens") or completion_tokens
+    return characters // 4 + len(request["messages"]) * 4 + expected
+
+
+class TokenBucket:
+    """
+    Token-Bucket mit Kapazität pro Minute. Nicht threadsicher – der
+    RateLimiter schützt ihn mit seiner Sperre.
+    """
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.level = float(per_minute)
+        self._updated = time.monotonic()
+
+    def _refill(self, now):
+        rate = self.capacity / 60.0
+        self.level = min(self.capacity, self.level + (now - self._updated) * rate)
+        self._updated = now
+
+    def wait_time(self, amount, now):
+        """Sekunden, bis 'amount' verfügbar ist (0 = sofort)."""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / (self.capacity / 60.0)
+
+    def take(self, amount, now):
+        self._refill(now)
+        self.level -= min(amount, self.capacity)
+
+    def sync(self, limit, remaining, now):
+        """Übernimmt Grenze und Restmenge, die der Server gemeldet hat."""
+        self._refill(now)
+        if limit:
+            self.capacity = float(limit)
+        if remaining is not None:
+            self.level = min(self.level, float(remaining))
+
+
+class RateLimiter:
+    """
+    Gemeinsame Ratenbegrenzung (RPM/TPM-Buckets + AIMD-Fenster) für alle
+    Clients eines Prozesses. Threadsicher; wartet synchron (acquire) oder in
+    einer Coroutine (aacquire).
+    """
+
+    def __init__(self, requests_per_minute=500, tokens_per_minute=30000, concurrency=8,
+                 max_concurrency=64, max_retries=5, completion_tokens=500,
+                 backoff_base=0.5, backoff_cap=30.0):
+        """
+        - requests_per_minute / tokens_per_minute: Startwerte der Buckets,
+          bis die Antwort-Header die tatsächlichen Grenzen liefern
+        - concurrency: Startgröße des Fensters gleichzeitiger Anfragen
+        - max_concurrency: Obergrenze, bis zu der das Fenster wachsen darf
+        - max_retries: Wiederholungen je Anfrage (429, 5xx, Verbindungsfehler)
+        - completion_tokens: erwartete Antwortlänge, wenn max_tokens fehlt
+        - backoff_base / backoff_cap: exponentieller Backoff in Sekunden
+        """
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.window = float(concurrency)
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.completion_tokens = completion_tokens
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+
+        self.in_flight = 0
+        self.throttled = 0
+        self.quota_errors = 0
+        self.retries = 0
+        self.waited_seconds = 0.0
+        self._paused_until = 0.0
+        self._last_decrease = 0.0
+        self._condition = threading.Condition()
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            requests_per_minute=int(os.getenv("SWARM_RATE_RPM", "500")),
+            tokens_per_minute=int(os.getenv("SWARM_RATE_TPM", "30000")),
+            concurrency=int(os.getenv("SWARM_RATE_CONCURRENCY", "8")),
+            max_concurrency=int(os.getenv("SWARM_RATE_MAX_CONCURRENCY", "64")),
+            max_retries=int(os.getenv("SWARM_RATE_MAX_RETRIES", "5")),
+            completion_tokens=int(os.getenv("SWARM_RATE_COMPLETION_TOKENS", "500")),
+        )
+
+    # -------------------------------------------------------------------------
+    # Plätze vergeben
+    # -------------------------------------------------------------------------
+    def _try_acquire(self, tokens):
+        # Liefert None (Platz vergeben) oder die Wartezeit in Sekunden
+        now = time.monotonic()
+        if now < self._paused_until:
+            return self._paused_until - now
+        if self.in_flight >= int(self.window):
+            return 0.05  # wird bei release() früher geweckt
+        wait = max(self.requests.wait_time(1, now), self.tokens.wait_time(tokens, now))
+        if wait > 0:
+            return wait
+        self.requests.take(1, now)
+        self.tokens.take(tokens, now)
+        self.in_flight += 1
+        return None
+
+    def acquire(self, tokens):
+        """Wartet (blockierend), bis eine Anfrage mit 'tokens' gesendet werden darf."""
+        started = time.monotonic()
+        with self._condition:
+            while True:
+                wait = self._try_acquire(tokens)
+                if wait is None:
+                    break
+                self._condition.wait(wait)
+            self.waited_seconds += time.monotonic() - started
+
+    async def aacquire(self, tokens):
+        """Wie acquire, aber ohne die Ereignisschleife zu blockieren."""
+        started = time.monotonic()
+        while True:
+            with self._condition:
+                wait = self._try_acquire(tokens)
+                if wait is None:
+                    self.waited_seconds += time.monotonic() - started
+                    return
+            await asyncio.sleep(min(wait, 0.05) if self.in_flight else wait)
+
+    def release(self):
+        with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    # -------------------------------------------------------------------------
+    # Rückmeldungen des Servers
+    # -------------------------------------------------------------------------
+    def observe(self, headers):
+        """Gleicht die Buckets mit den x-ratelimit-*-Headern einer Antwort ab."""
+        now = time.monotonic()
+        with self._condition:
+            self.requests.sync(
+                _int_header(headers, "x-ratelimit-limit-requests"),
+                _int_header(headers, "x-ratelimit-remaining-requests"),
+                now,
+            )
+            self.tokens.sync(
+                _int_header(headers, "x-ratelimit-limit-tokens"),
+                _int_header(headers, "x-ratelimit-remaining-tokens"),
+                now,
+            )
+
+    def on_success(self):
+        # Additive Vergrößerung: etwa +1 pro vollem Fenster erfolgreicher Antworten
+        with self._condition:
+            self.window = min(self.max_concurrency, self.window + 1.0 / self.window)
+            self._condition.notify_all()
+
+    def on_throttled(self, retry_after):
+        """
+        429: Fenster halbieren (höchstens einmal pro Sekunde, damit eine Welle
+        gleichzeitiger 429 es nicht auf 1 zusammenfallen lässt) und alle
+        Anfragen bis zum Ablauf von Retry-After anhalten.
+        """
+        now = time.monotonic()
+        with self._condition:
+            self.throttled += 1
+            if now - self._last_decrease >= 1.0:
+                self.window = max(1.0, self.window / 2)
+                self._last_decrease = now
+            if retry_after:
+                self._paused_until = max(self._paused_until, now + retry_after)
+
+    def on_quota_exhausted(self):
+        """429 mit insufficient_quota: nur zählen – kein Drosseln, keine Pause."""
+        with self._condition:
+            self.quota_errors += 1
+
+    def backoff(self, attempt, retry_after):
+        """
+        Wartezeit vor Wiederholung 'attempt' (ab 0): die vom Server genannte
+        Zeit plus zufälliger Anteil des exponentiellen Backoffs ("full jitter").
+        """
+        jitter = random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+        with self._condition:
+            self.retries += 1
+        return (retry_after or 0.0) + jitter
+
+    # -------------------------------------------------------------------------
+    # Statistik
+    # -------------------------------------------------------------------------
+    def stats(self):
+        with self._condition:
+            return {
+                "window": self.window,
+                "in_flight": self.in_flight,
+                "throttled": self.throttled,
+                "quota_errors": self.quota_errors,
+                "retries": self.retries,
+                "waited_seconds": self.waited_seconds,
+                "rpm": self.requests.capacity,
+                "tpm": self.tokens.capacity,
+            }
+
+    def describe(self):
+        """Kurze, lesbare Zusammenfassung von stats() für die Oberflächen."""
+        stats = self.stats()
+        quota = f", {stats['quota_errors']}× Kontingent erschöpft" if stats["quota_errors"] else ""
+        return (
+            f"Rate-Limit: {stats['in_flight']} laufend, Fenster {stats['window']:.1f}, "
+            f"{stats['throttled']}× 429{quota}, {stats['retries']} Wiederholungen, "
+            f"{stats['waited_seconds']:.1f} s gewartet "
+            f"(Grenzen {stats['rpm']:.0f} Anfragen / {stats['tpm']:.0f} Tokens pro Minute)"
+        )
+
+
+def _int_header(headers, name):
+    value = headers.get(name)
+    try:
+        return int(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+_shared_limiter = None
+_shared_lock = threading.Lock()
+
+
+def shared_limiter():
+    """
+    Der prozessweite RateLimiter (aus der Umgebung), oder None, wenn
+    SWARM_RATE_LIMIT=0 gesetzt ist. Alle Clients teilen ihn, auch nach einem
+    Schlüsselwechsel.
+    """
+    global _shared_limiter
+    if os.getenv("SWARM_RATE_LIMIT", "1") == "0":
+        return None
+    with _shared_lock:
+        if _shared_limiter is None:
+            _shared_limiter = RateLimiter.from_env()
+        return _shared_limiter
+
+
+# -----------------------------------------------------------------------------
+# httpx-Transporte
+# -----------------------------------------------------------------------------
+class _ReleasingStream(httpx.SyncByteStream):
+    # Gibt den Platz im Fenster frei, sobald der Antwort-Body gelesen oder
+    # geschlossen ist (bei gestreamten Antworten erst am Ende des Streams)
+    def __init__(self, stream, release):
+        self._stream = stream
+        self._release = release
+
+    def __iter__(self):
+        yield from self._stream
+
+    def close(self):
+        try:
+            self._stream.close()
+        finally:
+            self._release()
+
+
+class _AsyncReleasingStream(httpx.AsyncByteStream):
+    def __init__(self, stream, release):
+        self._stream = stream
+        self._release = release
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self):
+        try:
+            await self._stream.aclose()
+        finally:
+            self._release()
+
+
+def _once(function):
+    called = []
+
+    def wrapper():
+        if not called:
+            called.append(True)
+            function()
+    return wrapper
+
+
+def _request_tokens(limiter, request):
+    if request.method != "POST":
+        return 0
+    return estimate_tokens(request.content, limiter.completion_tokens)
+
+
+def _with_stream(response, stream, request):
+    return httpx.Response(
+        status_code=response.status_code,
+        headers=response.headers,
+        stream=stream,
+        extensions=response.extensions,
+        request=request,
+    )
+
+
+def _buffered(response, raw, request):
+    # Antwort mit bereits gelesenem (rohem) Body, damit der Client ihn
+    # trotzdem noch lesen kann
+    return _with_stream(response, httpx.ByteStream(raw), request)
+
+
+class RateLimitedTransport(httpx.BaseTransport):
+    """
+    Transport für httpx.Client: jede Anfrage geht durch den RateLimiter.
+    """
+
+    def __init__(self, transport, limiter):
+        self._transport = transport
+        self._limiter = limiter
+
+    def handle_request(self, request):
+        limiter = self._limiter
+        tokens = _request_tokens(limiter, request)
+        attempt = 0
+        while True:
+            limiter.acquire(tokens)
+            release = _once(limiter.release)
+            try:
+                response = self._transport.handle_request(request)
+            except httpx.TransportError:
+                release()
+                if attempt >= limiter.max_retries:
+                    raise
+                time.sleep(limiter.backoff(attempt, None))
+                attempt += 1
+                continue
+            limiter.observe(response.headers)
+            retry_after = retry_after_seconds(response.headers, response.status_code)
+            if response.status_code == 429:
+                # Fehler-Bodies sind klein: lesen, um insufficient_quota zu erkennen
+                try:
+                    raw = b"".join(response.stream)
+                finally:
+                    response.close()
+                response = _buffered(response, raw, request)
+                if is_quota_error(response.headers, raw):
+                    limiter.on_quota_exhausted()
+                    return _with_stream(response, _ReleasingStream(response.stream, release), request)
+                limiter.on_throttled(retry_after)
+            if response.status_code in RETRY_STATUSES and attempt < limiter.max_retries:
+                response.close()
+                release()
+                time.sleep(limiter.backoff(attempt, retry_after))
+                attempt += 1
+                continue
+            if response.status_code < 400:
+                limiter.on_success()
+            return _with_stream(response, _ReleasingStream(response.stream, release), request)
+
+    def close(self):
+        self._transport.close()
+
+
+class AsyncRateLimitedTransport(httpx.AsyncBaseTransport):
+    """
+    Transport für httpx.AsyncClient: jede Anfrage geht durch den RateLimiter.
+    """
+
+    def __init__(self, transport, limiter):
+        self._transport = transport
+        self._limiter = limiter
+
+    async def handle_async_request(self, request):
+        limiter = self._limiter
+        tokens = _request_tokens(limiter, request)
+        attempt = 0
+        while True:
+            await limiter.aacquire(tokens)
+            release = _once(limiter.release)
+            try:
+                response = await self._transport.handle_async_request(request)
+            except httpx.TransportError:
+                release()
+                if attempt >= limiter.max_retries:
+                    raise
+                await asyncio.sleep(limiter.backoff(attempt, None))
+                attempt += 1
+                continue
+            limiter.observe(response.headers)
+            retry_after = retry_after_seconds(response.headers, response.status_code)
+            if response.status_code == 429:
+                try:
+                    raw = b"".join([chunk async for chunk in response.stream])
+                finally:
+                    await response.aclose()
+                response = _buffered(response, raw, request)
+                if is_quota_error(response.headers, raw):
+                    limiter.on_quota_exhausted()
+                    return _with_stream(response, _AsyncReleasingStream(response.stream, release), request)
+                limiter.on_throttled(retry_after)
+            if response.status_code in RETRY_STATUSES and attempt < limiter.max_retries:
+                await response.aclose()
+                release()
+                await asyncio.sleep(limiter.backoff(attempt, retry_after))
+                attempt += 1
+                continue
+            if response.status_code < 400:
+                limiter.on_success()
+            return _with_stream(response, _AsyncReleasingStream(response.stream, release), request)
+
+    async def aclose(self):
+        await self._transport.aclose()
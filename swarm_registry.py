@@ -0,0 +1,203 @@
+"""
+================================================================================
+Deklarative Agenten-Registry (JSON/YAML)
+
+Bisher waren die 15 Rechts-Agenten, die 14 `transfer_to_agent_*`-Funktionen
+und Dirks lange Instruktionen in `ai_swarm_2.py` und `ai_swarm_gradio.py` von
+Hand kopiert – und mussten zueinander passen. Die Registry erzeugt alles aus
+einer einzigen Konfigurationsdatei (Standard: `swarm_agents.json`):
+
+ - die Fach-Agenten (Name, Instruktionen, Modell),
+ - ein Routing-Werkzeug `transfer_to_agent(agent)` mit einem Enum aller
+   Kürzel (swarm_tools.py) – bzw. mit single_routing_tool=False wie früher
+   je Fach-Agent eine Funktion `transfer_to_agent_<key>`,
+ - den Verteiler-Agenten (Agent Dirk) mit einer kompakten Agentenliste
+   "<key>: <area> (Schlüsselwort '...')". Mit den Einzelfunktionen stehen
+   dort wie bisher die Regeln "Wenn die Anfrage das Wort '...' enthält,
+   leite sie an ... weiter."
+
+Ein neuer Fach-Agent ist damit nur noch ein weiterer Eintrag in der Datei.
+
+Agenten werden erst gebaut, wenn sie zum ersten Mal gebraucht werden
+(Weiterleitung, Cache-Treffer, Tab-Auswahl) – auch Agent Dirk. Das Laden der
+Registry liest nur die Datei; selbst `swarm` wird erst beim ersten Agenten
+importiert. Die Startzeit bleibt so auch bei 50+ Fachgebieten gleich.
+
+Aufbau der Datei:
+    {
+      "model": "gpt-4",
+      "instructions_template": "Du bist spezialisiert auf {law} ...",
+      "dispatcher": {"name": "Agent Dirk", "introduction": "...", "closing": "..."},
+      "agents": [
+        {"key": "bgb", "name": "Agent BGB", "keyword": "BGB",
+         "area": "das Bürgerliche Gesetzbuch", "law": "das Bürgerliche Gesetzbuch (BGB)"}
+      ]
+    }
+Optional je Agent: "instructions" (statt der Vorlage) und "model".
+Dateien mit der Endung .yaml/.yml werden gelesen, falls PyYAML installiert ist.
+================================================================================
+"""
+
+import json
+import os
+import threading
+from collections.abc import Mapping
+
+from swarm_tools import ROUTING_TOOL_NAME, routing_function
+
+try:
+    import yaml
+except ImportError:  # optional: ohne PyYAML nur JSON
+    yaml = None
+
+# Registry-Datei, die neben diesem Modul liegt
+DEFAULT_REGISTRY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "swarm_agents.json")
+
+TRANSFER_PREFIX = "transfer_to_agent_"
+
+
+def _label(agent_name):
+    """'Agent BGB' -> 'BGB' (Bezeichnung in Dirks Agentenliste)."""
+    return agent_name[len("Agent "):] if agent_name.startswith("Agent ") else agent_name
+
+
+class AgentRegistry(Mapping):
+    """
+    Zuordnung Agentenname -> Agent, deren Fach-Agenten erst beim ersten
+    Zugriff erzeugt werden. Verhält sich wie ein (nur lesbares) Dictionary.
+    """
+
+    def __init__(self, config, single_routing_tool=True):
+        """
+        - config: bereits geladene Konfiguration (siehe Moduldokumentation)
+        - single_routing_tool: Dirk bekommt ein Enum-Werkzeug statt einer
+          Funktion je Fach-Agent
+        """
+        self.model = config.get("model", "gpt-4")
+        self._template = config.get("instructions_template", "")
+        self._dispatcher_config = config["dispatcher"]
+        self._specs = {spec["name"]: spec for spec in config["agents"]}
+        self._agents = {}
+        self._lock = threading.Lock()
+
+        self.dispatcher_name = self._dispatcher_config["name"]
+        self.single_routing_tool = single_routing_tool
+        self.transfer_functions = [self._transfer_function(spec) for spec in self._specs.values()]
+        self.routing_tool = routing_function(
+            [(spec["key"], spec["name"]) for spec in self._specs.values()], self.__getitem__
+        )
+        # Werkzeuge von Agent Dirk
+        self.routing_functions = [self.routing_tool] if single_routing_tool else self.transfer_functions
+
+    @classmethod
+    def load(cls, path=DEFAULT_REGISTRY_PATH, single_routing_tool=True):
+        """
+        Liest die Registry aus einer JSON- oder YAML-Datei.
+        """
+        with open(path, encoding="utf-8") as registry_file:
+            if path.endswith((".yaml", ".yml")):
+                if yaml is None:
+                    raise RuntimeError("Für YAML-Registries muss PyYAML installiert sein.")
+                config = yaml.safe_load(registry_file)
+            else:
+                config = json.load(registry_file)
+        return cls(config, single_routing_tool=single_routing_tool)
+
+    # -------------------------------------------------------------------------
+    # Erzeugte Bausteine
+    # -------------------------------------------------------------------------
+    def dispatcher_instructions(self):
+        """
+        Baut Dirks Instruktionen aus den Einträgen der Registry.
+        """
+        if self.single_routing_tool:
+            # Eine Zeile je Agent: Kürzel (= Enum-Wert), Gebiet, Schlüsselwort
+            parts = [self._dispatcher_config.get("introduction", ""), "\n"]
+            for spec in self._specs.values():
+                keyword = spec.get("keyword", _label(spec["name"]))
+                parts.append(f"- {spec['key']}: {spec['area']} (Schlüsselwort '{keyword}')\n")
+            parts.append(self._dispatcher_config.get("closing", ""))
+            parts.append(
+                f"Verwende dafür {ROUTING_TOOL_NAME} mit dem Kürzel; enthält die Anfrage "
+                "ein Schlüsselwort, leite sie an diesen Agenten weiter."
+            )
+            return "".join(parts)
+
+        parts = [self._dispatcher_config.get("introduction", "")]
+        for number, spec in enumerate(self._specs.values(), start=1):
+            parts.append(f"{number}. {_label(spec['name'])}: Er ist auf {spec['area']} spezialisiert. ")
+        parts.append(self._dispatcher_config.get("closing", ""))
+        for keyword, agent_name in self.keyword_rules().items():
+            parts.append(f"Wenn die Anfrage das Wort '{keyword}' enthält, leite sie an {agent_name} weiter. ")
+        return "".join(parts)
+
+    def keyword_rules(self):
+        """
+        Dictionary Schlüsselwort -> Agentenname (für swarm_router.KeywordRouter).
+        """
+        return {spec.get("keyword", _label(spec["name"])): spec["name"] for spec in self._specs.values()}
+
+    def _transfer_function(self, spec):
+        # Swarm beschreibt das Werkzeug über __name__ und __doc__ der Funktion
+        agent_name = spec["name"]
+
+        def transfer():
+            return self[agent_name]
+
+        transfer.__name__ = transfer.__qualname__ = TRANSFER_PREFIX + spec["key"]
+        transfer.__doc__ = f"Liefert das Agent-Objekt für {spec['law']} zurück."
+        return transfer
+
+    @property
+    def dispatcher(self):
+        """Der Verteiler-Agent (Agent Dirk), beim ersten Zugriff erzeugt."""
+        return self[self.dispatcher_name]
+
+    def _build(self, name):
+        # swarm erst hier importieren: das Laden der Registry bleibt billig
+        from swarm import Agent
+
+        if name == self.dispatcher_name:
+            return Agent(
+                name=name,
+                instructions=self.dispatcher_instructions(),
+                functions=self.routing_functions,
+                model=self._dispatcher_config.get("model", self.model),
+            )
+        spec = self._specs[name]
+        instructions = spec.get("instructions") or self._template.format(**spec)
+        return Agent(name=name, instructions=instructions, model=spec.get("model", self.model))
+
+    # -------------------------------------------------------------------------
+    # Mapping-Schnittstelle
+    # -------------------------------------------------------------------------
+    def names(self):
+        """Alle Agentennamen in Registry-Reihenfolge, Verteiler zuerst."""
+        return [self.dispatcher_name, *self._specs]
+
+    def built(self):
+        """Namen der Agenten, die bereits erzeugt wurden."""
+        with self._lock:
+            return list(self._agents)
+
+    def __getitem__(self, name):
+        agent = self._agents.get(name)
+        if agent is not None:
+            return agent
+        if name not in self:
+            raise KeyError(name)
+        with self._lock:
+            agent = self._agents.get(name)
+            if agent is None:
+                agent = self._agents[name] = self._build(name)
+            return agent
+
+    def __contains__(self, name):
+        # Ohne diese Methode würde Mapping den Agenten zum Prüfen erzeugen
+        return name == self.dispatcher_name or name in self._specs
+
+    def __iter__(self):
+        return iter(self.names())
+
+    def __len__(self):
+        return len(self._specs) + 1
@@ -0,0 +1,210 @@
+"""
+================================================================================
+Deterministischer Schlüsselwort-Router vor "Agent Dirk"
+
+Agent Dirk enthält in seinen Instruktionen feste Regeln der Form
+    "Wenn die Anfrage das Wort 'BGB' enthält, leite sie an Agent BGB weiter."
+Bisher ging jede Anfrage zuerst an GPT-4, nur damit das Modell diese Wörter
+findet und den passenden `transfer_to_agent_*`-Aufruf auslöst.
+
+Dieses Modul liest genau diese Regeln aus Dirks Instruktionen aus und baut
+daraus einen Aho-Corasick-Automaten. Damit werden alle Schlüsselwörter in
+einem einzigen Durchlauf über die Nutzereingabe gefunden – unabhängig davon,
+wie viele Regeln es gibt.
+
+Entscheidungsregel:
+ - Genau EIN Fach-Agent erkannt  -> Anfrage geht direkt an diesen Agenten,
+                                    der Routing-Aufruf an GPT-4 entfällt.
+ - Kein oder mehrere Fach-Agenten -> Agent Dirk bleibt zuständig (Fallback).
+
+Die Regeln werden nicht doppelt gepflegt: Quelle ist entweder der Text in
+`agent_dirk.instructions` (Ziel-Agenten aus den `transfer_to_agent_*`-
+Funktionen in `agent_dirk.functions`) oder direkt die Agenten-Registry
+(swarm_registry.py), aus der auch Dirks Instruktionen erzeugt werden. Mit der
+Registry wird ein Fach-Agent erst gebaut, wenn der Router ihn auswählt.
+================================================================================
+"""
+
+import re
+from collections import deque
+
+# Erkennt die Routing-Regeln in Dirks Instruktionen, z. B.
+# "Wenn die Anfrage das Wort 'HGB' enthält, leite sie an Agent HGB weiter."
+_RULE_PATTERN = re.compile(
+    r"Wenn die Anfrage das Wort '([^']+)' enthält, leite sie an (Agent [^.]+?) weiter\."
+)
+
+# Kompakte Agentenliste für das Enum-Werkzeug (swarm_registry.py), z. B.
+# "- hgb: das Handelsgesetzbuch (Schlüsselwort 'HGB')"
+_COMPACT_RULE_PATTERN = re.compile(r"^- (\S+): .*\(Schlüsselwort '([^']+)'\)$", re.MULTILINE)
+
+
+def _normalize(text):
+    """
+    Vereinheitlicht Leerraum und Groß-/Kleinschreibung, damit z. B.
+    "bgb" und "Gesetz  über   Ordnungswidrigkeiten" ebenfalls erkannt werden.
+    """
+    return " ".join(text.split()).lower()
+
+
+def _is_abbreviation(keyword):
+    """
+    Kürzel wie "BGB", "HGB" oder "StGB" (Großbuchstaben nach dem ersten
+    Zeichen) dürfen nur als eigenständiges Wort zählen. Ausgeschriebene
+    Begriffe wie "Baurecht" dürfen dagegen Teil eines Kompositums sein
+    ("Baurechtsfrage").
+    """
+    return any(char.isupper() for char in keyword[1:])
+
+
+class AhoCorasick:
+    """
+    Klassischer Aho-Corasick-Automat für die gleichzeitige Suche nach vielen
+    Mustern. Jedes Muster trägt einen beliebigen Wert (hier: den Ziel-Agenten).
+    """
+
+    def __init__(self, patterns):
+        # Zustandstabellen: Übergänge, Fehler-Links und Ausgaben je Zustand.
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]
+        for pattern, value in patterns:
+            self._add(pattern, value)
+        self._build_failure_links()
+
+    def _add(self, pattern, value):
+        state = 0
+        for char in pattern:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+                self._goto[state][char] = next_state
+            state = next_state
+        self._output[state].append((len(pattern), value))
+
+    def _build_failure_links(self):
+        # Breitensuche: Fehler-Links zeigen auf das längste echte Suffix,
+        # das zugleich Präfix eines Musters ist.
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[next_state] = self._goto[fallback].get(char, 0)
+                if self._fail[next_state] == next_state:
+                    self._fail[next_state] = 0
+                self._output[next_state].extend(self._output[self._fail[next_state]])
+
+    def iter_matches(self, text):
+        """
+        Liefert für jeden Treffer ein Tupel (start, ende, wert).
+        'ende' ist exklusiv, wie bei Slices.
+        """
+        state = 0
+        for index, char in enumerate(text):
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            for length, value in self._output[state]:
+                yield index + 1 - length, index + 1, value
+
+
+class KeywordRouter:
+    """
+    Lokaler Vorab-Router: Wählt anhand der Schlüsselwörter aus Dirks Regeln
+    den Fach-Agenten aus, ohne GPT-4 zu befragen.
+    """
+
+    def __init__(self, rules, fallback, resolve=None):
+        """
+        - rules: Dictionary Schlüsselwort -> Ziel-Agent (oder Agentenname,
+          wenn 'resolve' angegeben ist)
+        - fallback: Agent, der bei keinem oder mehrdeutigen Treffern antwortet
+          (bzw. sein Name, wenn 'resolve' angegeben ist)
+        - resolve: optionale Funktion Agentenname -> Agent, die erst bei
+          Bedarf aufgerufen wird
+        """
+        self.fallback = fallback
+        self.rules = dict(rules)
+        self._resolve = resolve
+        self._automaton = AhoCorasick(
+            (_normalize(keyword), (keyword, target)) for keyword, target in self.rules.items()
+        )
+
+    @classmethod
+    def from_agent(cls, dispatcher):
+        """
+        Baut den Router direkt aus einem Verteiler-Agenten (Agent Dirk):
+        1) Alle `transfer_to_agent_*`-Funktionen aufrufen (bzw. die Ziele des
+           Enum-Werkzeugs abfragen), um die Ziel-Agenten zu kennen.
+        2) Die Regeln "Wenn die Anfrage das Wort '...' enthält ..." bzw. die
+           kompakte Agentenliste aus den Instruktionen lesen und auf diese
+           Agenten abbilden.
+        """
+        targets = {}
+        targets_by_key = {}
+        for transfer_function in dispatcher.functions:
+            # Das Enum-Werkzeug (swarm_tools.routing_function) nennt alle Ziele
+            candidates = getattr(transfer_function, "targets", None)
+            if candidates is not None:
+                targets_by_key.update(candidates())
+                continue
+            target = transfer_function()
+            targets[target.name] = target
+        for target in targets_by_key.values():
+            targets[target.name] = target
+
+        rules = {}
+        for keyword, agent_name in _RULE_PATTERN.findall(dispatcher.instructions):
+            if agent_name in targets:
+                rules[keyword] = targets[agent_name]
+        for key, keyword in _COMPACT_RULE_PATTERN.findall(dispatcher.instructions):
+            if key in targets_by_key:
+                rules[keyword] = targets_by_key[key]
+        return cls(rules, dispatcher)
+
+    @classmethod
+    def from_registry(cls, registry):
+        """
+        Baut den Router aus einer AgentRegistry (swarm_registry.py). Die
+        Ziel-Agenten werden erst bei einem Treffer aus der Registry geholt.
+        """
+        return cls(registry.keyword_rules(), registry.dispatcher_name, resolve=registry.__getitem__)
+
+    def _targets(self, text):
+        # Dictionary Agentenname -> Regelziel (Agent oder Name)
+        normalized = _normalize(text)
+        found = {}
+        for start, end, (keyword, target) in self._automaton.iter_matches(normalized):
+            if _is_abbreviation(keyword):
+                before = normalized[start - 1] if start > 0 else " "
+                after = normalized[end] if end < len(normalized) else " "
+                if before.isalnum() or after.isalnum():
+                    continue
+            found[target if self._resolve else target.name] = target
+        return found
+
+    def _agent(self, target):
+        return self._resolve(target) if self._resolve else target
+
+    def match(self, text):
+        """
+        Liefert alle erkannten Ziel-Agenten als Dictionary Name -> Agent.
+        """
+        return {name: self._agent(target) for name, target in self._targets(text).items()}
+
+    def route(self, text):
+        """
+        Gibt den eindeutig erkannten Fach-Agenten zurück, sonst den Fallback
+        (Agent Dirk).
+        """
+        found = self._targets(text)
+        if len(found) == 1:
+            return self._agent(next(iter(found.values())))
+        return self._agent(self.fallback)
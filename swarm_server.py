@@ -0,0 +1,362 @@
+"""
+================================================================================
+Swarm als Dienst: JSON-API mit Token-Streaming (SSE und WebSocket)
+
+Für die Einbindung in das Intranet-Portal läuft der Swarm hier ohne Fenster
+und ohne Gradio-Seite, mit denselben Agenten und demselben Routing wie
+ai_swarm_gradio.py (Registry, Schlüsselwort-Router, gelerntes Modell,
+Folgefragen beim zuletzt antwortenden Fach-Agenten, Antwort-Cache).
+
+Endpunkte:
+ - POST /v1/chat             {"message": "...", "session_id": optional,
+                              "agent": optional, "stream": false}
+                             -> {"session_id", "asked", "agent", "answer"}
+                             mit "stream": true als Server-Sent Events
+                             (start, delta, handoff, done, error)
+ - WS   /v1/ws               je JSON-Nachricht wie /v1/chat, Antwort als
+                             Folge von JSON-Ereignissen (wie bei SSE)
+ - GET  /v1/sessions/{id}    gespeicherter Verlauf der Sitzung
+ - POST /v1/sessions/{id}/reset  nächste Frage wieder über Agent Dirk
+ - GET  /v1/agents           Namen der Agenten
+ - GET  /health              Prozess läuft
+ - GET  /ready               Swarm-Client bereit (sonst 503)
+ - GET  /metrics             Messwerte im Prometheus-Format (swarm_metrics)
+
+Eine Sitzung entspricht einer Gesprächs-ID im Gesprächsspeicher
+(swarm_store): Nach einem Neustart wird sie beim ersten Zugriff aus dem
+Ende ihres gespeicherten Verlaufs wiederhergestellt. Nachrichten derselben
+Sitzung werden nacheinander bearbeitet, verschiedene Sitzungen parallel.
+
+Der Server läuft auf FastAPI/uvicorn (`pip install fastapi uvicorn`): Ein
+Prozess hält viele gleichzeitige Streams als Coroutinen, ohne Thread pro
+Anfrage.
+
+    python swarm_server.py --port 8000
+================================================================================
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import uuid
+from collections import OrderedDict
+
+from dotenv import load_dotenv
+from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+
+from swarm_cache import ResponseCache
+from swarm_classifier import LearnedRouter
+from swarm_history import HistoryManager, swarm_summarizer
+from swarm_metrics import shared_metrics
+from swarm_registry import DEFAULT_REGISTRY_PATH, AgentRegistry
+from swarm_router import KeywordRouter
+from swarm_startup import BackgroundClient, create_async_swarm_client
+from swarm_store import ConversationStore
+from swarm_streaming import async_stream_events
+from swarm_tracing import shared_tracer
+
+load_dotenv()
+
+# Nachrichten, mit denen eine Sitzung nach einem Neustart wiederhergestellt wird
+TRANSCRIPT_TAIL = 40
+
+
+class Session:
+    """
+    Zustand einer Sitzung: Verlauf (Token-Budget), zuständiger Agent und
+    eine Sperre, damit Nachrichten derselben Sitzung nacheinander laufen.
+    """
+
+    def __init__(self, session_id, history, agent_name):
+        self.session_id = session_id
+        self.history = history
+        self.agent_name = agent_name
+        self.lock = asyncio.Lock()
+
+
+class SwarmService:
+    """
+    Agenten, Routing und Sitzungen des Dienstes; `chat_events` beantwortet
+    eine Nachricht als Folge von Ereignissen (für SSE, WebSocket und JSON).
+    """
+
+    def __init__(self, max_sessions=1000, token_budget=6000, affinity=True):
+        self.registry = AgentRegistry.load(
+            os.getenv("SWARM_AGENTS_PATH", DEFAULT_REGISTRY_PATH),
+            single_routing_tool=os.getenv("SWARM_SINGLE_ROUTING_TOOL", "1") != "0",
+        )
+        self.keyword_router = KeywordRouter.from_registry(self.registry)
+        self.router = LearnedRouter.from_env(self.keyword_router, self.registry)
+        self.client = BackgroundClient(factory=create_async_swarm_client, name="swarm-async-client-init")
+        # Synchroner Client nur für die Zusammenfassungen im Hintergrund-Thread
+        self.summary_client = BackgroundClient()
+        self.cache = ResponseCache(
+            self.registry,
+            path=os.getenv("SWARM_CACHE_PATH", "swarm_cache.sqlite3"),
+            ttl=int(os.getenv("SWARM_CACHE_TTL", str(24 * 60 * 60))),
+        )
+        self.store = ConversationStore(os.getenv("SWARM_STORE_PATH", "swarm_conversations.sqlite3"))
+        self.metrics = shared_metrics()
+        self.tracer = shared_tracer()
+        self.max_sessions = max_sessions
+        self.token_budget = token_budget
+        self.affinity = affinity
+        self._sessions = OrderedDict()  # Sitzungs-ID -> Session (LRU)
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            max_sessions=int(os.getenv("SWARM_SERVER_SESSIONS", "1000")),
+            token_budget=int(os.getenv("SWARM_TOKEN_BUDGET", "6000")),
+            affinity=os.getenv("SWARM_AFFINITY", "1") != "0",
+        )
+
+    async def session(self, session_id=None):
+        """
+        Die Sitzung zu 'session_id' – im Arbeitsspeicher, sonst aus dem
+        Gesprächsspeicher wiederhergestellt. Ohne ID eine neue Sitzung.
+        """
+        session_id = session_id or uuid.uuid4().hex
+        session = self._sessions.get(session_id)
+        if session is None:
+            # SQLite im Thread, nicht auf der Ereignisschleife
+            stored = await asyncio.to_thread(self._stored_tail, session_id)
+            # Während des Lesens kann eine zweite Anfrage die Sitzung angelegt haben
+            session = self._sessions.get(session_id)
+        if session is not None:
+            self._sessions.move_to_end(session_id)
+            return session
+        history = HistoryManager(default_budget=self.token_budget, summarizer=swarm_summarizer(self.summary_client))
+        history.extend({"role": message.role, "content": message.content} for message in stored)
+        session = self._sessions[session_id] = Session(session_id, history, self.registry.dispatcher_name)
+        self._evict()
+        return session
+
+    async def reset(self, session_id):
+        """Die nächste Frage der Sitzung geht wieder an Agent Dirk."""
+        (await self.session(session_id)).agent_name = self.registry.dispatcher_name
+
+    def _stored_tail(self, session_id):
+        # Der Store schreibt gebündelt im Hintergrund: erst ausstehende Turns
+        # schreiben, damit eine verdrängte Sitzung vollständig zurückkommt
+        self.store.flush()
+        return self.store.tail(session_id, limit=TRANSCRIPT_TAIL)
+
+    def _evict(self):
+        # Älteste Sitzungen verdrängen, aber keine mit laufendem Turn – sonst
+        # bekäme die nächste Anfrage eine zweite Sitzung mit eigener Sperre
+        for session_id in list(self._sessions):
+            if len(self._sessions) <= self.max_sessions:
+                return
+            if not self._sessions[session_id].lock.locked():
+                del self._sessions[session_id]
+
+    def _route(self, session, text, agent_name):
+        # Wie send_message in ai_swarm_gradio.py: ausdrücklich gewählter
+        # Agent, sonst Folgefrage beim Fach-Agenten, sonst Vorab-Routing
+        if agent_name:
+            if agent_name not in self.registry:
+                raise KeyError(f"Unbekannter Agent '{agent_name}'")
+            return self.registry[agent_name]
+        if session.agent_name != self.registry.dispatcher_name:
+            agent = self.router.follow_up(text, session.agent_name)
+            if agent is not None:
+                return agent
+            session.agent_name = self.registry.dispatcher_name
+        return self.router.route(text)
+
+    async def chat_events(self, session, text, agent_name=None):
+        """
+        Beantwortet 'text' in der Sitzung und liefert Ereignisse als
+        Dictionaries: start, delta, handoff, done bzw. error.
+        """
+        async with session.lock:
+            with self.tracer.span("turn", session=session.session_id):
+                async for event in self._chat_events(session, text, agent_name):
+                    yield event
+
+    async def _chat_events(self, session, text, agent_name):
+        turn = self.metrics.turn()
+        try:
+            with turn.phase("routing"):
+                agent = self._route(session, text, agent_name)
+        except KeyError as e:
+            yield {"event": "error", "message": str(e.args[0])}
+            return
+        self.tracer.current().set(agent=agent.name)
+        session.history.append({"role": "user", "content": text})
+        yield {"event": "start", "session_id": session.session_id, "agent": agent.name}
+
+        active_name = agent.name
+        try:
+            swarm = await self.client.aget()
+            events = async_stream_events(swarm, agent, session.history.window(agent), cache=self.cache)
+            async for event in events:
+                if event.kind == "delta":
+                    turn.first_token(event.agent_name)
+                    yield {"event": "delta", "agent": event.agent_name, "text": event.text}
+                elif event.kind == "handoff":
+                    turn.handoff(active_name)
+                    active_name = event.agent_name
+                    yield {"event": "handoff", "agent": event.agent_name}
+                elif event.kind == "done":
+                    answered_by = event.response.agent.name
+                    answer = event.response.messages[-1]["content"]
+                    turn.finish(answered_by)
+                    self.tracer.current().set(answered_by=answered_by)
+                    self._record(session, agent.name, answered_by, text, answer)
+                    yield {"event": "done", "agent": answered_by, "answer": answer}
+        except Exception as e:
+            turn.finish(active_name, error=True)
+            yield {"event": "error", "message": f"{type(e).__name__}: {e}"}
+
+    def _record(self, session, asked_name, answered_by, text, answer):
+        session.history.append({"role": "assistant", "content": answer})
+        session.history.compact_in_background()
+        self.store.append(session.session_id, answered_by, "user", text)
+        self.store.append(session.session_id, answered_by, "assistant", answer)
+        self.router.observe(text, asked_name, answered_by)
+        if self.affinity and answered_by in self.registry:
+            session.agent_name = answered_by
+
+    def ready(self):
+        """(bereit, Grund) für /ready."""
+        if not self.client.ready:
+            return False, "Swarm-Client wird noch erzeugt"
+        try:
+            self.client.get(timeout=0)
+        except Exception as e:
+            return False, f"{type(e).__name__}: {e}"
+        return True, "ok"
+
+    def close(self):
+        self.store.close()
+
+
+def _sse(event):
+    return f"event: {event['event']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+
+def create_app(service=None):
+    """
+    Baut die FastAPI-Anwendung um einen SwarmService (Standard: aus den
+    Umgebungsvariablen).
+    """
+    service = service or SwarmService.from_env()
+
+    @contextlib.asynccontextmanager
+    async def lifespan(app):
+        yield
+        # Ausstehende Nachrichten in den Gesprächsspeicher schreiben
+        service.close()
+
+    app = FastAPI(title="Swarm-Chat", description="Agent Dirk und die Fach-Agenten als JSON-API", lifespan=lifespan)
+    app.state.service = service
+
+    @app.get("/health")
+    async def health():
+        return {"status": "ok"}
+
+    @app.get("/ready")
+    async def ready():
+        is_ready, reason = service.ready()
+        return JSONResponse({"status": "ready" if is_ready else "starting", "detail": reason},
+                            status_code=200 if is_ready else 503)
+
+    @app.get("/metrics")
+    async def metrics():
+        return PlainTextResponse(service.metrics.render(), media_type="text/plain; version=0.0.4")
+
+    @app.get("/v1/agents")
+    async def agents():
+        return {"dispatcher": service.registry.dispatcher_name, "agents": service.registry.names()}
+
+    @app.post("/v1/chat")
+    async def chat(body: dict):
+        text = (body.get("message") or "").strip()
+        if not text:
+            raise HTTPException(status_code=400, detail="'message' fehlt")
+        session = await service.session(body.get("session_id"))
+        # chat_events hält die Sperre der Sitzung: Der Generator wird beim
+        # Verlassen sofort geschlossen (aclosing), nicht erst vom Garbage
+        # Collector – sonst wartet die nächste Frage der Sitzung
+        if body.get("stream"):
+            async def sse_events():
+                async with contextlib.aclosing(service.chat_events(session, text, body.get("agent"))) as events:
+                    async for event in events:
+                        yield _sse(event)
+
+            return StreamingResponse(
+                sse_events(),
+                media_type="text/event-stream",
+                headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+            )
+        asked = None
+        async with contextlib.aclosing(service.chat_events(session, text, body.get("agent"))) as events:
+            async for event in events:
+                if event["event"] == "start":
+                    asked = event["agent"]
+                elif event["event"] == "done":
+                    return {"session_id": session.session_id, "asked": asked,
+                            "agent": event["agent"], "answer": event["answer"]}
+                elif event["event"] == "error":
+                    raise HTTPException(status_code=502, detail=event["message"])
+        raise HTTPException(status_code=502, detail="Keine Antwort erhalten")
+
+    @app.websocket("/v1/ws")
+    async def chat_socket(websocket: WebSocket):
+        await websocket.accept()
+        try:
+            while True:
+                body = await websocket.receive_json()
+                text = (body.get("message") or "").strip()
+                if not text:
+                    await websocket.send_json({"event": "error", "message": "'message' fehlt"})
+                    continue
+                session = await service.session(body.get("session_id"))
+                # Bei einem Abbruch der Verbindung gibt aclosing die Sperre der
+                # Sitzung sofort frei
+                async with contextlib.aclosing(service.chat_events(session, text, body.get("agent"))) as events:
+                    async for event in events:
+                        await websocket.send_json(event)
+        except WebSocketDisconnect:
+            pass
+
+    @app.get("/v1/sessions/{session_id}")
+    async def session_messages(session_id: str, limit: int = TRANSCRIPT_TAIL):
+        # Der Store schreibt im Hintergrund – den letzten Turn mitlesen
+        await asyncio.to_thread(service.store.flush)
+        stored = await asyncio.to_thread(service.store.tail, session_id, limit=limit)
+        return {
+            "session_id": session_id,
+            "messages": [
+                {"id": message.id, "role": message.role, "agent": message.agent_name,
+                 "content": message.content, "created_at": message.created_at}
+                for message in stored
+            ],
+        }
+
+    @app.post("/v1/sessions/{session_id}/reset")
+    async def reset_session(session_id: str):
+        await service.reset(session_id)
+        return {"session_id": session_id, "agent": service.registry.dispatcher_name}
+
+    return app
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Swarm-Chat als HTTP-/WebSocket-Dienst")
+    parser.add_argument("--host", default=os.getenv("SWARM_SERVER_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("SWARM_SERVER_PORT", "8000")))
+    args = parser.parse_args()
+
+    uvicorn.run(create_app(), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+"""
+================================================================================
+Zusammenlegen gleichzeitiger, identischer Anfragen ("single flight")
+
+In Schulungen schickt oft ein ganzer Raum innerhalb weniger Sekunden dieselbe
+Frage an denselben Agenten. Der ResponseCache hilft erst, wenn die erste
+Antwort fertig ist – bis dahin löst jede Anfrage einen eigenen `client.run`
+aus.
+
+SingleFlight legt solche Anfragen zusammen: Die erste Anfrage zu einem
+Schlüssel (Agent + normalisierte Nachrichten, siehe ResponseCache.key_for)
+führt den Aufruf aus; alle weiteren, die eintreffen, während er noch läuft,
+hängen sich an und bekommen dasselbe Ergebnis bzw. dieselbe Fehlermeldung.
+Danach beantwortet der Cache die Frage, sodass pro Frage nur ein Aufruf
+beim Backend ankommt.
+
+ - `do` / `ado`: einfacher Aufruf (synchron bzw. als Coroutine)
+ - `stream` / `astream`: gestreamte Antwort; wer sich später anhängt,
+   bekommt zuerst die bisherigen Ereignisse und danach die neuen
+
+Asynchrone Aufrufe laufen als eigener Task. Bricht der Browser des ersten
+Nutzers ab, läuft der Aufruf für die anderen weiter.
+================================================================================
+"""
+
+import asyncio
+import threading
+
+
+class _Flight:
+    # Ein laufender Aufruf mit seinen bisherigen Ereignissen (beim Streaming)
+    def __init__(self):
+        self.events = []
+        self.done = False
+        self.result = None
+        self.error = None
+        self.condition = threading.Condition()
+        # Task, der den Stream liest (astream). asyncio hält Tasks nur schwach
+        # fest – ohne diese Referenz könnte er mitten im Stream verschwinden.
+        self.task = None
+
+
+class SingleFlight:
+    """
+    Legt gleichzeitige Aufrufe mit demselben Schlüssel zu einem zusammen.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}     # Schlüssel -> _Flight (do)
+        self._streams = {}   # Schlüssel -> _Flight (stream)
+        self._tasks = {}     # Schlüssel -> asyncio.Task (ado)
+        self._astreams = {}  # Schlüssel -> (_Flight, asyncio.Condition) (astream)
+        self.leaders = 0
+        self.coalesced = 0
+
+    def _join(self, table, key, create):
+        # Liefert (Eintrag, True für den ersten Aufrufer)
+        with self._lock:
+            entry = table.get(key)
+            if entry is not None:
+                self.coalesced += 1
+                return entry, False
+            entry = table[key] = create()
+            self.leaders += 1
+            return entry, True
+
+    def _leave(self, table, key):
+        with self._lock:
+            table.pop(key, None)
+
+    # -------------------------------------------------------------------------
+    # Synchron
+    # -------------------------------------------------------------------------
+    def do(self, key, function):
+        """
+        Führt function() aus, sofern nicht schon ein Aufruf mit 'key' läuft;
+        sonst wird auf dessen Ergebnis gewartet.
+        """
+        flight, leader = self._join(self._calls, key, _Flight)
+        if not leader:
+            with flight.condition:
+                flight.condition.wait_for(lambda: flight.done)
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+        try:
+            flight.result = function()
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            self._leave(self._calls, key)
+            with flight.condition:
+                flight.done = True
+                flight.condition.notify_all()
+        return flight.result
+
+    def stream(self, key, events):
+        """
+        Generator: liefert die Ereignisse von events() – bei einem schon
+        laufenden Stream mit demselben Schlüssel dessen Ereignisse.
+        """
+        flight, leader = self._join(self._streams, key, _Flight)
+        if leader:
+            yield from self._lead_stream(key, flight, events)
+            return
+        index = 0
+        while True:
+            with flight.condition:
+                flight.condition.wait_for(lambda: len(flight.events) > index or flight.done)
+                new_events = flight.events[index:]
+                done, error = flight.done, flight.error
+            index += len(new_events)
+            yield from new_events
+            if done and index >= len(flight.events):
+                if error is not None:
+                    raise error
+                return
+
+    def _lead_stream(self, key, flight, events):
+        try:
+            for event in events():
+                with flight.condition:
+                    flight.events.append(event)
+                    flight.condition.notify_all()
+                yield event
+        except BaseException as e:
+            # Auch ein Abbruch durch den ersten Aufrufer (GeneratorExit) beendet
+            # den Stream für alle, die sich angehängt haben
+            flight.error = e if isinstance(e, Exception) else RuntimeError("Stream abgebrochen")
+            raise
+        finally:
+            self._leave(self._streams, key)
+            with flight.condition:
+                flight.done = True
+                flight.condition.notify_all()
+
+    # -------------------------------------------------------------------------
+    # Asynchron
+    # -------------------------------------------------------------------------
+    async def ado(self, key, coroutine_function):
+        """
+        Wie do, für eine Coroutine-Funktion. Der Aufruf läuft als Task und
+        wird nicht abgebrochen, wenn einzelne Wartende abbrechen.
+        """
+        def start():
+            task = asyncio.ensure_future(coroutine_function())
+            task.add_done_callback(lambda _: self._leave(self._tasks, key))
+            return task
+
+        task, _ = self._join(self._tasks, key, start)
+        return await asyncio.shield(task)
+
+    async def astream(self, key, events):
+        """
+        Wie stream, für einen asynchronen Generator events(). Ein eigener
+        Task liest den Stream; alle Aufrufer (auch der erste) folgen ihm.
+        """
+        def start():
+            flight, condition = _Flight(), asyncio.Condition()
+            flight.task = asyncio.ensure_future(self._produce(key, flight, condition, events))
+            flight.task.add_done_callback(lambda _: setattr(flight, "task", None))
+            return flight, condition
+
+        (flight, condition), _ = self._join(self._astreams, key, start)
+        index = 0
+        while True:
+            async with condition:
+                await condition.wait_for(lambda: len(flight.events) > index or flight.done)
+                new_events = flight.events[index:]
+                done = flight.done
+            index += len(new_events)
+            for event in new_events:
+                yield event
+            if done and index >= len(flight.events):
+                if flight.error is not None:
+                    raise flight.error
+                return
+
+    async def _produce(self, key, flight, condition, events):
+        try:
+            async for event in events():
+                async with condition:
+                    flight.events.append(event)
+                    condition.notify_all()
+        except BaseException as e:
+            # Auch ein abgebrochener Task (Herunterfahren) endet für alle
+            # Folgenden mit einem Fehler statt wie ein vollständiger Stream
+            flight.error = e if isinstance(e, Exception) else RuntimeError("Stream abgebrochen")
+            if not isinstance(e, Exception):
+                raise
+        finally:
+            self._leave(self._astreams, key)
+            async with condition:
+                flight.done = True
+                condition.notify_all()
+
+    # -------------------------------------------------------------------------
+    # Statistik
+    # -------------------------------------------------------------------------
+    def stats(self):
+        with self._lock:
+            total = self.leaders + self.coalesced
+            return {
+                "leaders": self.leaders,
+                "coalesced": self.coalesced,
+                "coalesced_rate": self.coalesced / total if total else 0.0,
+                "in_flight": len(self._calls) + len(self._streams) + len(self._tasks) + len(self._astreams),
+            }
+
+    def describe(self):
+        """Kurze, lesbare Zusammenfassung von stats() für die Oberflächen."""
+        stats = self.stats()
+        return (
+            f"Zusammengelegt: {stats['coalesced']} von {stats['leaders'] + stats['coalesced']} "
+            f"Anfragen ({stats['coalesced_rate']:.0%}) an laufende Aufrufe angehängt"
+        )
@@ -0,0 +1,192 @@
+"""
+================================================================================
+Schneller Kaltstart: Swarm-Client im Hintergrund erzeugen
+
+`from swarm import Swarm` zieht das komplette openai-Paket (httpx, pydantic,
+...) nach sich und kostet beim Start spürbar Zeit – obwohl der Client erst
+gebraucht wird, wenn die erste Frage abgeschickt ist. Der BackgroundClient
+startet Import und Erzeugung des Clients in einem eigenen Thread, während
+das Fenster bzw. die Gradio-Oberfläche schon aufgebaut wird.
+
+Der BackgroundClient bietet dieselbe Methode `run(...)` wie der Swarm-Client
+und kann überall an dessen Stelle übergeben werden (ResponseCache.run,
+stream_events, swarm_summarizer). Ist der Client noch nicht fertig, wartet
+der Aufruf – in den Frontends geschieht das immer in einem Worker-Thread.
+
+Für den asynchronen Client (create_async_swarm_client) wartet man in einer
+Coroutine mit `await background_client.aget()`, ohne die Ereignisschleife
+zu blockieren.
+
+Verbindungs-Pool und Schlüsselwechsel:
+ - Beide Fabriken bauen den OpenAI-Client auf einem ausdrücklich
+   konfigurierten httpx-Client mit Keep-Alive auf, damit aufeinanderfolgende
+   Anfragen bestehende TLS-Verbindungen wiederverwenden (Grenzen über
+   SWARM_HTTP_MAX_CONNECTIONS, SWARM_HTTP_MAX_KEEPALIVE,
+   SWARM_HTTP_KEEPALIVE_EXPIRY, SWARM_HTTP_TIMEOUT). Mit SWARM_HTTP_PREWARM=1
+   wird die erste Verbindung schon beim Start aufgebaut.
+ - Unter beiden liegt der gemeinsame RateLimiter (swarm_ratelimit.py); er
+   übernimmt auch die Wiederholungen nach 429, daher max_retries=0.
+ - `rotate(api_key)` erzeugt einen neuen Client mit dem neuen Schlüssel und
+   tauscht ihn atomar aus. Laufende Anfragen halten den alten Client und
+   beenden ihre Arbeit darauf; sein Verbindungs-Pool wird geschlossen, sobald
+   ihn keine Anfrage mehr verwendet.
+================================================================================
+"""
+
+import asyncio
+import os
+import threading
+import weakref
+
+
+def http_settings():
+    """
+    Pool-Grenzen und Timeout für die httpx-Clients (aus der Umgebung).
+    """
+    import httpx
+
+    limits = httpx.Limits(
+        max_connections=int(os.getenv("SWARM_HTTP_MAX_CONNECTIONS", "100")),
+        max_keepalive_connections=int(os.getenv("SWARM_HTTP_MAX_KEEPALIVE", "20")),
+        keepalive_expiry=float(os.getenv("SWARM_HTTP_KEEPALIVE_EXPIRY", "60")),
+    )
+    timeout = httpx.Timeout(float(os.getenv("SWARM_HTTP_TIMEOUT", "120")), connect=10.0)
+    return limits, timeout
+
+
+def _prewarm(openai_client):
+    # Baut die erste TLS-Verbindung auf, bevor die erste Frage kommt
+    try:
+        openai_client.models.list()
+    except Exception:
+        pass
+
+
+def create_swarm_client(api_key=None):
+    """
+    Standard-Fabrik: importiert openai und swarm erst hier und erzeugt den
+    Swarm-Client auf einem gepoolten httpx-Client. Ohne 'api_key' gilt
+    OPENAI_API_KEY.
+    """
+    import httpx
+    import openai
+
+    from swarm_tools import cached_tools_swarm_class
+
+    api_key = api_key or os.getenv("OPENAI_API_KEY")
+    openai.api_key = api_key
+    from swarm_ratelimit import RateLimitedTransport, shared_limiter
+
+    limits, timeout = http_settings()
+    transport = httpx.HTTPTransport(limits=limits)
+    limiter = shared_limiter()
+    if limiter is not None:
+        transport = RateLimitedTransport(transport, limiter)
+    http_client = httpx.Client(transport=transport, timeout=timeout)
+    openai_client = openai.OpenAI(
+        api_key=api_key, http_client=http_client, max_retries=0 if limiter else openai.DEFAULT_MAX_RETRIES
+    )
+    # Swarm mit zwischengespeicherten Tool-Schemas (swarm_tools.py)
+    swarm = cached_tools_swarm_class()(client=openai_client)
+    # Der Verbindungs-Pool wird geschlossen, sobald niemand den Client mehr hält
+    weakref.finalize(swarm, http_client.close)
+    if os.getenv("SWARM_HTTP_PREWARM", "0") == "1":
+        threading.Thread(target=_prewarm, args=(openai_client,), daemon=True).start()
+    return swarm
+
+
+def create_async_swarm_client(api_key=None):
+    """
+    Fabrik für den AsyncSwarm (swarm_async.py) auf einem gepoolten
+    httpx.AsyncClient.
+    """
+    import httpx
+    import openai
+    from swarm_async import AsyncSwarm
+
+    api_key = api_key or os.getenv("OPENAI_API_KEY")
+    from swarm_ratelimit import AsyncRateLimitedTransport, shared_limiter
+
+    limits, timeout = http_settings()
+    transport = httpx.AsyncHTTPTransport(limits=limits)
+    limiter = shared_limiter()
+    if limiter is not None:
+        transport = AsyncRateLimitedTransport(transport, limiter)
+    # Ein AsyncClient lässt sich nur in einer Ereignisschleife schließen; seine
+    # Verbindungen werden mit dem Objekt freigegeben
+    http_client = httpx.AsyncClient(transport=transport, timeout=timeout)
+    return AsyncSwarm(client=openai.AsyncOpenAI(
+        api_key=api_key, http_client=http_client, max_retries=0 if limiter else openai.DEFAULT_MAX_RETRIES
+    ))
+
+
+class BackgroundClient:
+    """
+    Platzhalter für den Swarm-Client, der im Hintergrund erzeugt wird.
+    """
+
+    def __init__(self, factory=create_swarm_client, name="swarm-client-init"):
+        """
+        - factory: Funktion factory(api_key=None), die den Client erzeugt
+        - name: Name des Hintergrund-Threads
+        """
+        self._factory = factory
+        self._client = None
+        self._error = None
+        self._generation = 0
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._create, name=name, daemon=True)
+        self._thread.start()
+
+    def _create(self):
+        client, error = None, None
+        try:
+            client = self._factory()
+        except Exception as e:
+            error = e
+        with self._lock:
+            # Wurde inzwischen rotiert, gilt der neuere Client
+            if self._generation == 0:
+                self._client, self._error = client, error
+            self._ready.set()
+
+    def rotate(self, api_key):
+        """
+        Erzeugt einen neuen Client mit 'api_key' und tauscht ihn atomar aus.
+        Anfragen, die den alten Client schon verwenden, laufen darauf zu Ende.
+        """
+        client = self._factory(api_key=api_key)
+        with self._lock:
+            self._generation += 1
+            self._client, self._error = client, None
+            self._ready.set()
+
+    @property
+    def ready(self):
+        """True, sobald der Client erzeugt wurde (oder die Erzeugung fehlschlug)."""
+        return self._ready.is_set()
+
+    def get(self, timeout=None):
+        """
+        Liefert den fertigen Swarm-Client und wartet bei Bedarf auf ihn.
+        Ist die Erzeugung fehlgeschlagen, wird der Fehler hier ausgelöst.
+        """
+        if not self._ready.wait(timeout):
+            raise TimeoutError("Der Swarm-Client ist noch nicht bereit.")
+        with self._lock:
+            if self._error is not None:
+                raise self._error
+            return self._client
+
+    async def aget(self):
+        """
+        Wie get, wartet aber in einer Coroutine, ohne die Ereignisschleife
+        zu blockieren.
+        """
+        if not self._ready.is_set():
+            await asyncio.get_running_loop().run_in_executor(None, self._ready.wait)
+        return self.get()
+
+    def run(self, *args, **kwargs):
+        return self.get().run(*args, **kwargs)
@@ -0,0 +1,138 @@
+"""
+================================================================================
+Reproduzierbarer Startzeit-Benchmark für die Swarm-Frontends
+
+Startet das Frontend mehrfach in jeweils einem frischen Python-Prozess (kalter
+Import-Cache des Interpreters, Betriebssystem-Cache bleibt warm) und misst:
+ - "ui":     Import des Moduls bis zur fertig aufgebauten Oberfläche
+             (Tk: erstes gezeichnetes Fenster; Gradio: fertige Blocks)
+ - "client": bis der Swarm-Client im Hintergrund bereit ist
+ - "total":  Laufzeit des ganzen Prozesses inkl. Interpreterstart
+
+Verwendung:
+    python swarm_startup_benchmark.py --frontend tk --runs 10
+    python swarm_startup_benchmark.py --frontend gradio --importtime
+
+Mit --importtime wird ein zusätzlicher Lauf mit `python -X importtime`
+ausgewertet und die teuersten Importe angezeigt.
+
+Cache und Gesprächsspeicher liegen während der Messung in einem temporären
+Verzeichnis; die echten Daten bleiben unberührt. Der Tk-Pfad braucht ein
+Display (auf Servern z. B. `xvfb-run python swarm_startup_benchmark.py`).
+================================================================================
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# Wird im Kindprozess ausgeführt; gibt die Messwerte als JSON aus
+_PROBES = {
+    "tk": (
+        "import json, time\n"
+        "started = time.perf_counter()\n"
+        "import ai_swarm_2 as app\n"
+        "app.root.update()\n"
+        "ui = time.perf_counter() - started\n"
+        "app.client.get()\n"
+        "client = time.perf_counter() - started\n"
+        "print(json.dumps({'ui': ui, 'client': client}))\n"
+        "app.worker_pool.shutdown()\n"
+        "app.conversation_store.close()\n"
+        "app.root.destroy()\n"
+    ),
+    "gradio": (
+        "import json, time\n"
+        "started = time.perf_counter()\n"
+        "import ai_swarm_gradio as app\n"
+        "ui = time.perf_counter() - started\n"
+        "app.async_client.get()\n"
+        "app.client.get()\n"
+        "client = time.perf_counter() - started\n"
+        "print(json.dumps({'ui': ui, 'client': client}))\n"
+        "app.conversation_store.close()\n"
+    ),
+}
+
+
+def child_environment(workdir):
+    environment = dict(os.environ)
+    environment.setdefault("OPENAI_API_KEY", "benchmark")
+    environment["SWARM_CACHE_PATH"] = os.path.join(workdir, "cache.sqlite3")
+    environment["SWARM_STORE_PATH"] = os.path.join(workdir, "conversations.sqlite3")
+    return environment
+
+
+def run_once(frontend, environment, extra_args=()):
+    started = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, *extra_args, "-c", _PROBES[frontend]],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=environment,
+        capture_output=True,
+        text=True,
+    )
+    total = time.perf_counter() - started
+    if completed.returncode != 0:
+        raise RuntimeError(completed.stderr.strip().splitlines()[-1] if completed.stderr else "Fehler im Kindprozess")
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    result["total"] = total
+    return result, completed.stderr
+
+
+def slowest_imports(importtime_output, count):
+    """
+    Wertet die Ausgabe von -X importtime aus: (kumulative µs, Modul).
+    """
+    rows = []
+    for line in importtime_output.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, module = line[len("import time:"):].split("|")
+        if cumulative.strip().isdigit():
+            rows.append((int(cumulative), module.strip()))
+    return sorted(rows, reverse=True)[:count]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Startzeit-Benchmark für die Swarm-Frontends")
+    parser.add_argument("--frontend", choices=sorted(_PROBES), default="tk")
+    parser.add_argument("--runs", type=int, default=5, help="Anzahl der Messläufe")
+    parser.add_argument("--warmup", type=int, default=1, help="Läufe ohne Wertung (Dateisystem-Cache)")
+    parser.add_argument("--importtime", action="store_true", help="teuerste Importe anzeigen")
+    parser.add_argument("--json", action="store_true", help="Ergebnis zusätzlich als JSON ausgeben")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="swarm_startup_") as workdir:
+        environment = child_environment(workdir)
+        for _ in range(args.warmup):
+            run_once(args.frontend, environment)
+        samples = [run_once(args.frontend, environment)[0] for _ in range(args.runs)]
+
+        summary = {}
+        print(f"Frontend: {args.frontend}, {args.runs} Läufe")
+        for name, label in (("ui", "Oberfläche bereit"), ("client", "Client bereit"), ("total", "Prozess gesamt")):
+            values = sorted(sample[name] for sample in samples)
+            summary[name] = {"min": values[0], "median": statistics.median(values), "max": values[-1]}
+            print(
+                f"{label}: min {values[0] * 1000:.0f} ms, "
+                f"Median {summary[name]['median'] * 1000:.0f} ms, max {values[-1] * 1000:.0f} ms"
+            )
+
+        if args.importtime:
+            _, stderr = run_once(args.frontend, environment, extra_args=("-X", "importtime"))
+            print("Teuerste Importe (kumulativ):")
+            for microseconds, module in slowest_imports(stderr, 15):
+                print(f"  {microseconds / 1000:8.1f} ms  {module}")
+
+    if args.json:
+        print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+"""
+================================================================================
+Dauerhafter Gesprächsspeicher (SQLite, nur Anhängen)
+
+Bisher lebte der gesamte Gesprächszustand in Python-Listen und Tk-Widgets –
+ein Neustart von `ai_swarm.py`, `ai_swarm_2.py` oder der Gradio-App löschte
+alles. Der ConversationStore legt jede Nutzer- und Agenten-Nachricht mit
+Agentenname, Zeitstempel und Token-Zahl in einer SQLite-Datei ab.
+
+Eigenschaften:
+ - Nur Anhängen: Nachrichten werden nie verändert oder gelöscht.
+ - WAL-Modus: Lesen (z. B. beim Nachladen älterer Nachrichten) blockiert das
+   Schreiben nicht und umgekehrt.
+ - Gebündeltes Schreiben: `append` legt die Nachricht nur in eine
+   Warteschlange. Ein Hintergrund-Thread schreibt sie gesammelt in einer
+   Transaktion – der UI-Thread wartet nie auf die Festplatte.
+ - Lazy Loading: `tail` liefert nur die neuesten Nachrichten (z. B. beim
+   Start je Agenten-Tab), `page_before` blättert bei Bedarf weiter zurück.
+ - `append` liefert eine PendingId, über die sich die ID der Nachricht
+   abfragen lässt, sobald sie geschrieben ist (z. B. um aus der Anzeige
+   verdrängte Nachrichten später wieder nachzuladen).
+================================================================================
+"""
+
+import queue
+import sqlite3
+import threading
+import time
+import traceback
+from collections import namedtuple
+
+from swarm_history import count_message_tokens
+
+StoredMessage = namedtuple(
+    "StoredMessage",
+    ["id", "conversation", "agent_name", "role", "content", "created_at", "tokens"],
+)
+
+_COLUMNS = "id, conversation, agent_name, role, content, created_at, tokens"
+
+# Markiert das Ende der Warteschlange beim Schließen
+_CLOSE = object()
+
+
+class PendingId:
+    """
+    ID einer eingereihten Nachricht, die erst nach dem Schreiben feststeht.
+    """
+
+    def __init__(self):
+        self.value = None
+        self._written = threading.Event()
+
+    @property
+    def done(self):
+        return self._written.is_set()
+
+    def get(self, timeout=None):
+        """
+        Wartet höchstens 'timeout' Sekunden auf das Schreiben und liefert die
+        ID (None, falls die Nachricht bis dahin nicht oder – nach einem
+        Fehler beim Schreiben – gar nicht geschrieben wurde).
+        """
+        self._written.wait(timeout)
+        return self.value
+
+    def _set(self, value):
+        self.value = value
+        self._written.set()
+
+
+class ConversationStore:
+    """
+    Append-only-Speicher für Gesprächsnachrichten mit gebündeltem
+    Schreiben im Hintergrund.
+    """
+
+    def __init__(self, path="swarm_conversations.sqlite3", flush_interval=0.2, batch_size=256):
+        """
+        - path: Pfad der SQLite-Datei
+        - flush_interval: spätestens nach so vielen Sekunden wird geschrieben
+        - batch_size: höchstens so viele Nachrichten pro Transaktion
+        """
+        self.path = path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._queue = queue.Queue()
+        self._read_lock = threading.Lock()
+
+        writer = self._connect()
+        writer.execute(
+            "CREATE TABLE IF NOT EXISTS messages ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " conversation TEXT NOT NULL,"
+            " agent_name TEXT NOT NULL,"
+            " role TEXT NOT NULL,"
+            " content TEXT NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " tokens INTEGER NOT NULL)"
+        )
+        writer.execute(
+            "CREATE INDEX IF NOT EXISTS messages_by_agent"
+            " ON messages (conversation, agent_name, id)"
+        )
+        writer.commit()
+        self._reader = self._connect()
+        self._writer_thread = threading.Thread(
+            target=self._write_loop, args=(writer,), name="swarm-store-writer", daemon=True
+        )
+        self._writer_thread.start()
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    # -------------------------------------------------------------------------
+    # Schreiben
+    # -------------------------------------------------------------------------
+    def append(self, conversation, agent_name, role, content):
+        """
+        Reiht eine Nachricht zum Speichern ein und kehrt sofort zurück.
+        Liefert eine PendingId, die nach dem Schreiben die ID enthält.
+        """
+        pending = PendingId()
+        self._queue.put((conversation, agent_name, role, content or "", time.time(), pending))
+        return pending
+
+    def flush(self):
+        """
+        Wartet, bis alle bisher eingereihten Nachrichten geschrieben sind.
+        """
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait()
+
+    def close(self):
+        """
+        Schreibt ausstehende Nachrichten und beendet den Schreib-Thread.
+        """
+        self._queue.put(_CLOSE)
+        self._writer_thread.join()
+        self._reader.close()
+
+    def _write_loop(self, connection):
+        while True:
+            item = self._queue.get()
+            batch = []
+            waiters = []
+            closing = False
+            deadline = time.monotonic() + self.flush_interval
+            # Weitere Nachrichten einsammeln, bis das Intervall abgelaufen
+            # oder der Stapel voll ist
+            while True:
+                if item is _CLOSE:
+                    closing = True
+                    break
+                if isinstance(item, threading.Event):
+                    waiters.append(item)
+                    break
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+
+            try:
+                if batch:
+                    self._write_batch(connection, batch)
+            except Exception:
+                # Ein Fehler (Platte voll, Datei gesperrt) kostet nur diesen
+                # Stapel – der Thread muss weiterlaufen, sonst gingen alle
+                # folgenden Nachrichten verloren und flush() wartete ewig
+                traceback.print_exc()
+                try:
+                    connection.rollback()
+                except sqlite3.Error:
+                    pass
+                for item in batch:
+                    item[-1]._set(None)
+            finally:
+                for waiter in waiters:
+                    waiter.set()
+            if closing:
+                connection.close()
+                return
+
+    def _write_batch(self, connection, batch):
+        rows = [
+            (conversation, agent_name, role, content, created_at,
+             count_message_tokens({"role": role, "content": content}))
+            for conversation, agent_name, role, content, created_at, _ in batch
+        ]
+        connection.executemany(
+            "INSERT INTO messages (conversation, agent_name, role, content, created_at, tokens)"
+            " VALUES (?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+        # Innerhalb einer Transaktion vergibt SQLite fortlaufende IDs
+        last_id = connection.execute("SELECT last_insert_rowid()").fetchone()[0]
+        connection.commit()
+        first_id = last_id - len(batch) + 1
+        for offset, item in enumerate(batch):
+            item[-1]._set(first_id + offset)
+
+    # -------------------------------------------------------------------------
+    # Lesen
+    # -------------------------------------------------------------------------
+    def tail(self, conversation, agent_name=None, limit=20):
+        """
+        Die neuesten 'limit' Nachrichten (älteste zuerst), optional nur für
+        einen Agenten.
+        """
+        return self.page_before(conversation, None, agent_name=agent_name, limit=limit)
+
+    def page_before(self, conversation, before_id, agent_name=None, limit=20):
+        """
+        Bis zu 'limit' Nachrichten, die vor der Nachricht 'before_id' liegen
+        (älteste zuerst). before_id=None bedeutet "ab der neuesten".
+        """
+        query = f"SELECT {_COLUMNS} FROM messages WHERE conversation = ?"
+        parameters = [conversation]
+        if agent_name is not None:
+            query += " AND agent_name = ?"
+            parameters.append(agent_name)
+        if before_id is not None:
+            query += " AND id < ?"
+            parameters.append(before_id)
+        query += " ORDER BY id DESC LIMIT ?"
+        parameters.append(limit)
+        with self._read_lock:
+            rows = self._reader.execute(query, parameters).fetchall()
+        return [StoredMessage(*row) for row in reversed(rows)]
@@ -0,0 +1,167 @@
+"""
+================================================================================
+Token-Streaming für die Swarm-Frontends
+
+`client.run(...)` blockiert, bis die komplette Antwort vorliegt. Bei langen
+BGB- oder StGB-Antworten sieht der Nutzer dadurch 20–40 Sekunden lang nichts.
+Swarm bietet mit `client.run(..., stream=True)` (intern `run_and_stream`)
+bereits einen Streaming-Pfad an, liefert dort aber rohe Chunks:
+ - {"delim": "start"} / {"delim": "end"} um jeden Modellaufruf herum,
+ - Deltas mit "content", beim ersten Delta eines Aufrufs auch "sender",
+ - ganz am Ende {"response": Response(...)}.
+
+Dieses Modul übersetzt diese Chunks in wenige, leicht verwendbare Ereignisse:
+ - "delta":   neues Textstück des aktuell antwortenden Agenten
+ - "handoff": ein anderer Agent hat mitten im Stream übernommen
+ - "done":    der Lauf ist beendet, das vollständige Response-Objekt liegt vor
+
+`async_stream_events` liefert dieselben Ereignisse für den AsyncSwarm
+(swarm_async.py), dessen Stream-Chunks das gleiche Format haben.
+
+Mit einem ResponseCache hängen sich gleichzeitige, identische Anfragen an
+einen bereits laufenden Stream an (cache.flights) und bekommen dieselben
+Ereignisse, statt einen eigenen Aufruf zu starten.
+
+Zusätzlich gibt es den `DeltaBatcher`, der viele kleine Deltas bündelt, damit
+ein GUI-Thread nicht für jedes einzelne Token aktualisiert werden muss.
+================================================================================
+"""
+
+import time
+from collections import namedtuple
+
+# kind: "delta" | "handoff" | "done"
+# agent_name: Agent, von dem das Ereignis stammt (bei "handoff": der neue Agent)
+# text: Textstück bei "delta", sonst ""
+# response: Swarm-Response bei "done", sonst None
+StreamEvent = namedtuple("StreamEvent", ["kind", "agent_name", "text", "response"])
+
+
+def stream_events(client, agent, messages, cache=None, **run_kwargs):
+    """
+    Startet einen Swarm-Lauf im Streaming-Modus und liefert StreamEvents.
+
+    Ein Handoff (z. B. Agent Dirk -> Agent BGB) wird daran erkannt, dass ein
+    neuer Modellaufruf mit einem anderen "sender" beginnt.
+
+    Mit einem ResponseCache (swarm_cache) wird zuerst dort nachgesehen: Ein
+    Treffer wird sofort als ein einziges Delta geliefert, ein neu erzeugtes
+    Ergebnis nach Abschluss im Cache abgelegt. Läuft dieselbe Anfrage schon,
+    werden deren Ereignisse geliefert.
+    """
+    if cache is not None:
+        cached = cache.get(agent, messages)
+        if cached is not None:
+            yield from _cached_events(agent, cached)
+            return
+
+    def events():
+        translator = _ChunkTranslator(agent)
+        for chunk in client.run(agent=agent, messages=messages, stream=True, **run_kwargs):
+            if cache is not None and "response" in chunk:
+                cache.put(agent, messages, chunk["response"])
+            yield from translator.events(chunk)
+
+    if cache is None or cache.flights is None or run_kwargs:
+        yield from events()
+        return
+    yield from cache.flights.stream(cache.key_for(agent, messages), events)
+
+
+async def async_stream_events(client, agent, messages, cache=None, **run_kwargs):
+    """
+    Wie stream_events, aber für einen AsyncSwarm-Client (asynchroner Generator).
+    """
+    if cache is not None:
+        cached = await cache.aget(agent, messages)
+        if cached is not None:
+            for event in _cached_events(agent, cached):
+                yield event
+            return
+
+    async def events():
+        translator = _ChunkTranslator(agent)
+        async for chunk in client.run(agent=agent, messages=messages, stream=True, **run_kwargs):
+            if cache is not None and "response" in chunk:
+                await cache.aput(agent, messages, chunk["response"])
+            for event in translator.events(chunk):
+                yield event
+
+    if cache is None or cache.flights is None or run_kwargs:
+        source = events()
+    else:
+        source = cache.flights.astream(cache.key_for(agent, messages), events)
+    async for event in source:
+        yield event
+
+
+def _cached_events(agent, cached):
+    # Ein Cache-Treffer wird als ein einziges Delta geliefert
+    if cached.agent.name != agent.name:
+        yield StreamEvent("handoff", cached.agent.name, "", None)
+    yield StreamEvent("delta", cached.agent.name, cached.messages[-1]["content"], None)
+    yield StreamEvent("done", cached.agent.name, "", cached)
+
+
+class _ChunkTranslator:
+    """
+    Übersetzt die Stream-Chunks eines Laufs in StreamEvents (gemeinsam für
+    den synchronen und den asynchronen Client).
+    """
+
+    def __init__(self, agent):
+        self.current_name = agent.name
+
+    def events(self, chunk):
+        if "response" in chunk:
+            response = chunk["response"]
+            return [StreamEvent("done", response.agent.name, "", response)]
+        if "delim" in chunk:
+            return []
+
+        events = []
+        sender = chunk.get("sender")
+        if sender and sender != self.current_name:
+            self.current_name = sender
+            events.append(StreamEvent("handoff", sender, "", None))
+
+        content = chunk.get("content")
+        if content:
+            events.append(StreamEvent("delta", self.current_name, content, None))
+        return events
+
+
+class DeltaBatcher:
+    """
+    Sammelt Text-Deltas und gibt sie gebündelt weiter – höchstens einmal pro
+    `interval` Sekunden und immer dann, wenn der Agent wechselt.
+
+    Gedacht für Worker-Threads, die ihre Ausgabe über `root.after(...)` an den
+    Tk-Hauptthread übergeben: statt hunderter Einzelaufrufe pro Antwort gibt
+    es nur noch wenige Aktualisierungen pro Sekunde.
+    """
+
+    def __init__(self, flush, interval=0.05):
+        """
+        - flush: Funktion flush(agent_name, text), die einen Block weitergibt
+        - interval: Mindestabstand zwischen zwei Weitergaben in Sekunden
+        """
+        self._flush = flush
+        self._interval = interval
+        self._parts = []
+        self._agent_name = None
+        self._last_flush = time.monotonic()
+
+    def add(self, agent_name, text):
+        if self._parts and agent_name != self._agent_name:
+            self.flush()
+        self._agent_name = agent_name
+        self._parts.append(text)
+        if time.monotonic() - self._last_flush >= self._interval:
+            self.flush()
+
+    def flush(self):
+        if self._parts:
+            self._flush(self._agent_name, "".join(self._parts))
+            self._parts = []
+        self._last_flush = time.monotonic()
@@ -0,0 +1,226 @@
+"""
+================================================================================
+Kompaktes Routing-Werkzeug und zwischengespeicherte Tool-Schemas
+
+Agent Dirk hatte 14 einzelne `transfer_to_agent_*`-Funktionen und eine lange
+Instruktion, die jede Schlüsselwort-Regel einzeln ausformuliert. Swarm baut
+bei jedem Modellaufruf aus allen Funktionen erneut JSON-Schemas
+(`function_to_json`) und schickt sie mit – Tokens und Rechenzeit pro
+Routing-Anfrage.
+
+Dieses Modul bietet:
+ - `routing_function(...)`: EIN Werkzeug `transfer_to_agent(agent)`, dessen
+   Parameter ein Enum aller Agentenkürzel ist (aus der Registry erzeugt).
+ - `tool_schemas(functions)`: Schemas werden pro Funktionsliste einmal
+   berechnet und danach wiederverwendet. Funktionen mit einem fertigen
+   Schema (Attribut `tool_schema`) werden nicht mehr analysiert.
+ - `CachedToolsMixin`: ersetzt `Swarm.get_chat_completion` durch eine Variante,
+   die diese zwischengespeicherten Schemas verwendet (für Swarm und AsyncSwarm).
+   Dabei wird jeder Modellaufruf samt Token-Verbrauch je Agent gemessen
+   (swarm_metrics) und – wie jede ausgeführte Funktion und Weiterleitung –
+   als Span aufgezeichnet (swarm_tracing).
+ - Messung: `python swarm_tools.py` vergleicht die Prompt-Tokens von Dirks
+   Routing-Anfrage mit Einzelfunktionen und mit dem Enum-Werkzeug.
+================================================================================
+"""
+
+import argparse
+import functools
+import json
+import os
+import time
+from collections import defaultdict
+
+from swarm_metrics import shared_metrics
+from swarm_tracing import shared_tracer
+
+# Name des Parameters, den Swarm vor dem Modell verbirgt (swarm.core)
+_CTX_VARS_NAME = "context_variables"
+
+ROUTING_TOOL_NAME = "transfer_to_agent"
+
+# Token-Verbrauch auch beim Streaming anfordern (letzter Chunk mit usage)
+STREAM_USAGE = os.getenv("SWARM_STREAM_USAGE", "1") != "0"
+
+# Funktionsliste (Tupel) -> Liste der Schemas
+_schema_cache = {}
+
+
+def tool_schema(function):
+    """
+    JSON-Schema eines Werkzeugs im Format der Chat-API. Vorgefertigte
+    Schemas (Attribut `tool_schema`) werden direkt verwendet, alle anderen
+    einmal mit swarm.util.function_to_json erzeugt; context_variables wird
+    wie bei Swarm ausgeblendet.
+    """
+    schema = getattr(function, "tool_schema", None)
+    if schema is not None:
+        return schema
+    from swarm.util import function_to_json
+
+    schema = function_to_json(function)
+    parameters = schema["function"]["parameters"]
+    parameters["properties"].pop(_CTX_VARS_NAME, None)
+    if _CTX_VARS_NAME in parameters["required"]:
+        parameters["required"].remove(_CTX_VARS_NAME)
+    return schema
+
+
+def tool_schemas(functions):
+    """
+    Schemas einer Funktionsliste, pro Liste nur einmal berechnet. Die
+    Ergebnisse werden nur gelesen (json-serialisiert), nie verändert.
+    """
+    key = tuple(functions)
+    schemas = _schema_cache.get(key)
+    if schemas is None:
+        schemas = _schema_cache[key] = [tool_schema(function) for function in key]
+    return schemas
+
+
+def routing_function(targets, resolve, name=ROUTING_TOOL_NAME):
+    """
+    Erzeugt das Routing-Werkzeug: transfer_to_agent(agent) mit einem Enum
+    der Kürzel.
+    - targets: Liste (Kürzel, Agentenname)
+    - resolve: Funktion Agentenname -> Agent (z. B. AgentRegistry.__getitem__)
+    """
+    names_by_key = dict(targets)
+
+    def transfer(agent):
+        agent_name = names_by_key.get(agent)
+        if agent_name is None:
+            # Als Werkzeug-Ergebnis an das Modell zurück, damit es korrigieren kann
+            return f"Unbekannter Agent '{agent}'. Erlaubt: {', '.join(names_by_key)}"
+        return resolve(agent_name)
+
+    transfer.__name__ = transfer.__qualname__ = name
+    transfer.__doc__ = "Leitet die Anfrage an den zuständigen Fach-Agenten weiter."
+    transfer.tool_schema = {
+        "type": "function",
+        "function": {
+            "name": name,
+            "description": transfer.__doc__,
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "agent": {"type": "string", "enum": list(names_by_key), "description": "Kürzel des Fach-Agenten"},
+                },
+                "required": ["agent"],
+            },
+        },
+    }
+    # Für swarm_router.KeywordRouter.from_agent: Kürzel -> Ziel-Agent
+    transfer.targets = lambda: {key: resolve(agent_name) for key, agent_name in names_by_key.items()}
+    return transfer
+
+
+class CachedToolsMixin:
+    """
+    Vor Swarm (bzw. AsyncSwarm) in die Basisklassen setzen: baut die
+    Anfrage wie Swarm.get_chat_completion, aber mit tool_schemas(). Dauer
+    und Tokens jedes Aufrufs gehen an shared_metrics(), Modellaufrufe und
+    Werkzeuge als Spans an shared_tracer().
+    """
+
+    def get_chat_completion(self, agent, history, context_variables, model_override, stream, debug):
+        from swarm.util import debug_print
+
+        context_variables = defaultdict(str, context_variables)
+        instructions = (
+            agent.instructions(context_variables) if callable(agent.instructions) else agent.instructions
+        )
+        messages = [{"role": "system", "content": instructions}] + history
+        debug_print(debug, "Getting chat completion for...:", messages)
+
+        tools = tool_schemas(agent.functions)
+        create_params = {
+            "model": model_override or agent.model,
+            "messages": messages,
+            "tools": tools or None,
+            "tool_choice": agent.tool_choice,
+            "stream": stream,
+        }
+        if tools:
+            create_params["parallel_tool_calls"] = agent.parallel_tool_calls
+        if stream and STREAM_USAGE:
+            create_params["stream_options"] = {"include_usage": True}
+        span = shared_tracer().start(
+            "completion", agent=agent.name, model=create_params["model"], stream=stream, tools=len(tools)
+        )
+        started = time.perf_counter()
+        try:
+            completion = self.client.chat.completions.create(**create_params)
+        except Exception as e:
+            span.end(e)
+            raise
+        return shared_metrics().track_completion(agent.name, completion, stream, started, span)
+
+    def handle_tool_calls(self, tool_calls, functions, context_variables, debug):
+        """
+        Wie Swarm.handle_tool_calls; wird aufgezeichnet, läuft jede Funktion
+        in einem eigenen Span ("tool"), eine Weiterleitung als "handoff".
+        """
+        tracer = shared_tracer()
+        if tracer.current().span_id is None:
+            return super().handle_tool_calls(tool_calls, functions, context_variables, debug)
+
+        response = None
+        for tool_call in tool_calls:
+            with tracer.span("tool", tool=tool_call.function.name) as span:
+                partial = super().handle_tool_calls([tool_call], functions, context_variables, debug)
+                if partial.agent is not None:
+                    span.set(handoff_to=partial.agent.name)
+                    tracer.start("handoff", to_agent=partial.agent.name).end()
+            if response is None:
+                response = partial
+            else:
+                response.messages.extend(partial.messages)
+                response.context_variables.update(partial.context_variables)
+                response.agent = partial.agent or response.agent
+        if response is None:
+            return super().handle_tool_calls(tool_calls, functions, context_variables, debug)
+        return response
+
+
+@functools.lru_cache(maxsize=None)
+def cached_tools_swarm_class():
+    """Swarm mit CachedToolsMixin (swarm erst hier importiert)."""
+    from swarm import Swarm
+
+    return type("CachedToolsSwarm", (CachedToolsMixin, Swarm), {})
+
+
+# -----------------------------------------------------------------------------
+# Messung
+# -----------------------------------------------------------------------------
+def routing_prompt_tokens(instructions, functions):
+    """
+    Tokens, die Dirks Routing-Anfrage ohne Nutzerverlauf kostet: System-
+    Instruktion plus serialisierte Werkzeug-Schemas.
+    """
+    from swarm_history import count_tokens
+
+    tools = json.dumps(tool_schemas(functions), ensure_ascii=False)
+    return count_tokens(instructions), count_tokens(tools)
+
+
+def main():
+    from swarm_registry import DEFAULT_REGISTRY_PATH, AgentRegistry
+
+    parser = argparse.ArgumentParser(description="Prompt-Tokens von Dirks Routing-Anfrage messen")
+    parser.add_argument("--registry", default=DEFAULT_REGISTRY_PATH)
+    args = parser.parse_args()
+
+    rows = []
+    for label, single_tool in (("Einzelfunktionen", False), ("Enum-Werkzeug", True)):
+        registry = AgentRegistry.load(args.registry, single_routing_tool=single_tool)
+        instructions, tools = routing_prompt_tokens(registry.dispatcher_instructions(), registry.routing_functions)
+        rows.append((label, instructions, tools))
+        print(f"{label:17} Instruktion {instructions:5d}  Werkzeuge {tools:5d}  gesamt {instructions + tools:5d}")
+    before, after = rows[0][1] + rows[0][2], rows[1][1] + rows[1][2]
+    print(f"Ersparnis pro Routing-Anfrage: {before - after} Tokens ({(before - after) / before:.0%})")
+
+
+if __name__ == "__main__":
+    main()
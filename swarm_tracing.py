@@ -0,0 +1,360 @@
+"""
+================================================================================
+Tracing der Swarm-Läufe mit Spans und lokalem JSONL-Export
+
+Springt eine Frage zwischen Agent Dirk und Fach-Agenten hin und her, bleibt
+von den Modell- und Werkzeugaufrufen innerhalb von `client.run` nichts
+übrig. Die Messwerte (swarm_metrics) zeigen Verteilungen, aber nicht, was in
+einem einzelnen langsamen Turn passiert ist.
+
+Dieses Modul zeichnet jeden Turn als Baum von Spans auf:
+ - "turn":       ein Turn im Frontend (Wurzel)
+ - "completion": ein Modellaufruf (Agent, Modell, Stream, Tokens)
+ - "tool":       eine ausgeführte Funktion, z. B. transfer_to_agent
+ - "handoff":    eine Weiterleitung an einen anderen Agenten
+ - "ui_update":  eine Aktualisierung der Tk-Oberfläche über root.after(...)
+
+Eltern-Kind-Beziehungen folgen dem aktuellen Span (contextvars): Im
+Worker-Thread und in asyncio-Tasks gehören alle Aufrufe innerhalb eines
+Turns zu dessen Trace.
+
+Abgetastet wird pro Trace (SWARM_TRACE_SAMPLE, Anteil 0.0–1.0, Standard 0 =
+aus). Nicht abgetastete Traces kosten nur einen Vergleich pro Span. Fertige
+Spans schreibt ein Hintergrund-Thread gebündelt als JSON-Zeilen nach
+SWARM_TRACE_PATH (Standard: swarm_traces.jsonl).
+
+Auswertung der langsamsten Traces:
+    python swarm_tracing.py --top 10
+================================================================================
+"""
+
+import argparse
+import atexit
+import contextvars
+import functools
+import inspect
+import json
+import os
+import queue
+import random
+import threading
+import time
+from collections import defaultdict
+
+DEFAULT_TRACE_PATH = "swarm_traces.jsonl"
+
+# Markiert das Ende der Warteschlange beim Schließen
+_CLOSE = object()
+
+# Span, zu dem neue Spans als Kinder gehören
+_current = contextvars.ContextVar("swarm_current_span", default=None)
+
+
+class Span:
+    """
+    Ein abgeschlossener Abschnitt eines Traces mit Attributen. Als
+    Kontextmanager wird er zum aktuellen Span, solange der Block läuft.
+    """
+
+    __slots__ = ("tracer", "name", "parent", "trace_id", "span_id", "parent_id", "attributes",
+                 "started", "wall_started", "error", "_token")
+
+    def __init__(self, tracer, name, parent, attributes):
+        self.tracer = tracer
+        self.name = name
+        self.parent = parent
+        self.trace_id = parent.trace_id if parent is not None else os.urandom(8).hex()
+        self.span_id = os.urandom(4).hex()
+        self.parent_id = parent.span_id if parent is not None else None
+        self.attributes = attributes
+        self.started = time.perf_counter()
+        self.wall_started = time.time()
+        self.error = None
+        self._token = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+        return self
+
+    def end(self, error=None):
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}"
+        self.tracer._export(self, time.perf_counter() - self.started)
+
+    def __enter__(self):
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        try:
+            _current.reset(self._token)
+        except ValueError:
+            # In einem anderen Kontext fortgesetzt (z. B. asynchroner Generator)
+            _current.set(self.parent)
+        self.end(exc if isinstance(exc, Exception) else None)
+        return False
+
+
+class _NoopSpan:
+    # Ersatz für nicht abgetastete Traces: tut nichts, kostet fast nichts
+    __slots__ = ()
+    trace_id = span_id = None
+
+    def set(self, **attributes):
+        return self
+
+    def end(self, error=None):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class _Unsampled(_NoopSpan):
+    # Wurzel eines nicht abgetasteten Traces: wird zum aktuellen Span, damit
+    # die Aufrufe darin nicht erneut (als eigene Traces) abgetastet werden
+    __slots__ = ("_token",)
+
+    def __enter__(self):
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        try:
+            _current.reset(self._token)
+        except ValueError:
+            _current.set(None)
+        return False
+
+
+class Tracer:
+    """
+    Erzeugt Spans und exportiert sie als JSON Lines.
+    """
+
+    def __init__(self, path=DEFAULT_TRACE_PATH, sample_rate=0.0, flush_interval=1.0):
+        """
+        - path: Zieldatei (JSON Lines, eine Zeile pro Span)
+        - sample_rate: Anteil der Traces, die aufgezeichnet werden
+        - flush_interval: höchstens so viele Sekunden bis zum Schreiben
+        """
+        self.path = path
+        self.sample_rate = sample_rate
+        self.flush_interval = flush_interval
+        self._queue = queue.SimpleQueue()
+        self._writer_thread = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            path=os.getenv("SWARM_TRACE_PATH", DEFAULT_TRACE_PATH),
+            sample_rate=float(os.getenv("SWARM_TRACE_SAMPLE", "0")),
+        )
+
+    def current(self):
+        """Der aktuelle Span (oder NOOP_SPAN)."""
+        return _current.get() or NOOP_SPAN
+
+    def start(self, name, parent=None, **attributes):
+        """
+        Beginnt einen Span, ohne ihn zum aktuellen zu machen (Ende mit
+        span.end()). Ohne 'parent' ist der aktuelle Span der Elternspan; gibt
+        es keinen, beginnt ein neuer Trace – sofern er abgetastet wird.
+        """
+        if parent is None:
+            parent = _current.get()
+            if parent is None:
+                if self.sample_rate <= 0:
+                    return NOOP_SPAN
+                if random.random() >= self.sample_rate:
+                    return _Unsampled()
+                return Span(self, name, None, attributes)
+        if parent.span_id is None:
+            return NOOP_SPAN  # innerhalb eines nicht abgetasteten Traces
+        return Span(self, name, parent, attributes)
+
+    def span(self, name, **attributes):
+        """Kontextmanager: Span als Kind des aktuellen (siehe start)."""
+        return self.start(name, **attributes)
+
+    def bind(self, span):
+        """
+        Kopie des aktuellen Kontexts, in der 'span' der aktuelle Span ist –
+        für Arbeit, die in einem anderen Thread weiterläuft
+        (tracer.bind(span).run(function, ...)). Der Span endet nicht mit dem
+        Kontext, sondern mit span.end().
+        """
+        context = contextvars.copy_context()
+        context.run(_current.set, span)
+        return context
+
+    def traced(self, name):
+        """
+        Dekorator: führt eine Funktion (auch asynchrone Generatoren) in einem
+        eigenen Span aus.
+        """
+        def decorate(function):
+            if inspect.isasyncgenfunction(function):
+                @functools.wraps(function)
+                async def wrapper(*args, **kwargs):
+                    with self.span(name, function=function.__name__):
+                        async for item in function(*args, **kwargs):
+                            yield item
+            else:
+                @functools.wraps(function)
+                def wrapper(*args, **kwargs):
+                    with self.span(name, function=function.__name__):
+                        return function(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    # -------------------------------------------------------------------------
+    # Export
+    # -------------------------------------------------------------------------
+    def _export(self, span, duration):
+        with self._lock:
+            if self._writer_thread is None:
+                self._writer_thread = threading.Thread(
+                    target=self._write_loop, name="swarm-trace-writer", daemon=True
+                )
+                self._writer_thread.start()
+                atexit.register(self.close)
+        record = {
+            "trace_id": span.trace_id,
+            "span_id": span.span_id,
+            "parent_id": span.parent_id,
+            "name": span.name,
+            "start": round(span.wall_started, 6),
+            "duration_ms": round(duration * 1000, 3),
+            "attributes": span.attributes,
+        }
+        if span.error is not None:
+            record["error"] = span.error
+        self._queue.put(record)
+
+    def close(self):
+        """Schreibt ausstehende Spans und beendet den Schreib-Thread."""
+        with self._lock:
+            thread, self._writer_thread = self._writer_thread, None
+        if thread is not None:
+            self._queue.put(_CLOSE)
+            thread.join(timeout=5)
+
+    def _write_loop(self):
+        while True:
+            item = self._queue.get()
+            batch = []
+            closing = False
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                if item is _CLOSE:
+                    closing = True
+                    break
+                batch.append(json.dumps(item, ensure_ascii=False, default=str))
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+            if batch:
+                with open(self.path, "a", encoding="utf-8") as trace_file:
+                    trace_file.write("\n".join(batch) + "\n")
+            if closing:
+                return
+
+
+# -----------------------------------------------------------------------------
+# Gemeinsame Instanz
+# -----------------------------------------------------------------------------
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def shared_tracer():
+    """Der Tracer dieses Prozesses (Einstellungen aus der Umgebung)."""
+    global _shared
+    if _shared is None:
+        with _shared_lock:
+            if _shared is None:
+                _shared = Tracer.from_env()
+    return _shared
+
+
+# -----------------------------------------------------------------------------
+# Auswertung
+# -----------------------------------------------------------------------------
+def load_traces(path):
+    """Spans aus einer JSONL-Datei, gruppiert nach Trace-ID."""
+    traces = defaultdict(list)
+    with open(path, encoding="utf-8") as trace_file:
+        for line in trace_file:
+            try:
+                span = json.loads(line)
+            except ValueError:
+                continue
+            traces[span["trace_id"]].append(span)
+    return traces
+
+
+def format_trace(spans):
+    """Span-Baum eines Traces als eingerückter Text."""
+    children = defaultdict(list)
+    ids = {span["span_id"] for span in spans}
+    for span in sorted(spans, key=lambda span: span["start"]):
+        parent = span["parent_id"] if span["parent_id"] in ids else None
+        children[parent].append(span)
+
+    lines = []
+
+    def walk(parent, depth):
+        for span in children[parent]:
+            attributes = ", ".join(f"{key}={value}" for key, value in span["attributes"].items())
+            error = f"  FEHLER {span['error']}" if "error" in span else ""
+            lines.append(f"{'  ' * depth}{span['duration_ms']:9.1f} ms  {span['name']}  {attributes}{error}")
+            walk(span["span_id"], depth + 1)
+
+    walk(None, 0)
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Langsamste Traces aus dem Span-Export anzeigen")
+    parser.add_argument("--path", default=os.getenv("SWARM_TRACE_PATH", DEFAULT_TRACE_PATH))
+    parser.add_argument("--top", type=int, default=5, help="Anzahl der Traces")
+    parser.add_argument("--name", default="turn", help="Name der Wurzel-Spans, nach denen sortiert wird")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.path):
+        print(f"{args.path} existiert nicht (SWARM_TRACE_SAMPLE gesetzt?).")
+        return
+    traces = load_traces(args.path)
+    roots = [
+        (span["duration_ms"], trace_id)
+        for trace_id, spans in traces.items()
+        for span in spans
+        if span["parent_id"] is None and span["name"] == args.name
+    ]
+    durations = sorted(duration for duration, _ in roots)
+    if not durations:
+        print(f"Keine Spans '{args.name}' in {args.path}.")
+        return
+    print(
+        f"{len(durations)} Traces, Median {durations[len(durations) // 2]:.0f} ms, "
+        f"p99 {durations[min(len(durations) - 1, int(len(durations) * 0.99))]:.0f} ms"
+    )
+    for duration, trace_id in sorted(roots, reverse=True)[:args.top]:
+        print(f"\nTrace {trace_id} ({duration:.0f} ms)")
+        print(format_trace(traces[trace_id]))
+
+
+if __name__ == "__main__":
+    main()
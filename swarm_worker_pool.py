@@ -0,0 +1,147 @@
+"""
+================================================================================
+Begrenzter Worker-Pool mit einer FIFO-Spur ("Lane") pro Agenten-Tab
+
+Bisher startete jeder Klick auf "Send" einen neuen Thread. Das hat zwei
+Nachteile:
+ - Es gibt keine Obergrenze: Eine schnelle Folge von Eingaben erzeugt
+   beliebig viele gleichzeitige Threads und API-Aufrufe.
+ - Es gibt keine Reihenfolge: Zwei schnell hintereinander gesendete
+   Nachrichten im selben Tab können sich überholen.
+
+Der LaneExecutor löst beides:
+ - Eine feste Anzahl Worker-Threads arbeitet alle Aufträge ab.
+ - Jeder Auftrag gehört zu einer Lane (z. B. dem Namen des Agenten-Tabs).
+   Aufträge derselben Lane laufen strikt nacheinander in Einsendereihenfolge,
+   verschiedene Lanes laufen parallel.
+ - Die Zahl offener Aufträge (wartend + laufend) ist begrenzt. Ist die Grenze
+   erreicht, wirft `submit` ein `queue.Full` – der Aufrufer kann dem Nutzer
+   dann eine Rückmeldung geben (Back-Pressure), statt Threads anzuhäufen.
+================================================================================
+"""
+
+import queue
+import threading
+import traceback
+from collections import deque
+
+
+class LaneExecutor:
+    """
+    Thread-Pool mit fester Größe und einer FIFO-Warteschlange pro Lane.
+    """
+
+    def __init__(self, max_workers=4, max_pending=32, on_change=None, name="swarm-worker"):
+        """
+        - max_workers: Anzahl der Worker-Threads (gleichzeitig laufende Aufträge)
+        - max_pending: Höchstzahl offener Aufträge (wartend + laufend)
+        - on_change: optionale Funktion on_change(depth), die bei jeder Änderung
+          der Warteschlangentiefe aufgerufen wird (auch aus Worker-Threads!)
+        """
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._on_change = on_change
+        self._lanes = {}          # Lane -> deque mit wartenden Aufträgen
+        self._ready = deque()     # Lanes mit wartenden Aufträgen, die gerade nicht laufen
+        self._running = set()     # Lanes, deren Auftrag gerade ausgeführt wird
+        self._pending = 0
+        self._shutdown = False
+        self._condition = threading.Condition()
+        self._threads = [
+            threading.Thread(target=self._work, name=f"{name}-{index}", daemon=True)
+            for index in range(max_workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, lane, function, *args):
+        """
+        Reiht function(*args) in die Lane ein.
+        Wirft queue.Full, wenn bereits max_pending Aufträge offen sind.
+        """
+        self._enqueue(lane, function, args, check_limit=True)
+
+    def forward(self, lane, function, *args):
+        """
+        Reicht die weitere Arbeit eines laufenden Auftrags an eine andere
+        Lane weiter (z. B. eine vorab geroutete Frage an die Lane des
+        Fach-Agenten). Dort läuft sie nach den bereits wartenden Aufträgen.
+        Die Grenze max_pending gilt nicht: Der aufrufende Auftrag endet gleich
+        danach, die Zahl offener Aufträge wächst also nicht dauerhaft. Aus
+        demselben Grund wird auch nach shutdown() noch weitergereicht.
+        """
+        self._enqueue(lane, function, args, check_limit=False)
+
+    def _enqueue(self, lane, function, args, check_limit):
+        with self._condition:
+            if self._shutdown and check_limit:
+                raise RuntimeError("LaneExecutor wurde bereits beendet.")
+            if check_limit and self._pending >= self.max_pending:
+                raise queue.Full(f"{self._pending} Anfragen sind bereits offen.")
+            lane_queue = self._lanes.setdefault(lane, deque())
+            lane_queue.append((function, args))
+            self._pending += 1
+            # Nur "bereit" markieren, wenn die Lane nicht schon läuft oder wartet
+            if lane not in self._running and len(lane_queue) == 1:
+                self._ready.append(lane)
+                self._condition.notify()
+            depth = self._pending
+        self._notify_change(depth)
+
+    def depth(self, lane=None):
+        """
+        Anzahl offener Aufträge – insgesamt oder nur für eine Lane
+        (inklusive eines gerade laufenden Auftrags dieser Lane).
+        """
+        with self._condition:
+            if lane is None:
+                return self._pending
+            return len(self._lanes.get(lane, ())) + (1 if lane in self._running else 0)
+
+    def shutdown(self, wait=True):
+        """
+        Nimmt keine neuen Aufträge mehr an. Bereits eingereihte Aufträge
+        werden noch abgearbeitet.
+        """
+        with self._condition:
+            self._shutdown = True
+            self._condition.notify_all()
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+    def _work(self):
+        while True:
+            with self._condition:
+                # Nach shutdown() erst aufhören, wenn kein Auftrag mehr läuft –
+                # ein laufender kann noch weiterreichen (forward)
+                while not self._ready and not (self._shutdown and not self._running):
+                    self._condition.wait()
+                if not self._ready:
+                    return
+                lane = self._ready.popleft()
+                function, args = self._lanes[lane].popleft()
+                self._running.add(lane)
+
+            try:
+                function(*args)
+            except Exception:
+                # Ein fehlerhafter Auftrag darf den Worker nicht beenden
+                traceback.print_exc()
+            finally:
+                with self._condition:
+                    self._pending -= 1
+                    self._running.discard(lane)
+                    if self._lanes[lane]:
+                        self._ready.append(lane)
+                        self._condition.notify()
+                    else:
+                        del self._lanes[lane]
+                    if self._shutdown and not self._running:
+                        self._condition.notify_all()
+                    depth = self._pending
+                self._notify_change(depth)
+
+    def _notify_change(self, depth):
+        if self._on_change is not None:
+            self._on_change(depth)